@@ -1,6 +1,7 @@
 from datetime import datetime
-from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
+from agentic.lazy import lazy_attributes
+from agentic.llm import get_chat_model
 from agentic.tools.cultpass_tools import (
     lookup_user,
     get_subscription_status,
@@ -17,6 +18,15 @@ tools = [
     get_user_reservations,
 ]
 
-model = ChatOpenAI(model="gpt-4o-mini")
 
-billing_agent = create_react_agent(model, tools=tools)
+def build_billing_agent(model=None, tools=tools):
+    """
+    The billing agent on `model` (default: the shared chat model), with
+    `tools` in place of the module's.
+    """
+    model = model or get_chat_model()
+    return create_react_agent(model, tools=tools)
+
+
+# `model` and `billing_agent` are created on first access
+__getattr__ = lazy_attributes(globals(), model=get_chat_model, billing_agent=build_billing_agent)
@@ -1,6 +1,7 @@
 from datetime import datetime
-from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
+from agentic.lazy import lazy_attributes
+from agentic.llm import get_chat_model
 from agentic.tools.cultpass_tools import (
     lookup_user,
     get_user_reservations,
@@ -12,6 +13,15 @@ from agentic.tools.cultpass_tools import (
 # It has access to reservation tools and user lookup
 tools = [lookup_user, get_user_reservations, cancel_reservation, book_reservation]
 
-model = ChatOpenAI(model="gpt-4o-mini")
 
-booking_agent = create_react_agent(model, tools=tools)
+def build_booking_agent(model=None, tools=tools):
+    """
+    The booking agent on `model` (default: the shared chat model), with
+    `tools` in place of the module's.
+    """
+    model = model or get_chat_model()
+    return create_react_agent(model, tools=tools)
+
+
+# `model` and `booking_agent` are created on first access
+__getattr__ = lazy_attributes(globals(), model=get_chat_model, booking_agent=build_booking_agent)
@@ -0,0 +1,398 @@
+"""
+In-process fast path in front of the LLM triage chain.
+
+Keyword rules plus a small multinomial Naive Bayes model (a linear model over
+word unigrams and bigrams) predict the destination; sentiment and urgency
+come from keyword rules. When the prediction is confident and the rules are
+unambiguous the LLM call is skipped, otherwise `triage_chain` decides.
+
+The model ships trained on SEED_EXAMPLES and can be retrained from labelled
+tickets with `train_from_db` (OrchestratorConfig(train_triage=True) does so
+when the orchestrator is built).
+
+Follow-up turns ("yes, please", "ok, the second one") stay with the
+conversation's current specialist (sticky routing): the turn is only
+re-triaged when `topic_changed` finds a plausible switch, and sentiment and
+urgency are updated from the new message (see `follow_up`).
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import NamedTuple
+from langchain_core.messages import BaseMessage, HumanMessage
+from agentic.agents.triage import RouteQuery
+
+DESTINATIONS = ["billing_agent", "booking_agent", "tech_agent", "retention_agent"]
+
+# Minimum posterior needed to answer without the LLM
+CONFIDENCE_THRESHOLD = float(os.getenv("TRIAGE_FAST_PATH_THRESHOLD", "0.85"))
+FAST_PATH_ENABLED = os.getenv("TRIAGE_FAST_PATH", "1") != "0"
+STICKY_ROUTING = os.getenv("TRIAGE_STICKY", "1") != "0"
+
+# A message this long with no rule hits can still be a new request...
+FOLLOW_UP_MAX_WORDS = 12
+# ...when the model favours another destination at least this much
+TOPIC_SWITCH_CONFIDENCE = 0.6
+
+# Log-odds added to a destination for every rule that fires
+RULE_BOOST = 2.0
+
+ROUTE_RULES = {
+    "retention_agent": [
+        r"\b(cancel|end|stop|terminate|quit)\b.{0,30}\b(subscription|membership|plan|cultpass)\b",
+        r"\bpause\b",
+        r"\bunsubscribe\b",
+    ],
+    "booking_agent": [
+        r"\bcancel\b.{0,30}\b(reservation|booking|class|spot|event)\b",
+        r"\b(book|reserve|reservations?|bookings?|sign me up)\b",
+        r"\b(my|next|upcoming) (classes|events|experiences)\b",
+    ],
+    "billing_agent": [
+        r"\b(charged?|payments?|invoice|bill(ing)?|refund|credit card)\b",
+        r"\b(upgrade|downgrade|tier|quota|elite|premium plan)\b",
+        r"\bsubscription (status|details|plan)\b",
+    ],
+    "tech_agent": [
+        r"\b(log ?in|sign ?in|password|crash(es|ing)?|error|bug|qr code)\b",
+        r"\bapp\b.{0,30}\b(not working|broken|won'?t|doesn'?t|freez)",
+    ],
+}
+
+SENTIMENT_RULES = [
+    ("Frustrated", r"\b(ridiculous|unacceptable|angry|furious|again|still not|fed up)\b|!!"),
+    ("Negative", r"\b(broken|bad|disappointed|not working|annoy\w*|terrible|wrong)\b"),
+    ("Positive", r"\b(thanks?|thank you|love|great|awesome|appreciate)\b"),
+]
+
+URGENCY_RULES = [
+    ("Critical", r"\b(emergency|charged twice|fraud|locked out)\b"),
+    ("High", r"\b(now|immediately|asap|urgent(ly)?|right away|today)\b"),
+    ("Medium", r"\b(soon|tomorrow|this week)\b"),
+]
+URGENCY_LEVELS = ["Low", "Medium", "High", "Critical"]
+
+SEED_EXAMPLES = [
+    ("What is my current subscription status?", "billing_agent"),
+    ("I was charged twice this month", "billing_agent"),
+    ("Can I upgrade to the elite tier?", "billing_agent"),
+    ("How many classes do I have left in my quota?", "billing_agent"),
+    ("My payment failed, please update my card", "billing_agent"),
+    ("I want to book a yoga class.", "booking_agent"),
+    ("Reserve a spot for the samba night", "booking_agent"),
+    ("Show me my reservations", "booking_agent"),
+    ("Please cancel my reservation for tomorrow", "booking_agent"),
+    ("Are there any slots left for the paddleboarding event?", "booking_agent"),
+    ("How do I reset my password?", "tech_agent"),
+    ("I can't log in to my account", "tech_agent"),
+    ("The app keeps crashing when I open it", "tech_agent"),
+    ("My QR code is not showing", "tech_agent"),
+    ("How does CultPass work?", "tech_agent"),
+    ("I want to cancel my subscription.", "retention_agent"),
+    ("Can I pause my membership for two months?", "retention_agent"),
+    ("Please end my CultPass plan", "retention_agent"),
+    ("I don't use it anymore, I want to stop my subscription", "retention_agent"),
+]
+
+
+class Prediction(NamedTuple):
+    route: RouteQuery
+    confidence: float
+    rule_hits: dict
+
+
+def _features(text: str) -> list[str]:
+    words = re.findall(r"[\w']+", text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def latest_user_text(messages: list[BaseMessage]) -> str:
+    """Content of the most recent human message (the one being triaged)."""
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return str(message.content)
+    return ""
+
+
+def _first_match(rules, text: str, default: str) -> str:
+    for label, pattern in rules:
+        if re.search(pattern, text):
+            return label
+    return default
+
+
+class FastTriageClassifier:
+    """Naive Bayes over n-grams, nudged by keyword rules."""
+
+    def __init__(self, examples=SEED_EXAMPLES):
+        self.fit(examples)
+
+    def fit(self, examples):
+        class_counts = Counter()
+        token_counts = defaultdict(Counter)
+        for text, destination in examples:
+            if destination not in DESTINATIONS:
+                continue
+            class_counts[destination] += 1
+            token_counts[destination].update(_features(text))
+
+        vocab = set()
+        for counts in token_counts.values():
+            vocab.update(counts)
+        total = sum(class_counts.values())
+
+        self.log_prior = {}
+        self.log_likelihood = {}
+        self.log_unknown = {}
+        for destination in DESTINATIONS:
+            # Laplace smoothing so unseen classes/tokens stay finite
+            self.log_prior[destination] = math.log(
+                (class_counts[destination] + 1) / (total + len(DESTINATIONS))
+            )
+            denominator = sum(token_counts[destination].values()) + len(vocab) + 1
+            self.log_likelihood[destination] = {
+                token: math.log((count + 1) / denominator)
+                for token, count in token_counts[destination].items()
+            }
+            self.log_unknown[destination] = math.log(1 / denominator)
+        self.vocab = vocab
+        self.examples_seen = total
+
+    def rule_hits(self, text: str) -> dict:
+        return {
+            destination: sum(1 for p in patterns if re.search(p, text))
+            for destination, patterns in ROUTE_RULES.items()
+        }
+
+    def predict(self, text: str) -> Prediction:
+        text = text.lower()
+        tokens = [t for t in _features(text) if t in self.vocab]
+        hits = self.rule_hits(text)
+
+        scores = {}
+        for destination in DESTINATIONS:
+            likelihood = self.log_likelihood[destination]
+            unknown = self.log_unknown[destination]
+            scores[destination] = (
+                self.log_prior[destination]
+                + sum(likelihood.get(t, unknown) for t in tokens)
+                + RULE_BOOST * hits[destination]
+            )
+
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        normalizer = sum(math.exp(s - top) for s in scores.values())
+        confidence = 1 / normalizer
+
+        route = RouteQuery(
+            destination=best,
+            sentiment=_first_match(SENTIMENT_RULES, text, "Neutral"),
+            urgency=_first_match(URGENCY_RULES, text, "Low"),
+        )
+        return Prediction(route, confidence, hits)
+
+    def topic_changed(self, text: str, previous_destination: str) -> bool:
+        """
+        Whether a follow-up message plausibly asks for another specialist:
+        a rule for another destination fires, or a longer message that no
+        rule ties to the current one leans elsewhere.
+        """
+        prediction = self.predict(text)
+        hits = prediction.rule_hits
+        if any(count for destination, count in hits.items() if destination != previous_destination):
+            return True
+        if hits.get(previous_destination):
+            return False
+        return (
+            len(re.findall(r"[\w']+", text)) > FOLLOW_UP_MAX_WORDS
+            and prediction.route.destination != previous_destination
+            and prediction.confidence >= TOPIC_SWITCH_CONFIDENCE
+        )
+
+    def is_confident(self, prediction: Prediction, threshold: float) -> bool:
+        """
+        Confident means a high posterior, rule support for the winner and
+        no rule pointing elsewhere.
+        """
+        winner = prediction.route.destination
+        competing = any(
+            count for destination, count in prediction.rule_hits.items()
+            if destination != winner
+        )
+        return (
+            prediction.confidence >= threshold
+            and prediction.rule_hits[winner] > 0
+            and not competing
+        )
+
+
+class FastPathStats:
+    """
+    Counts how many turns were answered locally vs by the LLM; `sticky`
+    (follow-ups kept on their specialist) is a subset of `local`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.local = 0
+        self.llm = 0
+        self.sticky = 0
+
+    def record(self, used_llm: bool, sticky: bool = False):
+        with self._lock:
+            if used_llm:
+                self.llm += 1
+            else:
+                self.local += 1
+                self.sticky += sticky
+
+    @property
+    def skip_rate(self) -> float:
+        total = self.local + self.llm
+        return self.local / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "local": self.local,
+            "llm": self.llm,
+            "sticky": self.sticky,
+            "skip_rate": self.skip_rate,
+        }
+
+
+classifier = FastTriageClassifier()
+stats = FastPathStats()
+
+
+def follow_up(
+    text: str, previous: RouteQuery | None, sticky: bool | None = None
+) -> RouteQuery | None:
+    """
+    The previous route carried over to this turn, or None if the turn must
+    be triaged. Sentiment follows the new message when a rule fires on it;
+    urgency only ever rises within a topic. `sticky` overrides TRIAGE_STICKY.
+    """
+    if not (STICKY_ROUTING if sticky is None else sticky) or previous is None:
+        return None
+    if classifier.topic_changed(text, previous.destination):
+        return None
+    lowered = text.lower()
+    urgency = _first_match(URGENCY_RULES, lowered, "Low")
+    return RouteQuery(
+        destination=previous.destination,
+        sentiment=_first_match(SENTIMENT_RULES, lowered, previous.sentiment),
+        urgency=max(urgency, previous.urgency, key=URGENCY_LEVELS.index),
+    )
+
+
+def classify(
+    messages: list[BaseMessage],
+    fallback,
+    threshold: float = CONFIDENCE_THRESHOLD,
+    context: dict | None = None,
+    previous: RouteQuery | None = None,
+    fast_path: bool | None = None,
+    sticky: bool | None = None,
+) -> RouteQuery:
+    """
+    Keep a follow-up on the `previous` route (see `follow_up`), else route
+    the conversation locally when confident, else call fallback (the LLM
+    triage chain) with the messages and any extra context keys.
+    `fast_path` and `sticky` override TRIAGE_FAST_PATH / TRIAGE_STICKY.
+    """
+    text = latest_user_text(messages)
+    route = follow_up(text, previous, sticky)
+    if route is not None:
+        stats.record(used_llm=False, sticky=True)
+        return route
+    if FAST_PATH_ENABLED if fast_path is None else fast_path:
+        model = classifier  # train_from_db may swap in a new one meanwhile
+        prediction = model.predict(text)
+        if model.is_confident(prediction, threshold):
+            stats.record(used_llm=False)
+            return prediction.route
+    stats.record(used_llm=True)
+    return fallback.invoke({"messages": messages, **(context or {})})
+
+
+async def aclassify(
+    messages: list[BaseMessage],
+    fallback,
+    threshold: float = CONFIDENCE_THRESHOLD,
+    context: dict | None = None,
+    previous: RouteQuery | None = None,
+    fast_path: bool | None = None,
+    sticky: bool | None = None,
+) -> RouteQuery:
+    """Async version of `classify`; awaits the fallback chain."""
+    text = latest_user_text(messages)
+    route = follow_up(text, previous, sticky)
+    if route is not None:
+        stats.record(used_llm=False, sticky=True)
+        return route
+    if FAST_PATH_ENABLED if fast_path is None else fast_path:
+        model = classifier  # train_from_db may swap in a new one meanwhile
+        prediction = model.predict(text)
+        if model.is_confident(prediction, threshold):
+            stats.record(used_llm=False)
+            return prediction.route
+    stats.record(used_llm=True)
+    return await fallback.ainvoke({"messages": messages, **(context or {})})
+
+
+# Map free-form TicketMetadata.main_issue_type values onto destinations
+ISSUE_TYPE_ROUTES = {
+    "billing": "billing_agent",
+    "payment": "billing_agent",
+    "subscription": "billing_agent",
+    "booking": "booking_agent",
+    "reservation": "booking_agent",
+    "technical": "tech_agent",
+    "login": "tech_agent",
+    "how-to": "tech_agent",
+    "cancellation": "retention_agent",
+    "retention": "retention_agent",
+}
+
+
+def training_examples(session):
+    """
+    Yield (text, destination) pairs from labelled tickets: the first user
+    message of tickets whose TicketMetadata.main_issue_type maps to a
+    destination.
+    """
+    from data.models.udahub import TicketMessage, TicketMetadata, RoleEnum
+
+    labelled = (
+        session.query(TicketMetadata.main_issue_type, TicketMessage.content, TicketMessage.ticket_id)
+        .join(TicketMessage, TicketMessage.ticket_id == TicketMetadata.ticket_id)
+        .filter(TicketMetadata.main_issue_type.isnot(None), TicketMessage.role == RoleEnum.user)
+        .order_by(TicketMessage.ticket_id, TicketMessage.created_at)
+        .yield_per(1000)
+    )
+    last_ticket = None
+    for issue_type, content, ticket_id in labelled:
+        if ticket_id == last_ticket:
+            continue
+        last_ticket = ticket_id
+        destination = issue_type if issue_type in DESTINATIONS else ISSUE_TYPE_ROUTES.get(issue_type.lower())
+        if destination and content:
+            yield content, destination
+
+
+def train_from_db(session, include_seed: bool = True) -> FastTriageClassifier:
+    """
+    Retrain the shared classifier from labelled tickets. A new classifier is
+    fitted and then swapped in, so triage running meanwhile never sees
+    half-updated counts.
+    """
+    global classifier
+    examples = list(SEED_EXAMPLES) if include_seed else []
+    examples.extend(training_examples(session))
+    classifier = FastTriageClassifier(examples)
+    return classifier
@@ -1,6 +1,7 @@
 from datetime import datetime
-from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
+from agentic.lazy import lazy_attributes
+from agentic.llm import get_chat_model
 from agentic.tools.cultpass_tools import get_retention_policy, lookup_user
 
 # Define the retention agent
@@ -10,8 +11,6 @@ tools = [
     get_retention_policy,
 ]
 
-model = ChatOpenAI(model="gpt-4o-mini")
-
 # System prompt to guide the agent to be empathetic and try to retain the user
 # properly we would use a system_message arg in create_react_agent if supported or wrap the model
 # For simple react agent, we rely on the tool description and generic behavior, OR we can pass state_modifier.
@@ -24,4 +23,15 @@ Your goal is to understand why a user wants to cancel and offer helpful alternat
    but try to convince them to stay or pause instead.
 """
 
-retention_agent = create_react_agent(model, tools=tools, prompt=retention_instructions)
+
+def build_retention_agent(model=None, tools=tools):
+    """
+    The retention agent on `model` (default: the shared chat model), with
+    `tools` in place of the module's.
+    """
+    model = model or get_chat_model()
+    return create_react_agent(model, tools=tools, prompt=retention_instructions)
+
+
+# `model` and `retention_agent` are created on first access
+__getattr__ = lazy_attributes(globals(), model=get_chat_model, retention_agent=build_retention_agent)
@@ -1,13 +1,19 @@
 from datetime import datetime
-from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
+from langgraph.prebuilt.chat_agent_executor import AgentState
+from agentic.lazy import lazy_attributes
+from agentic.llm import get_chat_model
 from agentic.tools.rag_tools import search_knowledge_base
 
 # Define the tech support agent
 # It has access to the Knowledge Base
 tools = [search_knowledge_base]
 
-model = ChatOpenAI(model="gpt-4o-mini")
+
+class TechAgentState(AgentState):
+    # The ticket's account; the search tool reads it to pick the KB shard
+    account_id: str
+
 
 tech_instructions = """You are a Tech Support Assistant.
 Use the 'search_knowledge_base' tool to find answers.
@@ -16,4 +22,17 @@ you MUST respond with "[ESCALATION_REQUIRED] I cannot find an answer to your que
 Do not make up functionality that isn't in the context.
 """
 
-tech_agent = create_react_agent(model, tools=tools, prompt=tech_instructions)
+
+def build_tech_agent(model=None, tools=tools):
+    """
+    The tech agent on `model` (default: the shared chat model), with
+    `tools` in place of the module's.
+    """
+    model = model or get_chat_model()
+    return create_react_agent(
+        model, tools=tools, prompt=tech_instructions, state_schema=TechAgentState
+    )
+
+
+# `model` and `tech_agent` are created on first access
+__getattr__ = lazy_attributes(globals(), model=get_chat_model, tech_agent=build_tech_agent)
@@ -1,7 +1,8 @@
 from typing import Literal
 from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from agentic.lazy import lazy_attributes
+from agentic.llm import get_chat_model
 
 
 # Define the routing model
@@ -40,5 +41,14 @@ prompt = ChatPromptTemplate.from_messages(
     [("system", system_prompt), ("human", "{messages}")]
 )
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-triage_chain = prompt | llm.with_structured_output(RouteQuery)
+
+def build_triage_chain(llm=None):
+    """The routing chain on `llm` (default: the shared temperature-0 model)."""
+    llm = llm or get_chat_model(temperature=0)
+    return prompt | llm.with_structured_output(RouteQuery)
+
+
+# `llm` and `triage_chain` are created on first access
+__getattr__ = lazy_attributes(
+    globals(), llm=lambda: get_chat_model(temperature=0), triage_chain=build_triage_chain
+)
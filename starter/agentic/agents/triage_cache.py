@@ -0,0 +1,308 @@
+"""
+Cache for triage classifications.
+
+Entries are keyed on the normalised text of the latest user message plus the
+destination the conversation was already on, so "yes, please" in a booking
+flow never reuses an answer given in a billing flow. Lookups can optionally
+fall back to embedding similarity for near-identical wordings.
+
+Memory is bounded (LRU) and entries expire after a TTL. Every insert is also
+written to a small SQLite file that is read back at start, so a restarted
+worker begins warm. The file is written behind, by a `BatchWriter` thread, so
+`put` (and `CachedTriageChain.ainvoke` on the event loop) never waits on disk.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from agentic.agents.triage import RouteQuery
+from agentic.agents.fast_triage import latest_user_text
+from agentic.batching import BatchWriter
+from agentic.lazy import lazy_attributes
+
+CACHE_PATH = os.getenv("TRIAGE_CACHE_PATH", "triage_cache.db")
+MAX_ENTRIES = int(os.getenv("TRIAGE_CACHE_SIZE", "10000"))
+TTL_SECONDS = float(os.getenv("TRIAGE_CACHE_TTL", "86400"))
+SEMANTIC_MATCH = os.getenv("TRIAGE_CACHE_SEMANTIC", "0") == "1"
+SIMILARITY_THRESHOLD = 0.9
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = re.sub(r"[^\w\s']", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class CacheFileWriter(BatchWriter):
+    """Write-behind upserts and deletes of the cache file, one transaction per batch."""
+
+    name = "triage-cache-writer"
+
+    def __init__(self, path: str, **kwargs):
+        self.path = path
+        self._conn = None  # opened by the worker thread
+        super().__init__(None, **kwargs)
+
+    def upsert(self, key: str, route: RouteQuery, expires_at: float):
+        self._put(
+            (
+                "INSERT OR REPLACE INTO triage_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, route.destination, route.sentiment, route.urgency, expires_at, time.time()),
+            )
+        )
+
+    def delete(self, keys: list[str]):
+        for key in keys:
+            self._put(("DELETE FROM triage_cache WHERE key = ?", (key,)))
+
+    def write_batch(self, records: list):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            for statement, params in records:
+                self._conn.execute(statement, params)
+
+    def close(self, timeout: float | None = 10.0):
+        super().close(timeout)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class TriageCache:
+    """LRU + TTL map from normalised message to RouteQuery."""
+
+    def __init__(
+        self,
+        max_entries: int = MAX_ENTRIES,
+        ttl_seconds: float = TTL_SECONDS,
+        path: str | None = None,
+        embedder=None,
+        similarity_threshold: float = SIMILARITY_THRESHOLD,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()  # key -> (RouteQuery, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        # One row of the matrix per cached key; freed slots are reused
+        self._slots = {}
+        self._slot_keys = [None] * max_entries
+        self._free_slots = list(range(max_entries))
+        self._vectors = None
+
+        self._writer = None
+        if path:
+            self._load(path)
+            self._writer = CacheFileWriter(path)
+
+    # -- persistence -------------------------------------------------------
+
+    def _load(self, path: str):
+        conn = sqlite3.connect(path)
+        try:
+            with conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS triage_cache (
+                        key TEXT PRIMARY KEY,
+                        destination TEXT NOT NULL,
+                        sentiment TEXT NOT NULL,
+                        urgency TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute("DELETE FROM triage_cache WHERE expires_at <= ?", (time.time(),))
+            rows = conn.execute(
+                """
+                SELECT key, destination, sentiment, urgency, expires_at FROM (
+                    SELECT * FROM triage_cache ORDER BY last_used DESC LIMIT ?
+                ) ORDER BY last_used
+                """,
+                (self.max_entries,),
+            ).fetchall()
+        finally:
+            conn.close()
+        for key, destination, sentiment, urgency, expires_at in rows:
+            route = RouteQuery(destination=destination, sentiment=sentiment, urgency=urgency)
+            self._insert(key, route, expires_at)
+
+    def _forget(self, keys: list[str]):
+        if self._writer is not None and keys:
+            self._writer.delete(keys)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Block until the cache file has every change made so far."""
+        return self._writer.flush(timeout) if self._writer is not None else True
+
+    # -- in-memory map -----------------------------------------------------
+
+    def _embed(self, key: str) -> np.ndarray:
+        text = key.split("|", 1)[-1]
+        return np.asarray(self.embedder.embed_query(text), dtype=np.float32)
+
+    def _insert(self, key: str, route: RouteQuery, expires_at: float) -> list[str]:
+        evicted = []
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        elif len(self._entries) >= self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self._release(old_key)
+            evicted.append(old_key)
+            self.evictions += 1
+        self._entries[key] = (route, expires_at)
+        if self.embedder is not None and key not in self._slots:
+            vector = self._embed(key)
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._slots[key] = slot
+            self._slot_keys[slot] = key
+        return evicted
+
+    def _release(self, key: str):
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            self._vectors[slot] = 0.0
+            self._slot_keys[slot] = None
+            self._free_slots.append(slot)
+
+    def _similar_key(self, key: str) -> str | None:
+        if self.embedder is None or not self._slots:
+            return None
+        context = key.split("|", 1)[0]
+        scores = self._vectors @ self._embed(key)
+        for slot in np.argsort(-scores)[:5]:
+            if scores[slot] < self.similarity_threshold:
+                break
+            candidate = self._slot_keys[slot]
+            # Only reuse answers given in the same conversational context
+            if candidate and candidate.split("|", 1)[0] == context:
+                return candidate
+        return None
+
+    # -- public API --------------------------------------------------------
+
+    @staticmethod
+    def make_key(text: str, previous_destination: str = "") -> str:
+        return f"{previous_destination or ''}|{normalize(text)}"
+
+    def get(self, key: str) -> RouteQuery | None:
+        with self._lock:
+            now = time.time()
+            entry = self._entries.get(key)
+            semantic = False
+            if entry is None:
+                similar = self._similar_key(key)
+                if similar is not None:
+                    key, entry, semantic = similar, self._entries[similar], True
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                self._release(key)
+                self._forget([key])
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if semantic:
+                self.semantic_hits += 1
+            return entry[0]
+
+    def put(self, key: str, route: RouteQuery):
+        with self._lock:
+            expires_at = time.time() + self.ttl_seconds
+            evicted = self._insert(key, route, expires_at)
+            if self._writer is not None:
+                self._forget(evicted)
+                self._writer.upsert(key, route, expires_at)
+
+    def clear(self):
+        with self._lock:
+            self._forget(list(self._entries))
+            for key in list(self._slots):
+                self._release(key)
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hit_rate,
+        }
+
+
+class CachedTriageChain:
+    """
+    Drop-in for `triage_chain.invoke` that consults the cache first.
+    Accepts an optional "previous_destination" alongside "messages".
+    """
+
+    def __init__(self, chain, cache: TriageCache):
+        self.chain = chain
+        self.cache = cache
+
+    def invoke(self, inputs: dict, config=None) -> RouteQuery:
+        text = latest_user_text(inputs["messages"])
+        if not text:
+            return self.chain.invoke(inputs, config)
+        key = self.cache.make_key(text, inputs.get("previous_destination", ""))
+        route = self.cache.get(key)
+        if route is None:
+            route = self.chain.invoke(inputs, config)
+            self.cache.put(key, route)
+        return route
+
+    async def ainvoke(self, inputs: dict, config=None) -> RouteQuery:
+        text = latest_user_text(inputs["messages"])
+        if not text:
+            return await self.chain.ainvoke(inputs, config)
+        key = self.cache.make_key(text, inputs.get("previous_destination", ""))
+        route = self.cache.get(key)
+        if route is None:
+            route = await self.chain.ainvoke(inputs, config)
+            self.cache.put(key, route)
+        return route
+
+
+def _default_embedder():
+    if not SEMANTIC_MATCH:
+        return None
+    from agentic.tools.vector_index import HashingEmbedder
+
+    return HashingEmbedder()
+
+
+def _default_cache() -> TriageCache:
+    return TriageCache(path=CACHE_PATH or None, embedder=_default_embedder())
+
+
+# The shared cache (and its SQLite file) is opened on first access
+__getattr__ = lazy_attributes(globals(), cache=_default_cache)
@@ -0,0 +1,533 @@
+"""
+Ticket analytics: per-turn classifications and incrementally maintained rollups.
+
+Every turn's triage result (destination, sentiment, urgency) is recorded
+write-behind, like the audit log (agentic/audit.py). Each batch, in one
+transaction:
+1. appends the turns to `analytics_turns` (raw, for rebuilds and drill-down)
+2. moves each ticket's latest classification in `analytics_tickets`
+3. adds the turns to `analytics_hourly` and `analytics_daily`: turns,
+   tickets opened and latency per hour (day) x account x agent x sentiment
+   x urgency
+4. moves each ticket's count in `analytics_current` from its previous
+   classification to its new one
+
+`analytics_current` counts every ticket ever seen by its latest
+classification, closed or not: nothing records when a ticket closes, so the
+totals only grow.
+
+The rollups are upserted (ON CONFLICT ... DO UPDATE), so a dashboard query
+reads one row per day (whole days) or hour (the edges of the range) and key,
+however many turns there were, instead of scanning TicketMessage/AgentLog:
+
+    from agentic import analytics
+    analytics.rollup(engine, by=("agent", "sentiment"), since=datetime.now() - timedelta(days=7))
+    analytics.current(engine, by=("urgency",), account_id="cultpass")
+
+    cd starter
+    python -m agentic.analytics --since 24h --by agent,urgency
+    python -m agentic.analytics --current --by sentiment --account cultpass
+    python -m agentic.analytics --rebuild   # recompute the rollups from analytics_turns
+
+The tables are created by udahub migration 7 (`python -m data.migrations
+upgrade`); until it is applied, turns are not recorded.
+
+Set ANALYTICS_ENABLED=0 to stop recording.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    func,
+    insert,
+    select,
+)
+from sqlalchemy.dialects.sqlite import insert as upsert
+from data import migrations
+from agentic import db
+from agentic.batching import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("ANALYTICS_ENABLED", "1") != "0"
+REBUILD_PAGE = 5000  # raw turns per rebuild transaction
+UNKNOWN = "unknown"  # stands in for a missing account or classification
+SCHEMA_VERSION = 7  # udahub migration that creates the tables below
+SCHEMA_RECHECK = 60.0  # seconds between checks of a database without them
+
+# Columns a rollup can be grouped and filtered by
+DIMENSIONS = ("account_id", "agent", "sentiment", "urgency")
+
+# Created by data/migrations.py
+
+analytics_metadata = MetaData()
+turns_table = Table(
+    "analytics_turns",
+    analytics_metadata,
+    Column("turn_id", String, primary_key=True),
+    Column("ticket_id", String, nullable=False),
+    Column("account_id", String, nullable=False),
+    Column("agent", String, nullable=False),
+    Column("sentiment", String, nullable=False),
+    Column("urgency", String, nullable=False),
+    Column("latency_ms", Float),
+    Column("created_at", DateTime, nullable=False),
+    Index("ix_analytics_turns_created", "created_at"),
+    Index("ix_analytics_turns_ticket", "ticket_id", "created_at"),
+)
+tickets_table = Table(
+    "analytics_tickets",
+    analytics_metadata,
+    Column("ticket_id", String, primary_key=True),
+    Column("account_id", String, nullable=False),
+    Column("agent", String, nullable=False),
+    Column("sentiment", String, nullable=False),
+    Column("urgency", String, nullable=False),
+    Column("turns", Integer, nullable=False),
+    Column("first_at", DateTime, nullable=False),
+    Column("last_at", DateTime, nullable=False),
+)
+
+
+def _rollup_table(name: str, bucket: str) -> Table:
+    """Counters per time bucket (column `bucket`) and DIMENSIONS."""
+    return Table(
+        name,
+        analytics_metadata,
+        Column(bucket, DateTime, primary_key=True),
+        *(Column(dimension, String, primary_key=True) for dimension in DIMENSIONS),
+        Column("turns", Integer, nullable=False),
+        Column("tickets_opened", Integer, nullable=False),
+        Column("latency_ms_total", Float, nullable=False),
+        Column("latency_count", Integer, nullable=False),
+        Index(f"ix_{name}_account_{bucket}", "account_id", bucket),
+    )
+
+
+COUNTERS = ("turns", "tickets_opened", "latency_ms_total", "latency_count")
+hourly_table = _rollup_table("analytics_hourly", "hour")
+daily_table = _rollup_table("analytics_daily", "day")
+# Time bucket -> (rollup table, start of the bucket a timestamp falls in)
+BUCKETS = {
+    "hour": (hourly_table, lambda t: t.replace(minute=0, second=0, microsecond=0)),
+    "day": (daily_table, lambda t: t.replace(hour=0, minute=0, second=0, microsecond=0)),
+}
+current_table = Table(
+    "analytics_current",
+    analytics_metadata,
+    *(Column(name, String, primary_key=True) for name in DIMENSIONS),
+    Column("tickets", Integer, nullable=False),
+)
+
+
+def has_schema(engine) -> bool:
+    """Whether the database has the analytics tables (udahub migration 7)."""
+    return migrations.current_version(engine) >= SCHEMA_VERSION
+
+
+# -- writing -------------------------------------------------------------
+
+
+def _key(turn: dict) -> tuple:
+    return tuple(turn[name] for name in DIMENSIONS)
+
+
+def apply_turns(conn, turns: list[dict], record: bool = True):
+    """
+    Fold turns (oldest first) into the rollups inside the caller's
+    transaction; with `record`, also append them to analytics_turns.
+    """
+    if not turns:
+        return
+    if record:
+        conn.execute(insert(turns_table), turns)
+
+    ticket_ids = list({turn["ticket_id"] for turn in turns})
+    state = {
+        row["ticket_id"]: dict(row)
+        for start in range(0, len(ticket_ids), 500)
+        for row in conn.execute(
+            select(tickets_table).where(
+                tickets_table.c.ticket_id.in_(ticket_ids[start : start + 500])
+            )
+        ).mappings()
+    }
+
+    # (bucket, start, *key) -> [turns, tickets opened, latency total, latency count]
+    counters = defaultdict(lambda: [0, 0, 0.0, 0])
+    current = Counter()
+    for turn in turns:
+        key = _key(turn)
+        opened = turn["ticket_id"] not in state
+        for bucket, (_, start_of) in BUCKETS.items():
+            counts = counters[(bucket, start_of(turn["created_at"]), *key)]
+            counts[0] += 1
+            counts[1] += opened
+            if turn["latency_ms"] is not None:
+                counts[2] += turn["latency_ms"]
+                counts[3] += 1
+        previous = state.get(turn["ticket_id"])
+        if previous is None:
+            previous = state[turn["ticket_id"]] = {
+                "ticket_id": turn["ticket_id"],
+                "turns": 0,
+                "first_at": turn["created_at"],
+            }
+        else:
+            current[_key(previous)] -= 1
+        current[key] += 1
+        previous.update({name: turn[name] for name in DIMENSIONS})
+        previous["turns"] += 1
+        previous["last_at"] = turn["created_at"]
+
+    statement = upsert(tickets_table)
+    conn.execute(
+        statement.on_conflict_do_update(
+            index_elements=[tickets_table.c.ticket_id],
+            set_={
+                name: statement.excluded[name]
+                for name in (*DIMENSIONS, "turns", "last_at")
+            },
+        ),
+        [state[ticket_id] for ticket_id in ticket_ids],
+    )
+
+    for bucket, (table, _) in BUCKETS.items():
+        statement = upsert(table)
+        conn.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c[bucket], *(table.c[name] for name in DIMENSIONS)],
+                set_={name: table.c[name] + statement.excluded[name] for name in COUNTERS},
+            ),
+            [
+                {bucket: start, **dict(zip(DIMENSIONS, key)), **dict(zip(COUNTERS, counts))}
+                for (row_bucket, start, *key), counts in counters.items()
+                if row_bucket == bucket
+            ],
+        )
+
+    moved = [(key, delta) for key, delta in current.items() if delta]
+    if moved:
+        statement = upsert(current_table)
+        conn.execute(
+            statement.on_conflict_do_update(
+                index_elements=[current_table.c[name] for name in DIMENSIONS],
+                set_={"tickets": current_table.c.tickets + statement.excluded.tickets},
+            ),
+            [{**dict(zip(DIMENSIONS, key)), "tickets": delta} for key, delta in moved],
+        )
+
+
+def _transaction(engine, step, *args):
+    # Take the write lock before reading analytics_tickets, so concurrent
+    # writers (other processes) never fold a turn into a stale state
+    with engine.connect() as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            result = step(conn, *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+
+
+class AnalyticsWriter(BatchWriter):
+    """Write-behind recorder of turn classifications; see module docstring."""
+
+    name = "analytics-writer"
+
+    def record_turn(
+        self,
+        ticket_id: str,
+        account_id: str | None,
+        destination: str | None,
+        sentiment: str | None,
+        urgency: str | None,
+        latency: float | None = None,
+    ) -> str:
+        """Queue one turn's classification (latency in seconds); returns its turn_id."""
+        turn_id = uuid.uuid4().hex
+        self._put(
+            {
+                "turn_id": turn_id,
+                "ticket_id": ticket_id,
+                "account_id": account_id or UNKNOWN,
+                "agent": destination or UNKNOWN,
+                "sentiment": sentiment or UNKNOWN,
+                "urgency": urgency or UNKNOWN,
+                "latency_ms": round(latency * 1000, 1) if latency is not None else None,
+                "created_at": datetime.now(),
+            }
+        )
+        return turn_id
+
+    def write_batch(self, records: list):
+        _transaction(self.engine, apply_turns, records)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+_unmigrated_at = None  # when the udahub database was last found without the tables
+
+
+def get_analytics_writer() -> AnalyticsWriter | None:
+    """
+    Process-wide writer for the udahub database, or None while it lacks the
+    analytics tables (checked again every SCHEMA_RECHECK seconds).
+    """
+    global _writer, _unmigrated_at
+    with _writer_lock:
+        if _writer is None or _writer._closed:
+            if _unmigrated_at is not None and time.monotonic() - _unmigrated_at < SCHEMA_RECHECK:
+                return None
+            engine = db.get_engine(db.UDAHUB)
+            if not has_schema(engine):
+                if _unmigrated_at is None:
+                    logger.warning(
+                        "udahub.db has no analytics tables; turns are not recorded until "
+                        "`python -m data.migrations upgrade` is run"
+                    )
+                _unmigrated_at = time.monotonic()
+                return None
+            _unmigrated_at = None
+            _writer = AnalyticsWriter(engine)
+        return _writer
+
+
+def record_turn(ticket_id: str, account_id: str | None, state: dict, latency: float | None = None):
+    """Record the classification of a finished turn (the graph's final state)."""
+    writer = get_analytics_writer() if ENABLED else None
+    if writer is None:
+        return
+    writer.record_turn(
+        ticket_id,
+        state.get("account_id") or account_id,
+        state.get("destination"),
+        state.get("sentiment"),
+        state.get("urgency"),
+        latency,
+    )
+
+
+def rebuild(engine) -> int:
+    """
+    Recompute every rollup from analytics_turns, e.g. after a rollup was
+    added or changed; returns the number of turns folded in.
+    """
+    if not has_schema(engine):
+        raise ValueError(
+            "udahub.db has no analytics tables; run `python -m data.migrations upgrade` first"
+        )
+
+    def clear(conn):
+        for table in (tickets_table, hourly_table, daily_table, current_table):
+            conn.execute(delete(table))
+
+    _transaction(engine, clear)
+    folded, after = 0, (datetime.min, "")
+    while True:
+        with engine.connect() as conn:
+            turns = [
+                dict(row)
+                for row in conn.execute(
+                    select(turns_table)
+                    .where(
+                        (turns_table.c.created_at > after[0])
+                        | (
+                            (turns_table.c.created_at == after[0])
+                            & (turns_table.c.turn_id > after[1])
+                        )
+                    )
+                    .order_by(turns_table.c.created_at, turns_table.c.turn_id)
+                    .limit(REBUILD_PAGE)
+                ).mappings()
+            ]
+        if not turns:
+            return folded
+        _transaction(engine, apply_turns, turns, False)
+        folded += len(turns)
+        after = (turns[-1]["created_at"], turns[-1]["turn_id"])
+
+
+# -- queries -------------------------------------------------------------
+
+
+def _check(names, allowed):
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown dimension(s) {unknown}; choose from {list(allowed)}")
+
+
+def _columns(table, names, allowed) -> list:
+    _check(names, allowed)
+    return [table.c[name] for name in names]
+
+
+def _sums(conn, bucket: str, by: tuple, lower, upper, filters: dict):
+    """Summed COUNTERS of a rollup grouped by `by`, for buckets in [lower, upper)."""
+    table = BUCKETS[bucket][0]
+    group = _columns(table, by, (bucket, *DIMENSIONS))
+    query = select(*group, *(func.sum(table.c[name]) for name in COUNTERS))
+    if lower is not None:
+        query = query.where(table.c[bucket] >= lower)
+    if upper is not None:
+        query = query.where(table.c[bucket] < upper)
+    for column, value in zip(_columns(table, filters, DIMENSIONS), filters.values()):
+        query = query.where(column == value)
+    return conn.execute(query.group_by(*group))
+
+
+def rollup(
+    engine,
+    by: tuple[str, ...] = ("agent",),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    **filters: str,
+) -> list[dict]:
+    """
+    Turns, tickets opened and mean latency grouped by `by` (any of
+    DIMENSIONS, plus "hour" or "day" for a time series), for [since, until)
+    and the rows matching `filters` (dimension=value). Whole days are read
+    from the daily rollup, the hours around them from the hourly one.
+    `since` counts from the start of its hour (its day, when grouping by day).
+    """
+    by = tuple(by)
+    _check(by, (*BUCKETS, *DIMENSIONS))
+    _check(filters, DIMENSIONS)
+    if "hour" in by and "day" in by:
+        raise ValueError("Group by hour or by day, not both")
+    _, start_of_day = BUCKETS["day"]
+    _, start_of_hour = BUCKETS["hour"]
+    if "hour" in by:
+        ranges = [("hour", since and start_of_hour(since), until)]
+    elif "day" in by:
+        ranges = [("day", since and start_of_day(since), until)]
+    else:
+        lower = since and start_of_hour(since)
+        # Whole days: from the first midnight at or after `since` to the
+        # last midnight at or before `until`
+        first_day = lower
+        if lower is not None and lower != start_of_day(lower):
+            first_day = start_of_day(lower) + timedelta(days=1)
+        last_day = until and start_of_day(until)
+        if first_day is not None and last_day is not None and first_day >= last_day:
+            ranges = [("hour", lower, until)]
+        else:
+            ranges = [("day", first_day, last_day)]
+            if lower is not None and lower < first_day:
+                ranges.append(("hour", lower, first_day))
+            if until is not None and last_day < until:
+                ranges.append(("hour", last_day, until))
+
+    totals = defaultdict(lambda: [0, 0, 0.0, 0])
+    with engine.connect() as conn:
+        for bucket, lower, upper in ranges:
+            for row in _sums(conn, bucket, by, lower, upper, filters):
+                counts = totals[tuple(row[: len(by)])]
+                for i, value in enumerate(row[len(by) :]):
+                    counts[i] += value or 0
+    return [
+        {
+            **dict(zip(by, key)),
+            "turns": turns,
+            "tickets_opened": opened,
+            "mean_latency_ms": round(latency / latency_count, 1) if latency_count else None,
+        }
+        for key, (turns, opened, latency, latency_count) in sorted(totals.items())
+    ]
+
+
+def current(engine, by: tuple[str, ...] = ("urgency",), **filters: str) -> list[dict]:
+    """
+    All tickets seen (open or closed) by their latest classification, grouped
+    by `by` (any of DIMENSIONS) and limited to `filters` (dimension=value).
+    """
+    group = _columns(current_table, by, DIMENSIONS)
+    query = select(*group, func.sum(current_table.c.tickets).label("tickets"))
+    for column, value in zip(_columns(current_table, filters, DIMENSIONS), filters.values()):
+        query = query.where(column == value)
+    query = query.group_by(*group).having(func.sum(current_table.c.tickets) > 0).order_by(*group)
+    with engine.connect() as conn:
+        return [dict(row) for row in conn.execute(query).mappings()]
+
+
+def ticket(engine, ticket_id: str) -> dict | None:
+    """A ticket's latest classification and turn count, or None."""
+    with engine.connect() as conn:
+        row = conn.execute(
+            select(tickets_table).where(tickets_table.c.ticket_id == ticket_id)
+        ).mappings().first()
+    return dict(row) if row else None
+
+
+# -- CLI -----------------------------------------------------------------
+
+
+def parse_since(value: str) -> datetime:
+    """A time ago ("90m", "24h", "7d") or an ISO timestamp."""
+    match = re.fullmatch(r"(\d+)([mhd])", value)
+    if match:
+        unit = {"m": "minutes", "h": "hours", "d": "days"}[match.group(2)]
+        return datetime.now() - timedelta(**{unit: int(match.group(1))})
+    return datetime.fromisoformat(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--udahub", default=db.DB_PATHS[db.UDAHUB])
+    parser.add_argument(
+        "--by", default="agent", help=f"comma-separated; hour, day or {', '.join(DIMENSIONS)}"
+    )
+    parser.add_argument("--since", type=parse_since, help='e.g. "24h", "7d" or an ISO timestamp')
+    parser.add_argument("--until", type=parse_since)
+    parser.add_argument("--account", help="only this account")
+    parser.add_argument("--current", action="store_true", help="all tickets by latest classification")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the rollups from the raw turns")
+    args = parser.parse_args(argv)
+
+    db.configure(db.UDAHUB, args.udahub)
+    if args.rebuild:
+        started = time.perf_counter()
+        try:
+            folded = rebuild(db.get_engine(db.UDAHUB))
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Folded {folded:,} turns in {time.perf_counter() - started:.1f}s")
+        return 0
+
+    engine = db.get_engine(db.UDAHUB, readonly=True)
+    if not has_schema(engine):
+        parser.error("udahub.db has no analytics tables; run `python -m data.migrations upgrade` first")
+    by = tuple(name.strip() for name in args.by.split(",") if name.strip())
+    filters = {"account_id": args.account} if args.account else {}
+    try:
+        if args.current:
+            rows = current(engine, by, **filters)
+        else:
+            rows = rollup(engine, by, args.since, args.until, **filters)
+    except ValueError as e:
+        parser.error(str(e))
+    print(json.dumps(rows, indent=2, default=str))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Async checkpoint store: LangGraph's `AsyncSqliteSaver` (one aiosqlite
+connection, for ainvoke/astream) with the retention, compaction and
+metrics of `PooledSqliteSaver` (agentic/checkpoints.py). Its compactor is
+an asyncio task on the loop that drives the graph.
+
+Kept apart from agentic/checkpoints.py so that only async users import
+aiosqlite.
+"""
+import asyncio
+import logging
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from agentic.checkpoints import (
+    BUSY_TIMEOUT,
+    CHECKPOINT_DB_PATH,
+    COMPACT_INTERVAL,
+    KEEP_LAST,
+    VACUUM_PAGES,
+    NAMESPACES_SQL,
+    PRUNE_CHECKPOINTS_SQL,
+    PRUNE_WRITES_SQL,
+    THREAD_SIZES_SQL,
+    THREADS_OVER_LIMIT_SQL,
+    size_rows,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedAsyncSqliteSaver(AsyncSqliteSaver):
+    """AsyncSqliteSaver with the retention, compaction and metrics of `PooledSqliteSaver`."""
+
+    def __init__(self, conn, keep_last: int = KEEP_LAST, **kwargs):
+        super().__init__(conn, **kwargs)
+        self.keep_last = keep_last
+        self._compactor = None
+
+    @classmethod
+    async def connect(cls, path: str = CHECKPOINT_DB_PATH, **kwargs) -> "BoundedAsyncSqliteSaver":
+        """Open `path` with aiosqlite; must be awaited in the loop that will use it."""
+        conn = await aiosqlite.connect(path, timeout=BUSY_TIMEOUT)
+        saver = cls(conn, **kwargs)
+        await saver._run("PRAGMA synchronous=NORMAL")
+        return saver
+
+    async def _run(self, sql: str):
+        # Step a statement to completion, so it leaves no open cursor behind
+        async with self.conn.execute(sql) as cur:
+            await cur.fetchall()
+
+    async def setup(self) -> None:
+        if self.is_setup:
+            return
+        # Only takes effect on a new file; see vacuum() for existing ones
+        await self._run("PRAGMA auto_vacuum=INCREMENTAL")
+        await super().setup()
+
+    async def aclose(self):
+        await self.stop_compactor()
+        await self.conn.close()
+
+    # -- retention ---------------------------------------------------------
+
+    async def prune_thread(self, thread_id: str, keep_last: int | None = None) -> int:
+        """Delete all but the newest checkpoints of one thread; returns rows deleted."""
+        keep_last = self.keep_last if keep_last is None else keep_last
+        deleted = 0
+        await self.setup()
+        async with self.lock, self.conn.cursor() as cur:
+            await cur.execute(NAMESPACES_SQL, (thread_id,))
+            for (ns,) in await cur.fetchall():
+                await cur.execute(PRUNE_CHECKPOINTS_SQL, (thread_id, ns, thread_id, ns, keep_last))
+                deleted += cur.rowcount
+                await cur.execute(PRUNE_WRITES_SQL, (thread_id, ns, thread_id, ns))
+            await self.conn.commit()
+        return deleted
+
+    async def compact(self) -> int:
+        """Prune every thread over the limit, then shrink the WAL and file."""
+        await self.setup()
+        async with self.lock, self.conn.execute(THREADS_OVER_LIMIT_SQL, (self.keep_last,)) as cur:
+            threads = await cur.fetchall()
+        deleted = 0
+        for (thread_id,) in threads:
+            deleted += await self.prune_thread(thread_id)
+        async with self.lock:
+            await self._run(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+            await self._run("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    async def vacuum(self):
+        """See `PooledSqliteSaver.vacuum`."""
+        async with self.lock:
+            await self._run("PRAGMA auto_vacuum=INCREMENTAL")
+            await self._run("VACUUM")
+
+    def start_compactor(self, interval: float = COMPACT_INTERVAL):
+        """Run compact() every `interval` seconds as a task of the running loop."""
+        if self._compactor is not None:
+            return
+
+        async def run():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    deleted = await self.compact()
+                    if deleted:
+                        logger.info("Pruned %d checkpoints", deleted)
+                except Exception:
+                    logger.exception("Checkpoint compaction failed")
+
+        self._compactor = asyncio.get_running_loop().create_task(run())
+
+    async def stop_compactor(self):
+        if self._compactor is not None:
+            self._compactor.cancel()
+            try:
+                await self._compactor
+            except asyncio.CancelledError:
+                pass
+            self._compactor = None
+
+    # -- metrics -----------------------------------------------------------
+
+    async def thread_sizes(self, limit: int | None = None) -> list[dict]:
+        """Checkpoint count and stored bytes per thread_id, largest first."""
+        await self.setup()
+        async with self.lock, self.conn.execute(
+            THREAD_SIZES_SQL, (-1 if limit is None else limit,)
+        ) as cur:
+            return size_rows(await cur.fetchall())
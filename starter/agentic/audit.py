@@ -0,0 +1,83 @@
+"""
+Write-behind audit log for TicketMessage and AgentLog rows.
+
+Callers enqueue records and return immediately; a background thread drains
+the queue and writes them with bulk INSERTs, flushing when a batch fills up
+or when the oldest queued record has waited `flush_interval` seconds.
+Timestamps are taken at enqueue time so batching does not reorder history.
+Pending records are flushed on `close()`, which is also registered with
+atexit.
+
+The queue and worker are `BatchWriter` (agentic/batching.py).
+"""
+import threading
+import uuid
+from datetime import datetime
+from sqlalchemy import insert
+from data.models.udahub import TicketMessage, AgentLog, RoleEnum
+from agentic import db
+from agentic.batching import BatchWriter
+
+
+class AuditLogWriter(BatchWriter):
+    """Buffered, batched writer for ticket messages and agent logs."""
+
+    name = "audit-log-writer"
+
+    def log_message(self, ticket_id: str, role: RoleEnum, content: str) -> str:
+        """Queue a TicketMessage; returns its message_id."""
+        message_id = f"msg-{uuid.uuid4().hex[:8]}"
+        self._put(
+            (
+                TicketMessage,
+                {
+                    "message_id": message_id,
+                    "ticket_id": ticket_id,
+                    "role": role,
+                    "content": content,
+                    "created_at": datetime.now(),
+                },
+            )
+        )
+        return message_id
+
+    def log_agent(self, ticket_id: str, agent_name: str, action: str, details: str) -> str:
+        """Queue an AgentLog row; returns its log_id."""
+        log_id = f"log-{uuid.uuid4().hex[:8]}"
+        self._put(
+            (
+                AgentLog,
+                {
+                    "log_id": log_id,
+                    "ticket_id": ticket_id,
+                    "agent_name": agent_name,
+                    "action": action,
+                    "details": details,
+                    "created_at": datetime.now(),
+                },
+            )
+        )
+        return log_id
+
+    def write_batch(self, records: list):
+        rows = {TicketMessage: [], AgentLog: []}
+        for model, values in records:
+            rows[model].append(values)
+        # One transaction, one executemany per table
+        with self.engine.begin() as conn:
+            for model, values in rows.items():
+                if values:
+                    conn.execute(insert(model), values)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer() -> AuditLogWriter:
+    """Process-wide writer for the udahub database."""
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer._closed:
+            _writer = AuditLogWriter(db.get_engine(db.UDAHUB))
+        return _writer
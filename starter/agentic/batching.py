@@ -0,0 +1,132 @@
+"""
+Write-behind batching: callers enqueue records and return immediately; a
+background thread drains the queue and hands them to `write_batch` in
+batches, flushing when a batch fills up or when the oldest queued record has
+waited `flush_interval` seconds. Pending records are flushed on `close()`,
+which is also registered with atexit.
+
+Used by the audit log (agentic/audit.py), the analytics rollups
+(agentic/analytics.py) and the triage cache file
+(agentic/agents/triage_cache.py). Standard library only, so importing it
+stays cheap.
+"""
+import abc
+import atexit
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 0.5  # seconds
+MAX_QUEUE = 100_000
+WRITE_RETRIES = 3
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class BatchWriter(abc.ABC):
+    """
+    Queue plus background worker; subclasses implement `write_batch`, which
+    is retried WRITE_RETRIES times before the batch is dropped.
+    """
+
+    name = "batch-writer"
+
+    def __init__(
+        self,
+        engine,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        max_queue: int = MAX_QUEUE,
+    ):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _put(self, record):
+        if self._closed:
+            raise RuntimeError(f"{self.name} is closed")
+        # Blocks only when MAX_QUEUE records are already waiting (backpressure)
+        self._queue.put(record)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Block until everything queued so far is written."""
+        if self._closed:
+            return True
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self, timeout: float | None = 10.0):
+        """Flush pending records and stop the worker thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    # -- worker ------------------------------------------------------------
+
+    def _worker(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._write(pending)
+                return
+            if isinstance(item, _FlushRequest):
+                self._write(pending)
+                pending, deadline = [], None
+                item.done.set()
+                continue
+            if item is not None:
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if pending and (
+                len(pending) >= self.batch_size or time.monotonic() >= deadline
+            ):
+                self._write(pending)
+                pending, deadline = [], None
+
+    def _write(self, records):
+        if not records:
+            return
+        for attempt in range(1, WRITE_RETRIES + 1):
+            try:
+                self.write_batch(records)
+                self.written += len(records)
+                return
+            except Exception:
+                if attempt == WRITE_RETRIES:
+                    self.dropped += len(records)
+                    logger.exception("%s: dropping %d records", self.name, len(records))
+                    return
+                time.sleep(0.1 * 2**attempt)
+
+    @abc.abstractmethod
+    def write_batch(self, records: list):
+        """Write one batch; raising makes the worker retry it."""
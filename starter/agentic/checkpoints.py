@@ -0,0 +1,237 @@
+"""
+Checkpoint store for the orchestrator.
+
+`PooledSqliteSaver` is a LangGraph `SqliteSaver` that gives every thread its
+own WAL-mode connection instead of sharing one connection behind a global
+lock, so concurrent tickets read checkpoints in parallel and only serialize
+on the SQLite write lock (waited on via busy_timeout). A thread's connection
+is closed when the thread exits, so servers that keep starting threads do
+not pile up file handles.
+
+The store is bounded: only the newest `keep_last` checkpoints per thread_id
+(and namespace) are kept. A background compactor prunes older ones, truncates
+the WAL and returns free pages to the OS with incremental vacuum.
+`thread_sizes()` reports how many checkpoints and bytes each thread holds.
+
+The async counterpart is agentic/async_checkpoints.py.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "checkpoints.db")
+KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "20"))
+COMPACT_INTERVAL = float(os.getenv("CHECKPOINT_COMPACT_INTERVAL", "300"))
+BUSY_TIMEOUT = 30.0  # seconds
+# Pages released per incremental_vacuum run, so compaction never stalls writers
+VACUUM_PAGES = 2000
+
+# Retention and metrics queries, shared by the sync and async savers
+NAMESPACES_SQL = "SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?"
+# checkpoint_ids are time-ordered (uuid6), newest sorts last
+PRUNE_CHECKPOINTS_SQL = """
+    DELETE FROM checkpoints
+    WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+        SELECT checkpoint_id FROM checkpoints
+        WHERE thread_id = ? AND checkpoint_ns = ?
+        ORDER BY checkpoint_id DESC LIMIT ?
+    )
+"""
+PRUNE_WRITES_SQL = """
+    DELETE FROM writes
+    WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+        SELECT checkpoint_id FROM checkpoints
+        WHERE thread_id = ? AND checkpoint_ns = ?
+    )
+"""
+THREADS_OVER_LIMIT_SQL = """
+    SELECT DISTINCT thread_id FROM (
+        SELECT thread_id FROM checkpoints
+        GROUP BY thread_id, checkpoint_ns
+        HAVING COUNT(*) > ?
+    )
+"""
+THREAD_SIZES_SQL = """
+    SELECT c.thread_id, c.checkpoints, c.bytes + COALESCE(w.bytes, 0)
+    FROM (
+        SELECT thread_id, COUNT(*) AS checkpoints,
+               SUM(LENGTH(checkpoint) + LENGTH(metadata)) AS bytes
+        FROM checkpoints GROUP BY thread_id
+    ) c
+    LEFT JOIN (
+        SELECT thread_id, SUM(LENGTH(value)) AS bytes
+        FROM writes GROUP BY thread_id
+    ) w ON w.thread_id = c.thread_id
+    ORDER BY 3 DESC
+    LIMIT ?
+"""
+
+
+def size_rows(rows) -> list[dict]:
+    return [
+        {"thread_id": thread_id, "checkpoints": count, "bytes": size}
+        for thread_id, count, size in rows
+    ]
+
+
+class _ThreadConnection:
+    """Holds a thread's connection in its thread-local; see `PooledSqliteSaver.conn`."""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+def _release(connections: list, lock: threading.Lock, conn: sqlite3.Connection):
+    with lock:
+        if conn in connections:
+            connections.remove(conn)
+    conn.close()
+
+
+class PooledSqliteSaver(SqliteSaver):
+    """SqliteSaver with per-thread connections and checkpoint retention."""
+
+    def __init__(self, path: str = CHECKPOINT_DB_PATH, keep_last: int = KEEP_LAST, **kwargs):
+        self.path = path
+        self.keep_last = keep_last
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._setup_lock = threading.Lock()
+        self._compactor = None
+        self._stop = threading.Event()
+        super().__init__(self._connect(), **kwargs)
+
+    # -- connections -------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _own(self, conn: sqlite3.Connection) -> sqlite3.Connection:
+        # The holder lives only in this thread's local, which is cleared when
+        # the thread exits; its finalizer then closes the connection
+        holder = self._local.holder = _ThreadConnection(conn)
+        weakref.finalize(holder, _release, self._connections, self._connections_lock, conn)
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            return self._own(self._connect())
+        return holder.conn
+
+    @conn.setter
+    def conn(self, value: sqlite3.Connection):
+        # SqliteSaver.__init__ assigns the first connection; it becomes the
+        # creating thread's connection
+        self._own(value)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        with self._setup_lock:
+            if self.is_setup:
+                return
+            # Only takes effect on a new file; see vacuum() for existing ones
+            self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            super().setup()
+
+    @contextmanager
+    def cursor(self, transaction: bool = True):
+        # Same contract as SqliteSaver.cursor, minus the process-wide lock:
+        # each thread owns its connection
+        self.setup()
+        conn = self.conn
+        cur = conn.cursor()
+        try:
+            yield cur
+        finally:
+            if transaction:
+                conn.commit()
+            cur.close()
+
+    def close(self):
+        self.stop_compactor()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    # -- retention ---------------------------------------------------------
+
+    def prune_thread(self, thread_id: str, keep_last: int | None = None) -> int:
+        """Delete all but the newest checkpoints of one thread; returns rows deleted."""
+        keep_last = self.keep_last if keep_last is None else keep_last
+        deleted = 0
+        with self.cursor() as cur:
+            for (ns,) in cur.execute(NAMESPACES_SQL, (thread_id,)).fetchall():
+                cur.execute(PRUNE_CHECKPOINTS_SQL, (thread_id, ns, thread_id, ns, keep_last))
+                deleted += cur.rowcount
+                cur.execute(PRUNE_WRITES_SQL, (thread_id, ns, thread_id, ns))
+        return deleted
+
+    def compact(self) -> int:
+        """Prune every thread over the limit, then shrink the WAL and file."""
+        with self.cursor(transaction=False) as cur:
+            threads = cur.execute(THREADS_OVER_LIMIT_SQL, (self.keep_last,)).fetchall()
+        deleted = sum(self.prune_thread(thread_id) for (thread_id,) in threads)
+        conn = self.conn
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def vacuum(self):
+        """
+        Full VACUUM, also switching an existing file to incremental
+        auto-vacuum. Blocks writers for its duration; run off-peak.
+        """
+        conn = self.conn
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+
+    def start_compactor(self, interval: float = COMPACT_INTERVAL):
+        """Run compact() every `interval` seconds on a daemon thread."""
+        if self._compactor is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    deleted = self.compact()
+                    if deleted:
+                        logger.info("Pruned %d checkpoints", deleted)
+                except Exception:
+                    logger.exception("Checkpoint compaction failed")
+
+        self._stop.clear()
+        self._compactor = threading.Thread(target=run, name="checkpoint-compactor", daemon=True)
+        self._compactor.start()
+
+    def stop_compactor(self):
+        if self._compactor is not None:
+            self._stop.set()
+            self._compactor.join()
+            self._compactor = None
+
+    # -- metrics -----------------------------------------------------------
+
+    def thread_sizes(self, limit: int | None = None) -> list[dict]:
+        """Checkpoint count and stored bytes per thread_id, largest first."""
+        with self.cursor(transaction=False) as cur:
+            rows = cur.execute(THREAD_SIZES_SQL, (-1 if limit is None else limit,)).fetchall()
+        return size_rows(rows)
+
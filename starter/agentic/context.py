@@ -0,0 +1,155 @@
+"""
+Context management for long tickets.
+
+Every node gets a token budget for the conversation history it sends to the
+LLM. The most recent turns are passed verbatim; anything older is folded into
+a rolling summary kept in `AgentState["summary"]`.
+
+The summary is incremental: `AgentState["summarized_count"]` records how many
+leading messages it already covers, and only messages that newly fall out of
+the window are sent to the summarizer together with the previous summary.
+When the history outgrows HISTORY_BUDGET it is cut back to LOW_WATERMARK of
+the budget, so the summarizer runs once every few turns, not on every turn.
+"""
+import os
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+# Tokens of verbatim history each node may send
+NODE_BUDGETS = {
+    "triage": 1000,
+    "billing_agent": 3000,
+    "booking_agent": 3000,
+    "tech_agent": 3000,
+    "retention_agent": 3000,
+}
+DEFAULT_BUDGET = 3000
+
+# Unsummarized history allowed before older turns are folded into the summary.
+# Kept at or below the specialist budgets so they always see every turn that
+# is not in the summary yet.
+HISTORY_BUDGET = int(os.getenv("CONTEXT_HISTORY_BUDGET", "3000"))
+LOW_WATERMARK = 0.5
+
+SUMMARY_PROMPT = """You maintain a running summary of a CultPass customer support conversation.
+Update the summary with the new messages below. Keep facts the agents need later:
+the customer's name, email and user_id, subscription details, reservations and
+experiences discussed, what was requested, what was done and what is still open.
+Be concise; do not add anything that is not in the conversation.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+# Built on first use; can be replaced with any chat model
+summarizer = None
+
+
+def get_summarizer():
+    global summarizer
+    if summarizer is None:
+        from agentic.llm import get_chat_model
+
+        summarizer = get_chat_model(temperature=0)
+    return summarizer
+
+
+def count_tokens(messages: list[BaseMessage]) -> int:
+    return count_tokens_approximately(messages)
+
+
+def _turn_starts(messages: list[BaseMessage], start: int) -> list[int]:
+    """Indexes where a user turn begins; cuts only happen there."""
+    return [i for i in range(start, len(messages)) if isinstance(messages[i], HumanMessage)]
+
+
+def window_start(messages: list[BaseMessage], start: int, budget: int) -> int:
+    """
+    Earliest turn boundary at or after `start` whose suffix fits the budget.
+    The latest turn is always kept, even when it alone exceeds the budget.
+    """
+    starts = _turn_starts(messages, start)
+    if not starts:
+        return start
+    chosen = starts[-1]
+    total = count_tokens(messages[chosen:])
+    # Walk back one turn at a time, counting each turn once
+    for i in range(len(starts) - 2, -1, -1):
+        total += count_tokens(messages[starts[i] : starts[i + 1]])
+        if total > budget:
+            break
+        chosen = starts[i]
+    return chosen
+
+
+def _render(messages: list[BaseMessage]) -> str:
+    return "\n".join(f"{m.type}: {m.content}" for m in messages if m.content)
+
+
+def _fold_range(state) -> tuple[int, int]:
+    """(from, to) slice of messages that should be folded this turn, if any."""
+    messages = state["messages"]
+    done = state.get("summarized_count", 0)
+    if count_tokens(messages[done:]) <= HISTORY_BUDGET:
+        return done, done
+    return done, window_start(messages, done, int(HISTORY_BUDGET * LOW_WATERMARK))
+
+
+def _summary_prompt(state, done: int, upto: int) -> str:
+    return SUMMARY_PROMPT.format(
+        summary=state.get("summary") or "(none yet)",
+        messages=_render(state["messages"][done:upto]),
+    )
+
+
+def context_nodes(get_model=get_summarizer):
+    """
+    Sync and async context node, summarizing with the chat model returned by
+    `get_model` (called on the first fold, so the model is built lazily).
+    """
+
+    def context_node(state):
+        """Fold turns that left the history window into the rolling summary."""
+        done, upto = _fold_range(state)
+        if upto <= done:
+            return {}
+        summary = get_model().invoke(_summary_prompt(state, done, upto)).content
+        return {"summary": summary, "summarized_count": upto}
+
+    async def acontext_node(state):
+        done, upto = _fold_range(state)
+        if upto <= done:
+            return {}
+        summary = (await get_model().ainvoke(_summary_prompt(state, done, upto))).content
+        return {"summary": summary, "summarized_count": upto}
+
+    return context_node, acontext_node
+
+
+# Nodes on the shared summarizer
+context_node, acontext_node = context_nodes()
+
+
+def windowed_messages(state, node: str) -> list[BaseMessage]:
+    """
+    The history a node should send: the summary (if any) as a system message
+    followed by the newest turns that fit the node's budget.
+    """
+    messages = state["messages"]
+    budget = NODE_BUDGETS.get(node, DEFAULT_BUDGET)
+    start = window_start(messages, state.get("summarized_count", 0), budget)
+    window = list(messages[start:])
+    if state.get("summary"):
+        window.insert(
+            0, SystemMessage(content=f"Summary of the earlier conversation:\n{state['summary']}")
+        )
+    return window
+
+
+def windowed_state(state, node: str) -> dict:
+    """Copy of the state with `messages` replaced by the node's window."""
+    return {**state, "messages": windowed_messages(state, node)}
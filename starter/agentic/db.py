@@ -0,0 +1,147 @@
+"""
+Shared engines and session factories for cultpass.db and udahub.db.
+
+Every tool, the chat driver and the audit writer get their engines here, so
+each database file has one connection pool per process instead of one per
+module. Connections are tuned on connect:
+- WAL journal, so readers never block on a writer (and vice versa)
+- synchronous=NORMAL, which is durable under WAL at a fraction of the fsyncs
+- a larger page cache and memory-mapped reads
+- busy_timeout, so a briefly locked database is waited on, not an error
+
+Read-only tools use separate engines opened with mode=ro, which can never take
+the write lock.
+
+Paths default to the working directory and can be overridden with the
+CULTPASS_DB_PATH / UDAHUB_DB_PATH environment variables or `configure()`.
+"""
+import os
+import threading
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+CULTPASS = "cultpass"
+UDAHUB = "udahub"
+
+DB_PATHS = {
+    CULTPASS: os.getenv("CULTPASS_DB_PATH", "cultpass.db"),
+    UDAHUB: os.getenv("UDAHUB_DB_PATH", "udahub.db"),
+}
+
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # KiB, i.e. 64 MB per connection
+    "mmap_size": 268435456,  # 256 MB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,  # ms
+}
+# journal_mode is a property of the file and needs write access to change
+READONLY_SKIP = {"journal_mode"}
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+_engines = {}
+_sessionmakers = {}
+_lock = threading.RLock()
+
+
+def configure(name: str, path: str):
+    """
+    Point a database at another file. Existing engines for it are dropped;
+    the tools pick up the new file on their next call.
+    """
+    with _lock:
+        DB_PATHS[name] = path
+        for key in [k for k in _engines if k[0] == name]:
+            engine = _engines.pop(key)
+            _sessionmakers.pop(key, None)
+            if hasattr(engine, "sync_engine"):
+                engine.sync_engine.dispose()
+            else:
+                engine.dispose()
+
+
+def _apply_pragmas(engine, name: str, readonly: bool):
+    if readonly:
+        # mode=ro cannot switch the file to WAL or create it, so open it once
+        # read-write before the first read-only connection
+        @event.listens_for(engine, "first_connect")
+        def prepare_file(dbapi_connection, connection_record):
+            get_engine(name).connect().close()
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in PRAGMAS.items():
+            if readonly and pragma in READONLY_SKIP:
+                continue
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+
+def _url(name: str, driver: str, readonly: bool) -> str:
+    path = DB_PATHS[name]
+    if readonly:
+        return f"sqlite+{driver}:///file:{os.path.abspath(path)}?mode=ro&uri=true"
+    return f"sqlite+{driver}:///{path}"
+
+
+def get_engine(name: str, readonly: bool = False):
+    """Process-wide engine for `name` (CULTPASS or UDAHUB)."""
+    key = (name, "sync", readonly)
+    with _lock:
+        if key not in _engines:
+            engine = create_engine(
+                _url(name, "pysqlite", readonly),
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+            )
+            _apply_pragmas(engine, name, readonly)
+            _engines[key] = engine
+        return _engines[key]
+
+
+def get_sessionmaker(name: str, readonly: bool = False):
+    key = (name, "sync", readonly)
+    with _lock:
+        if key not in _sessionmakers:
+            _sessionmakers[key] = sessionmaker(bind=get_engine(name, readonly))
+        return _sessionmakers[key]
+
+
+def get_async_engine(name: str, readonly: bool = False):
+    """Async (aiosqlite) engine for `name`, tuned like the sync one."""
+    key = (name, "async", readonly)
+    with _lock:
+        if key not in _engines:
+            engine = create_async_engine(
+                _url(name, "aiosqlite", readonly),
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+            )
+            _apply_pragmas(engine.sync_engine, name, readonly)
+            _engines[key] = engine
+        return _engines[key]
+
+
+def get_async_sessionmaker(name: str, readonly: bool = False):
+    key = (name, "async", readonly)
+    with _lock:
+        if key not in _sessionmakers:
+            _sessionmakers[key] = async_sessionmaker(
+                bind=get_async_engine(name, readonly), expire_on_commit=False
+            )
+        return _sessionmakers[key]
+
+
+def dispose_all():
+    """Close every pooled connection, e.g. before forking worker processes."""
+    with _lock:
+        for engine in _engines.values():
+            if hasattr(engine, "sync_engine"):
+                engine.sync_engine.dispose()
+            else:
+                engine.dispose()
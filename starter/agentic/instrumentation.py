@@ -0,0 +1,381 @@
+"""
+Per-step instrumentation for the orchestrator.
+
+Graph nodes (`instrument_node`) and tools (`instrument_tool`) are wrapped so
+every call records a `StepRecord` with:
+- wall time
+- SQL statements issued and time spent in SQLite (SQLAlchemy engine events)
+- LLM calls, time spent waiting on the LLM and token usage (a callback
+  handler registered for the duration of the step)
+- the ticket (thread_id) and the routed agent (`AgentState["destination"]`)
+
+Steps nest: a tool call's queries also count towards the node that called it.
+Records feed in-process latency histograms (p50/p95/p99, see `snapshot()`)
+and any registered exporters. `AgentLogExporter` persists one AgentLog row
+per step through the audit writer; it is enabled with
+INSTRUMENTATION_AGENT_LOG=1 or `add_exporter(AgentLogExporter())`.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field, fields
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+AGENT_LOG_STEPS = os.getenv("INSTRUMENTATION_AGENT_LOG", "0") == "1"
+
+
+@dataclass
+class StepRecord:
+    kind: str  # "node" or "tool"
+    name: str
+    ticket_id: str | None = None
+    destination: str | None = None
+    seconds: float = 0.0
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    llm_calls: int = 0
+    llm_seconds: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    error: str | None = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, **deltas):
+        # Parallel tool calls update their node's step from several threads
+        with self._lock:
+            for name, value in deltas.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != "_lock"}
+
+
+class Histogram:
+    """
+    Log-bucketed histogram: constant memory, percentiles within ~5% of the
+    true value.
+    """
+
+    GROWTH = 1.05
+    MIN_VALUE = 1e-5
+
+    def __init__(self):
+        self.buckets = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        if value <= self.MIN_VALUE:
+            bucket = 0
+        else:
+            bucket = int(math.log(value / self.MIN_VALUE, self.GROWTH)) + 1
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.MIN_VALUE * self.GROWTH**bucket, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(1000 * self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(1000 * self.percentile(0.50), 3),
+            "p95_ms": round(1000 * self.percentile(0.95), 3),
+            "p99_ms": round(1000 * self.percentile(0.99), 3),
+            "max_ms": round(1000 * self.max, 3),
+        }
+
+
+class Metrics:
+    """Histograms and counters per (kind, name), aggregated from step records."""
+
+    COUNTERS = (
+        "errors",
+        "db_queries",
+        "db_seconds",
+        "llm_calls",
+        "llm_seconds",
+        "input_tokens",
+        "output_tokens",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(Histogram)
+        self.counters = defaultdict(lambda: dict.fromkeys(self.COUNTERS, 0))
+
+    def record(self, step: StepRecord):
+        key = f"{step.kind}:{step.name}"
+        with self._lock:
+            self.latency[key].add(step.seconds)
+            counters = self.counters[key]
+            counters["errors"] += step.error is not None
+            for name in self.COUNTERS[1:]:
+                counters[name] += getattr(step, name)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                key: {**self.latency[key].summary(), **self.counters[key]}
+                for key in sorted(self.latency)
+            }
+
+    def reset(self):
+        with self._lock:
+            self.latency.clear()
+            self.counters.clear()
+
+
+class LoggingExporter:
+    """Logs every step at DEBUG level."""
+
+    def export(self, step: StepRecord):
+        logger.debug("step %s", step.as_dict())
+
+
+class AgentLogExporter:
+    """One AgentLog row per step (action "Step"), written behind by the audit writer."""
+
+    def __init__(self, writer=None):
+        self.writer = writer
+
+    def export(self, step: StepRecord):
+        if not step.ticket_id:
+            return
+        if self.writer is None:
+            from agentic.audit import get_audit_writer
+
+            self.writer = get_audit_writer()
+        details = step.as_dict()
+        for name in ("seconds", "db_seconds", "llm_seconds"):
+            details[name] = round(details[name], 6)
+        self.writer.log_agent(
+            step.ticket_id,
+            agent_name=step.destination or step.name,
+            action="Step",
+            details=json.dumps(details),
+        )
+
+
+metrics = Metrics()
+exporters = []
+
+
+def add_exporter(exporter):
+    """Register an object with an `export(step: StepRecord)` method."""
+    exporters.append(exporter)
+
+
+def snapshot() -> dict:
+    """Latency percentiles and counters per node and tool."""
+    return metrics.snapshot()
+
+
+# -- collection ----------------------------------------------------------
+
+# Steps currently running in this context, outermost first
+_active_steps = contextvars.ContextVar("instrumentation_steps", default=())
+
+
+def _add_to_active(**deltas):
+    for step in _active_steps.get():
+        step.add(**deltas)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_query(conn, cursor, statement, parameters, context, executemany):
+    if _active_steps.get():
+        # Statements on one connection run one at a time
+        conn.info["instrumentation_started"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("instrumentation_started", None)
+    if started is not None:
+        _add_to_active(db_queries=1, db_seconds=time.perf_counter() - started)
+
+
+class _LLMUsageHandler(BaseCallbackHandler):
+    """Adds LLM time and token usage to the steps active in the caller's context."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = (_active_steps.get(), time.perf_counter())
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = (_active_steps.get(), time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        steps, started = self._started.pop(run_id, ((), None))
+        usage = {"input_tokens": 0, "output_tokens": 0}
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if metadata:
+                    usage["input_tokens"] += metadata.get("input_tokens", 0)
+                    usage["output_tokens"] += metadata.get("output_tokens", 0)
+        elapsed = time.perf_counter() - started if started is not None else 0.0
+        for step in steps:
+            step.add(llm_calls=1, llm_seconds=elapsed, **usage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+
+# LangChain adds the handler to every run configured while this is set, i.e.
+# to every LLM call made inside an instrumented step
+_usage_handler = contextvars.ContextVar("instrumentation_usage_handler", default=None)
+register_configure_hook(_usage_handler, inheritable=True)
+_handler = _LLMUsageHandler()
+
+
+class _StepScope:
+    """Pushes a step onto the active stack for the duration of a call."""
+
+    def __init__(self, step: StepRecord):
+        self.step = step
+
+    def __enter__(self):
+        self._steps = _active_steps.set(_active_steps.get() + (self.step,))
+        self._handler = _usage_handler.set(_handler)
+        self._start = time.perf_counter()
+        return self.step
+
+    def __exit__(self, exc_type, exc, tb):
+        self.step.seconds = time.perf_counter() - self._start
+        if exc is not None:
+            self.step.error = repr(exc)
+        _usage_handler.reset(self._handler)
+        _active_steps.reset(self._steps)
+        _finish(self.step)
+        return False
+
+
+def _finish(step: StepRecord):
+    metrics.record(step)
+    for exporter in exporters:
+        try:
+            exporter.export(step)
+        except Exception:
+            logger.exception("Instrumentation exporter %r failed", exporter)
+
+
+def _parent() -> StepRecord | None:
+    steps = _active_steps.get()
+    return steps[-1] if steps else None
+
+
+# -- wrappers ------------------------------------------------------------
+
+
+def instrument_node(name: str, func):
+    """
+    Wrap a graph node (sync or async). The wrapper takes the RunnableConfig
+    to read the thread_id; the destination is taken from the state, or from
+    the node's own update for the triage node.
+    """
+
+    def start(state, config) -> StepRecord:
+        configurable = (config or {}).get("configurable", {})
+        return StepRecord(
+            kind="node",
+            name=name,
+            ticket_id=configurable.get("thread_id"),
+            destination=state.get("destination") or None,
+        )
+
+    def finish(step: StepRecord, result):
+        if isinstance(result, dict) and result.get("destination"):
+            step.destination = result["destination"]
+
+    # No functools.wraps here: RunnableLambda inspects the signature to decide
+    # whether to pass `config`, and wraps would expose the node's own
+    if inspect.iscoroutinefunction(func):
+
+        async def async_wrapper(state, config=None):
+            step = start(state, config)
+            with _StepScope(step):
+                result = await func(state)
+                finish(step, result)
+            return result
+
+        async_wrapper.__name__ = func.__name__
+        return async_wrapper
+
+    def wrapper(state, config=None):
+        step = start(state, config)
+        with _StepScope(step):
+            result = func(state)
+            finish(step, result)
+        return result
+
+    wrapper.__name__ = func.__name__
+    return wrapper
+
+
+def instrument_tool(tool):
+    """Wrap a @tool's sync function and coroutine in place; returns the tool."""
+    name = tool.name
+
+    def start() -> StepRecord:
+        parent = _parent()
+        return StepRecord(
+            kind="tool",
+            name=name,
+            ticket_id=parent.ticket_id if parent else None,
+            destination=parent.destination if parent else None,
+        )
+
+    if tool.func is not None:
+        func = tool.func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _StepScope(start()):
+                return func(*args, **kwargs)
+
+        tool.func = wrapper
+
+    if tool.coroutine is not None:
+        coroutine = tool.coroutine
+
+        @functools.wraps(coroutine)
+        async def async_wrapper(*args, **kwargs):
+            with _StepScope(start()):
+                return await coroutine(*args, **kwargs)
+
+        tool.coroutine = async_wrapper
+
+    return tool
+
+
+if AGENT_LOG_STEPS:
+    add_exporter(AgentLogExporter())
@@ -0,0 +1,386 @@
+"""
+Incremental ingestion of knowledge-base articles into udahub.db.
+
+Reads JSONL files (or directories of them) in fixed-size chunks, so memory
+does not grow with the feed, and for each chunk:
+1. hashes every article (title, content, tags)
+2. upserts only the new and changed ones, in one transaction, and splits
+   them into passages (agentic/tools/passages.py); the FTS indexes follow
+   through their triggers (agentic/tools/search_index.py)
+3. embeds the changed articles for the vector index
+
+After the last chunk, articles of the ingested accounts that were not in the
+feed are deleted, and each account's vector index shard is patched with its
+changed and deleted articles and saved atomically; running searches pick it
+up on their next query (agentic/tools/rag_tools.py). Nothing is reloaded or re-indexed
+as a whole, so a feed can be pushed while agents keep answering:
+
+    cd starter
+    python -m agentic.kb_ingest data/external/cultpass_articles.jsonl
+    python -m agentic.kb_ingest kb_feed/ --account cultpass --no-delete
+    python -m agentic.kb_ingest --prepare   # no feed: only set up search
+
+Records are `{"title", "content", "tags"}`, optionally with `article_id` and
+`account_id`. Without an id an article is matched by account and title.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+import numpy as np
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from data.models.udahub import Knowledge
+from agentic import db
+from agentic.tools import passages, rag_tools, vector_index
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000  # articles per transaction
+# Changed articles embedded before the vector index shards are patched and saved
+INDEX_FLUSH = 20_000
+DEFAULT_ACCOUNT = rag_tools.DEFAULT_ACCOUNT
+SEEN_TABLE = "kb_ingest_seen"  # TEMP table of the ids in the feed
+
+
+def content_hash(title: str, content: str, tags: str | None) -> str:
+    return hashlib.sha256(json.dumps([title, content, tags or ""]).encode("utf-8")).hexdigest()
+
+
+def source_files(paths: list[str]) -> list[str]:
+    """The JSONL files to read, directories expanded in name order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "**", "*.jsonl"), recursive=True))
+        else:
+            files.append(path)
+    return files
+
+
+def iter_chunks(paths: list[str], account: str, chunk_size: int = CHUNK_SIZE):
+    """Yield lists of up to chunk_size normalised article dicts."""
+    chunk = []
+    for path in source_files(paths):
+        with open(path, encoding="utf-8") as f:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    article = {
+                        "article_id": record.get("article_id"),
+                        "account_id": record.get("account_id") or account,
+                        "title": record["title"],
+                        "content": record["content"],
+                        "tags": record.get("tags"),
+                    }
+                except (ValueError, KeyError) as e:
+                    raise ValueError(f"{path}:{number}: invalid article ({e})") from e
+                article["content_hash"] = content_hash(
+                    article["title"], article["content"], article["tags"]
+                )
+                chunk.append(article)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def _resolve_ids(conn, chunk: list[dict]) -> dict:
+    """
+    Give id-less articles the id of the stored article with the same account
+    and title (or a stable new one); returns
+    {article_id: (stored hash, stored account)}.
+    """
+    without_id = {}
+    for article in chunk:
+        if not article["article_id"]:
+            without_id.setdefault(article["account_id"], set()).add(article["title"])
+    by_title = {}
+    for account_id, titles in without_id.items():
+        rows = conn.execute(
+            select(Knowledge.title, func.min(Knowledge.article_id))
+            .where(Knowledge.account_id == account_id, Knowledge.title.in_(titles))
+            .group_by(Knowledge.title)
+        )
+        by_title.update({(account_id, title): article_id for title, article_id in rows})
+    for article in chunk:
+        if not article["article_id"]:
+            key = (article["account_id"], article["title"])
+            article["article_id"] = by_title.get(key) or str(
+                uuid.uuid5(uuid.NAMESPACE_URL, f"{key[0]}/{key[1]}")
+            )
+    rows = conn.execute(
+        select(Knowledge.article_id, Knowledge.content_hash, Knowledge.account_id).where(
+            Knowledge.article_id.in_([article["article_id"] for article in chunk])
+        )
+    )
+    return {article_id: (stored_hash, account_id) for article_id, stored_hash, account_id in rows}
+
+
+class Ingest:
+    """One pass over a feed; see module docstring."""
+
+    def __init__(
+        self,
+        engine,
+        account: str = DEFAULT_ACCOUNT,
+        index_dir: str | None = None,
+        embedder=None,
+        delete: bool = True,
+    ):
+        self.engine = engine
+        self.account = account
+        self.index_dir = index_dir  # shard root; None: leave the vector index alone
+        self.embedder = embedder
+        self.delete = delete
+        self.accounts = set()
+        self.stats = dict.fromkeys(
+            ("read", "inserted", "updated", "unchanged", "deleted", "embedded"), 0
+        )
+        # account_id -> its current shard, or None if it is rebuilt after the pass
+        self.shards = {}
+        self._pending = {}  # account_id -> ([article_id, ...], [vector batch, ...])
+        self._pending_count = 0
+        self._moved = {}  # account_id -> articles that moved to another account
+
+    def run(self, paths: list[str], chunk_size: int = CHUNK_SIZE) -> dict:
+        started = time.perf_counter()
+        # Migrations, passages of articles stored before them, FTS indexes;
+        # the shards are brought up to date after the pass
+        rag_tools.prepare(self.engine, shards=False)
+        with self.engine.connect() as conn:
+            conn.exec_driver_sql(
+                f"CREATE TEMP TABLE IF NOT EXISTS {SEEN_TABLE} (article_id TEXT PRIMARY KEY)"
+            )
+            conn.exec_driver_sql(f"DELETE FROM {SEEN_TABLE}")
+            conn.commit()
+            for chunk in iter_chunks(paths, self.account, chunk_size):
+                self._write(conn, self._ingest_chunk, chunk)
+            removed = self._write(conn, self._delete_missing) if self.delete else {}
+            conn.exec_driver_sql(f"DROP TABLE {SEEN_TABLE}")
+            conn.commit()
+        # Unchanged articles stored before passages existed
+        passages.backfill(self.engine)
+        if self.index_dir is not None:
+            for account_id, ids in self._moved.items():
+                removed.setdefault(account_id, []).extend(ids)
+            self._update_shards(removed, final=True)
+            # Accounts not in the feed whose shards are missing or stale
+            with Session(self.engine) as session:
+                rebuilt = vector_index.build_shards(session, self.index_dir, self.embedder)
+            self.stats["embedded"] += sum(rebuilt.values())
+        seconds = time.perf_counter() - started
+        return {
+            **self.stats,
+            "seconds": round(seconds, 3),
+            "articles_per_s": round(self.stats["read"] / seconds, 1) if seconds else 0.0,
+        }
+
+    @staticmethod
+    def _write(conn, step, *args):
+        # Take the write lock up front, so the reads of the step see the
+        # rows it writes over (same pattern as data/migrations.py)
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            result = step(conn, *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _shard(self, account_id: str):
+        """Load an account's shard on its first article; None if it must be rebuilt."""
+        if account_id not in self.shards:
+            path = vector_index.shard_path(self.index_dir, account_id)
+            with Session(self.engine) as session:
+                self.shards[account_id] = vector_index.load_current(
+                    path, session, self.embedder, account_id
+                )
+        return self.shards[account_id]
+
+    def _ingest_chunk(self, conn, chunk: list[dict]):
+        stored = _resolve_ids(conn, chunk)
+        latest = {article["article_id"]: article for article in chunk}  # last one wins
+        changed = [
+            article
+            for article_id, article in latest.items()
+            if stored.get(article_id, ("",))[0] != article["content_hash"]
+        ]
+        conn.execute(
+            text(f"INSERT OR IGNORE INTO {SEEN_TABLE} (article_id) VALUES (:article_id)"),
+            [{"article_id": article_id} for article_id in latest],
+        )
+        if changed:
+            statement = insert(Knowledge)
+            columns = ("account_id", "title", "content", "tags", "content_hash")
+            conn.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[Knowledge.article_id],
+                    set_={
+                        **{column: statement.excluded[column] for column in columns},
+                        "updated_at": func.now(),
+                    },
+                ),
+                [
+                    {"article_id": article["article_id"], **{c: article[c] for c in columns}}
+                    for article in changed
+                ],
+            )
+            passages.replace_passages(conn, changed)
+        self.accounts.update(article["account_id"] for article in chunk)
+        updated = sum(1 for article in changed if article["article_id"] in stored)
+        self.stats["read"] += len(chunk)
+        self.stats["inserted"] += len(changed) - updated
+        self.stats["updated"] += updated
+        self.stats["unchanged"] += len(latest) - len(changed)
+
+        if self.index_dir is None or not changed:
+            return
+        by_account = {}
+        for article in changed:
+            by_account.setdefault(article["account_id"], []).append(article)
+            previous = stored.get(article["article_id"], (None, None))[1]
+            if previous is not None and previous != article["account_id"]:
+                self._moved.setdefault(previous, []).append(article["article_id"])
+        for account_id, articles in by_account.items():
+            # Shards that are rebuilt after the pass need no embeddings now
+            if self._shard(account_id) is None:
+                continue
+            texts = [
+                vector_index.article_text(article["title"], article["content"], article["tags"])
+                for article in articles
+            ]
+            ids, vectors = self._pending.setdefault(account_id, ([], []))
+            ids += [article["article_id"] for article in articles]
+            vectors.append(np.asarray(self.embedder.embed_documents(texts), dtype=np.float32))
+            self._pending_count += len(articles)
+            self.stats["embedded"] += len(articles)
+        if self._pending_count >= INDEX_FLUSH:
+            self._update_shards()
+
+    def _delete_missing(self, conn) -> dict:
+        """
+        Delete the ingested accounts' articles that were not in the feed;
+        returns {account_id: [article_id, ...]}.
+        """
+        if not self.stats["read"]:
+            logger.warning("Empty feed; not deleting any articles")
+            return {}
+        removed = {}
+        for account_id in sorted(self.accounts):
+            ids = conn.execute(
+                text(
+                    "SELECT article_id FROM knowledge WHERE account_id = :account_id "
+                    f"AND article_id NOT IN (SELECT article_id FROM {SEEN_TABLE})"
+                ),
+                {"account_id": account_id},
+            ).scalars().all()
+            for start in range(0, len(ids), CHUNK_SIZE):
+                conn.execute(
+                    Knowledge.__table__.delete().where(
+                        Knowledge.article_id.in_(ids[start : start + CHUNK_SIZE])
+                    )
+                )
+            if ids:
+                removed[account_id] = ids
+            self.stats["deleted"] += len(ids)
+        return removed
+
+    def _update_shards(self, removed: dict | None = None, final: bool = False):
+        """
+        Patch the pending changes (and `removed` articles) into the account
+        shards and save them; at the end of the pass, also rebuild the
+        shards that were missing or stale.
+        """
+        removed = removed or {}
+        accounts = set(self._pending) | set(removed)
+        if final:
+            accounts |= {account_id for account_id, shard in self.shards.items() if shard is None}
+        with Session(self.engine) as session:
+            for account_id in sorted(accounts):
+                path = vector_index.shard_path(self.index_dir, account_id)
+                shard = self._shard(account_id)
+                if shard is None:
+                    shard = vector_index.VectorIndex.build(session, self.embedder, account_id=account_id)
+                    self.stats["embedded"] += len(shard)
+                else:
+                    ids, vectors = self._pending.get(account_id, ([], []))
+                    shard = shard.updated(
+                        ids, np.vstack(vectors) if vectors else [], removed.get(account_id, ())
+                    )
+                    shard.meta["fingerprint"] = vector_index.knowledge_fingerprint(
+                        session, account_id
+                    )
+                shard.save(path)
+                # Keep the saved shard memory-mapped, not as the copy built here
+                self.shards[account_id] = vector_index.VectorIndex.load(path)
+        self._pending, self._pending_count = {}, 0
+
+
+def ingest(
+    paths: list[str],
+    account: str = DEFAULT_ACCOUNT,
+    delete: bool = True,
+    vector_index_dir: str | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> dict:
+    """Ingest a feed into the shared udahub database; returns the counts."""
+    return Ingest(
+        db.get_engine(db.UDAHUB),
+        account=account,
+        index_dir=vector_index_dir,
+        embedder=rag_tools.embedder,
+        delete=delete,
+    ).run(paths, chunk_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="*", help="JSONL files or directories of them")
+    parser.add_argument(
+        "--prepare",
+        action="store_true",
+        help="without a feed: only migrate udahub.db and build passages, FTS and vector indexes",
+    )
+    parser.add_argument("--udahub", default=db.DB_PATHS[db.UDAHUB])
+    parser.add_argument("--account", default=DEFAULT_ACCOUNT, help="for records without account_id")
+    parser.add_argument("--no-delete", action="store_true", help="keep articles missing from the feed")
+    parser.add_argument("--index-dir", default=rag_tools.VECTOR_INDEX_DIR, help="shard root")
+    parser.add_argument("--no-index", action="store_true", help="leave the vector index alone")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+    if bool(args.paths) == args.prepare:
+        parser.error("give either feed paths or --prepare")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    db.configure(db.UDAHUB, args.udahub)
+    if args.prepare:
+        fts = rag_tools.prepare(index_dir=args.index_dir, shards=not args.no_index)
+        print(f"udahub.db prepared for search ({'FTS5' if fts else 'no FTS5, LIKE fallback'})")
+        return 0
+    try:
+        stats = ingest(
+            args.paths,
+            account=args.account,
+            delete=not args.no_delete,
+            vector_index_dir=None if args.no_index else args.index_dir,
+            chunk_size=args.chunk_size,
+        )
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""
+Module attributes built on first access (PEP 562 module `__getattr__`).
+
+Agents, chat models, the compiled orchestrator and its checkpointer used to
+be created as import side effects. Modules now declare them lazily so that
+`from agentic.workflow import orchestrator` still works, but a process only
+pays for what it actually touches.
+"""
+import threading
+
+# Re-entrant: building one attribute may touch another lazy attribute
+_lock = threading.RLock()
+
+
+def lazy_attributes(namespace: dict, **factories):
+    """
+    Return a module `__getattr__` that builds each named attribute with its
+    factory on first access and stores it in the module, so later lookups
+    are plain global reads:
+
+        __getattr__ = lazy_attributes(globals(), orchestrator=build_orchestrator)
+    """
+
+    def __getattr__(name: str):
+        factory = factories.get(name)
+        if factory is None:
+            raise AttributeError(f"module {namespace['__name__']!r} has no attribute {name!r}")
+        with _lock:
+            if name not in namespace:
+                namespace[name] = factory()
+        return namespace[name]
+
+    return __getattr__
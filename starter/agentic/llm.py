@@ -0,0 +1,39 @@
+"""
+Shared chat model clients.
+
+Agents, triage and the summarizer ask this registry for their model instead
+of constructing a ChatOpenAI each, so:
+- langchain_openai (and the OpenAI SDK) is only imported, and a client only
+  created, when a model is first used
+- callers with the same settings share one client and its HTTP connection pool
+- tests and benchmarks can inject any chat model with `set_chat_model`
+"""
+import threading
+
+MODEL_NAME = "gpt-4o-mini"
+
+_models = {}  # temperature (None: the API default) -> chat model
+_lock = threading.Lock()
+
+
+def get_chat_model(temperature: float | None = None):
+    """The shared chat model for `temperature`, created on first use."""
+    with _lock:
+        if temperature not in _models:
+            from langchain_openai import ChatOpenAI
+
+            kwargs = {} if temperature is None else {"temperature": temperature}
+            _models[temperature] = ChatOpenAI(model=MODEL_NAME, **kwargs)
+        return _models[temperature]
+
+
+def set_chat_model(model, temperature: float | None = None):
+    """Use `model` wherever the shared model for `temperature` is asked for."""
+    with _lock:
+        _models[temperature] = model
+
+
+def reset():
+    """Forget all shared models; the next get_chat_model creates new ones."""
+    with _lock:
+        _models.clear()
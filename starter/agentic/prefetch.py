@@ -0,0 +1,194 @@
+"""
+Speculative prefetch of the customer's CultPass context.
+
+Most billing, booking and retention turns start with the agent calling
+`lookup_user`, then `get_subscription_status` and/or `get_user_reservations`,
+one LLM round trip each. The prefetch node runs alongside triage (same graph
+step, so the specialist only starts once both are done). It:
+1. finds the customer: an email or user id in the newest user message, else
+   the customer already in `AgentState["customer_context"]`
+2. loads the user, subscription and reservations concurrently
+3. stores them as `customer_context`
+
+Specialists that use those tools (`CONTEXT_ROUTES`) get the context as a
+system message (`context_message`) and can skip the lookups.
+
+Reads go through the tools themselves, so they share the tool cache (and its
+invalidation on writes) and are instrumented like agent tool calls. A failed
+prefetch never fails the turn; the agent falls back to its tools. Set
+PREFETCH_CONTEXT=0 to disable.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("PREFETCH_CONTEXT", "1") != "0"
+WORKERS = int(os.getenv("PREFETCH_WORKERS", "8"))
+# Reservations included in the context; the agent pages through the rest
+RESERVATIONS = 10
+
+# Specialists whose tools the context replaces
+CONTEXT_ROUTES = ("billing_agent", "booking_agent", "retention_agent")
+PREFETCHED_TOOLS = ("lookup_user", "get_subscription_status", "get_user_reservations")
+
+CONTEXT_HEADER = "Customer context (already looked up for this turn)"
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# "user id a4ab87", "user_id: a4ab87", "my user id is a4ab87", "User ID #a4ab87"
+USER_ID_PATTERN = re.compile(
+    r"\buser[ _-]?id\b\s*(?:is\b\s*)?[:=#]?\s*([A-Za-z0-9-]+)", re.IGNORECASE
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="prefetch")
+    return _executor
+
+
+def find_customer(messages: list[BaseMessage], previous: dict | None) -> tuple[str | None, str | None]:
+    """(email, user_id) for the turn; either may be None."""
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            text = message.content if isinstance(message.content, str) else str(message.content)
+            email = EMAIL_PATTERN.search(text)
+            if email:
+                return email.group(0).rstrip("."), None
+            user_id = USER_ID_PATTERN.search(text)
+            if user_id:
+                return None, user_id.group(1)
+            break
+    user = (previous or {}).get("user") or {}
+    return user.get("email"), user.get("user_id")
+
+
+def _tools():
+    # Imported on first use, like the agents (see agentic/workflow.py)
+    from agentic.tools import cultpass_tools
+
+    return cultpass_tools
+
+
+def _requests(tools, email: str | None, user_id: str) -> dict:
+    requests = {
+        "subscription": (tools.get_subscription_status, {"user_id": user_id}),
+        "reservations": (tools.get_user_reservations, {"user_id": user_id, "limit": RESERVATIONS}),
+    }
+    if email:
+        requests["user"] = (tools.lookup_user, {"email": email})
+    return requests
+
+
+def _assemble(user_id: str, results: dict) -> dict | None:
+    reservations = results["reservations"]
+    if "user" not in results and "error" in results["subscription"] and not isinstance(reservations, list):
+        return None  # a user id that matches nothing
+    return {
+        "user": results.get("user") or {"user_id": user_id},
+        "subscription": results["subscription"],
+        "reservations": reservations if isinstance(reservations, list) else [],
+    }
+
+
+def fetch(email: str | None, user_id: str | None) -> dict | None:
+    """User, subscription and reservations of a customer, or None if unknown."""
+    tools = _tools()
+
+    def call(tool, kwargs):
+        return json.loads(tool.func(**kwargs))
+
+    if user_id is None:
+        if email is None:
+            return None
+        # The other reads need the user id; this lookup is the only serial step
+        user = call(tools.lookup_user, {"email": email})
+        if "error" in user:
+            return None
+        user_id, email = user["user_id"], None
+    else:
+        user = None
+
+    # Each read runs in a copy of this context so it is attributed to the node
+    futures = {
+        key: _pool().submit(contextvars.copy_context().run, call, tool, kwargs)
+        for key, (tool, kwargs) in _requests(tools, email, user_id).items()
+    }
+    results = {key: future.result() for key, future in futures.items()}
+    if user is not None:
+        results["user"] = user
+    if "error" in results.get("user", {}):
+        return None
+    return _assemble(user_id, results)
+
+
+async def afetch(email: str | None, user_id: str | None) -> dict | None:
+    """Async `fetch`: the reads run concurrently on the async engine."""
+    tools = _tools()
+
+    async def call(tool, kwargs):
+        return json.loads(await tool.coroutine(**kwargs))
+
+    if user_id is None:
+        if email is None:
+            return None
+        user = await call(tools.lookup_user, {"email": email})
+        if "error" in user:
+            return None
+        user_id, email = user["user_id"], None
+    else:
+        user = None
+
+    requests = _requests(tools, email, user_id)
+    values = await asyncio.gather(*(call(tool, kwargs) for tool, kwargs in requests.values()))
+    results = dict(zip(requests, values))
+    if user is not None:
+        results["user"] = user
+    if "error" in results.get("user", {}):
+        return None
+    return _assemble(user_id, results)
+
+
+def prefetch_node(state):
+    """Graph node: refresh `customer_context` for this turn."""
+    email, user_id = find_customer(state["messages"], state.get("customer_context"))
+    try:
+        context = fetch(email, user_id)
+    except Exception:
+        logger.exception("Customer context prefetch failed")
+        return {}
+    return {"customer_context": context} if context else {}
+
+
+async def aprefetch_node(state):
+    email, user_id = find_customer(state["messages"], state.get("customer_context"))
+    try:
+        context = await afetch(email, user_id)
+    except Exception:
+        logger.exception("Customer context prefetch failed")
+        return {}
+    return {"customer_context": context} if context else {}
+
+
+def context_message(context: dict) -> SystemMessage:
+    """The context as the system message a specialist sees."""
+    note = (
+        f"Do not call {', '.join(PREFETCHED_TOOLS)} for this customer unless you "
+        "need data changed during this turn"
+    )
+    if len(context.get("reservations", [])) >= RESERVATIONS:
+        note += f"; only the first {RESERVATIONS} reservations are listed"
+    return SystemMessage(content=f"{CONTEXT_HEADER}. {note}.\n{json.dumps(context)}")
@@ -0,0 +1,512 @@
+"""
+Batch replay of historical tickets through the orchestrator.
+
+Streams tickets from udahub.db (keyset pages, so memory does not grow with
+the table), replays each ticket's user messages as one conversation on its
+own thread id, and fans the tickets out over a thread or process pool.
+Results (routing, sentiment, urgency and replies per ticket) are written
+back to udahub.db in bulk, together with the run's progress, so an
+interrupted run resumes where it stopped:
+
+    cd starter
+    python -m agentic.replay --run-id prompts-v2 --workers 16
+    python -m agentic.replay --run-id prompts-v2 --workers 16   # resumes
+    python -m agentic.replay --run-id prompts-v3 --compare prompts-v2
+
+Threads suit the real model (the work is waiting on the API); processes
+suit CPU-bound setups such as local models. Either way each worker builds
+one orchestrator and reuses it for every ticket it replays.
+
+Replays are dry runs: the specialists' write tools (bookings, cancellations,
+subscription changes) are replaced by stubs that only record the call, which
+is kept with the ticket's result. `--live-writes` runs the real tools, and
+is only allowed against a copy of cultpass.db given with `--cultpass`.
+
+Each worker triages through its own in-memory triage cache, so routes are
+not served from earlier runs' answers (triage_cache.db). `--llm-triage`
+also skips the local fast path and sticky follow-ups, so every turn is
+routed by the triage prompt under test.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    and_,
+    exists,
+    func,
+    insert,
+    select,
+)
+from data import migrations
+from data.models.udahub import RoleEnum, Ticket, TicketMessage
+from agentic import db
+from agentic.instrumentation import Histogram
+
+PAGE_SIZE = 500  # tickets per source query
+BATCH_SIZE = 100  # results per write-back transaction
+FLUSH_INTERVAL = 5.0  # seconds; results never wait longer than this
+IN_FLIGHT_PER_WORKER = 2  # queued tickets per worker, bounds memory
+CHECKPOINT_PATH = os.getenv("REPLAY_CHECKPOINT_DB_PATH", "replay_checkpoints.db")
+MAX_ERRORS_SHOWN = 5
+# Tools that change customer data; replaced by recording stubs in a dry run
+WRITE_TOOLS = ("book_reservation", "cancel_reservation", "update_subscription")
+SCHEMA_VERSION = 6  # udahub migration that creates the tables below
+
+# Created by data/migrations.py
+
+replay_metadata = MetaData()
+runs_table = Table(
+    "replay_runs",
+    replay_metadata,
+    Column("run_id", String, primary_key=True),
+    Column("params", String, nullable=False),
+    Column("done", Integer, nullable=False),
+    Column("failed", Integer, nullable=False),
+    Column("started_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+results_table = Table(
+    "replay_results",
+    replay_metadata,
+    Column("run_id", String, primary_key=True),
+    Column("ticket_id", String, primary_key=True),
+    Column("destinations", Text),  # JSON list, one route per replayed turn
+    Column("sentiment", String),
+    Column("urgency", String),
+    Column("replies", Text),  # JSON list
+    Column("writes", Text),  # JSON list of the write tool calls a dry run skipped
+    Column("turns", Integer, nullable=False),
+    Column("seconds", Float, nullable=False),
+    Column("error", Text),
+    Column("created_at", DateTime, nullable=False),
+)
+
+
+# -- source --------------------------------------------------------------
+
+
+def iter_tickets(engine, run_id: str, account: str | None = None, limit: int | None = None):
+    """
+    Yield (ticket_id, account_id, [user message, ...]) for the tickets of a run that have
+    no result yet. The run covers the first `limit` tickets by id (of
+    `account`), so a resumed run sees the same tickets.
+    """
+    replayed = exists().where(
+        and_(results_table.c.run_id == run_id, results_table.c.ticket_id == Ticket.ticket_id)
+    )
+    after, seen = "", 0
+    while limit is None or seen < limit:
+        page = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit - seen)
+        query = select(Ticket.ticket_id, Ticket.account_id, replayed.label("replayed")).where(Ticket.ticket_id > after)
+        if account:
+            query = query.where(Ticket.account_id == account)
+        with engine.connect() as conn:
+            rows = conn.execute(query.order_by(Ticket.ticket_id).limit(page)).all()
+            todo = {row.ticket_id: row.account_id for row in rows if not row.replayed}
+            messages = defaultdict(list)
+            if todo:
+                for ticket_id, content in conn.execute(
+                    select(TicketMessage.ticket_id, TicketMessage.content)
+                    .where(TicketMessage.ticket_id.in_(list(todo)), TicketMessage.role == RoleEnum.user)
+                    .order_by(TicketMessage.ticket_id, TicketMessage.created_at)
+                ):
+                    messages[ticket_id].append(content)
+        if not rows:
+            return
+        for ticket_id, account_id in todo.items():
+            yield ticket_id, account_id, messages[ticket_id]
+        after, seen = rows[-1].ticket_id, seen + len(rows)
+
+
+# -- workers -------------------------------------------------------------
+
+_orchestrator = None
+# The current ticket's skipped writes; tool calls run in copies of the
+# replaying thread's context, so they append to the same list
+_writes: ContextVar[list] = ContextVar("replay_writes")
+
+
+def dry_run_tool(tool):
+    """A stand-in for a write tool that records the call instead of making it."""
+    from langchain_core.tools import StructuredTool
+
+    def record(**kwargs) -> str:
+        writes = _writes.get(None)
+        if writes is not None:
+            writes.append({"tool": tool.name, "args": kwargs})
+        return json.dumps(
+            {
+                "status": "success",
+                "message": f"Dry run: {tool.name} was recorded, not applied.",
+            }
+        )
+
+    async def arecord(**kwargs) -> str:
+        return record(**kwargs)
+
+    return StructuredTool.from_function(
+        func=record,
+        coroutine=arecord,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+    )
+
+
+def init_worker(
+    checkpoint_path: str, db_paths: dict, live_writes: bool = False, llm_triage: bool = False
+):
+    """
+    Build the worker's orchestrator (once per process). `db_paths` are the
+    parent's database paths: spawned workers do not inherit `db.configure`.
+    """
+    global _orchestrator
+    from agentic.agents.triage_cache import TriageCache
+    from agentic.tools import cultpass_tools
+    from agentic.workflow import OrchestratorConfig, build_orchestrator
+
+    for name, path in db_paths.items():
+        if db.DB_PATHS[name] != path:
+            db.configure(name, path)
+    tools = {}
+    if not live_writes:
+        tools = {name: dry_run_tool(getattr(cultpass_tools, name)) for name in WRITE_TOOLS}
+    _orchestrator = build_orchestrator(
+        OrchestratorConfig(
+            checkpoint_path=checkpoint_path,
+            compact=False,
+            tools=tools,
+            triage_cache=TriageCache(),
+            fast_path=False if llm_triage else None,
+            sticky=False if llm_triage else None,
+        )
+    )
+
+
+def replay_ticket(run_id: str, ticket_id: str, account_id: str, messages: list[str]) -> dict:
+    """Replay one ticket's user messages in order; never raises."""
+    from langchain_core.messages import HumanMessage
+
+    thread_id = f"replay:{run_id}:{ticket_id}"
+    result = {
+        "run_id": run_id,
+        "ticket_id": ticket_id,
+        "destinations": [],
+        "sentiment": None,
+        "urgency": None,
+        "replies": [],
+        "writes": [],
+        "turns": 0,
+        "error": None,
+    }
+    started = time.perf_counter()
+    token = _writes.set(result["writes"])
+    try:
+        # A ticket interrupted mid-replay starts over, not from its last turn
+        _orchestrator.checkpointer.delete_thread(thread_id)
+        config = {"configurable": {"thread_id": thread_id}}
+        for content in messages:
+            state = _orchestrator.invoke(
+                {"messages": [HumanMessage(content=content)], "account_id": account_id}, config
+            )
+            result["destinations"].append(state.get("destination"))
+            result["replies"].append(state["messages"][-1].content)
+            result["sentiment"] = state.get("sentiment")
+            result["urgency"] = state.get("urgency")
+            result["turns"] += 1
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        _writes.reset(token)
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+# -- write-back ----------------------------------------------------------
+
+
+def start_run(engine, run_id: str, params: dict, retry_failed: bool = False):
+    """
+    Create or resume a run; resuming with other params, or a udahub.db
+    without the replay tables, raises ValueError.
+    """
+    if migrations.current_version(engine) < SCHEMA_VERSION:
+        raise ValueError(
+            "udahub.db has no replay tables; run `python -m data.migrations upgrade` first"
+        )
+    params = json.dumps(params, sort_keys=True)
+    now = datetime.now()
+    with engine.begin() as conn:
+        row = conn.execute(
+            select(runs_table.c.params).where(runs_table.c.run_id == run_id)
+        ).first()
+        if row is None:
+            conn.execute(
+                insert(runs_table),
+                {
+                    "run_id": run_id,
+                    "params": params,
+                    "done": 0,
+                    "failed": 0,
+                    "started_at": now,
+                    "updated_at": now,
+                },
+            )
+        elif row.params != params:
+            raise ValueError(
+                f"Run '{run_id}' was started with different arguments "
+                f"({row.params}); rerun with those or use another --run-id"
+            )
+        elif retry_failed:
+            conn.execute(
+                results_table.delete().where(
+                    results_table.c.run_id == run_id, results_table.c.error.is_not(None)
+                )
+            )
+            conn.execute(
+                runs_table.update().where(runs_table.c.run_id == run_id).values(failed=0)
+            )
+
+
+def write_results(engine, run_id: str, results: list[dict]):
+    """Insert a batch of results and advance the run's counters, in one transaction."""
+    if not results:
+        return
+    now = datetime.now()
+    rows = [
+        {
+            **result,
+            "destinations": json.dumps(result["destinations"]),
+            "replies": json.dumps(result["replies"]),
+            "writes": json.dumps(result["writes"]),
+            "created_at": now,
+        }
+        for result in results
+    ]
+    failed = sum(1 for result in results if result["error"])
+    with engine.begin() as conn:
+        conn.execute(insert(results_table), rows)
+        conn.execute(
+            runs_table.update()
+            .where(runs_table.c.run_id == run_id)
+            .values(
+                done=runs_table.c.done + len(results) - failed,
+                failed=runs_table.c.failed + failed,
+                updated_at=now,
+            )
+        )
+
+
+def routing_changes(engine, run_id: str, other: str) -> dict:
+    """How many tickets replayed by both runs were routed differently."""
+    a, b = results_table.alias("a"), results_table.alias("b")
+    joined = a.join(b, and_(a.c.ticket_id == b.c.ticket_id, b.c.run_id == other))
+    both = and_(a.c.run_id == run_id, a.c.error.is_(None), b.c.error.is_(None))
+    with engine.connect() as conn:
+        compared = conn.execute(select(func.count()).select_from(joined).where(both)).scalar()
+        changed = conn.execute(
+            select(func.count())
+            .select_from(joined)
+            .where(both, a.c.destinations != b.c.destinations)
+        ).scalar()
+    return {"against": other, "compared": compared, "changed": changed}
+
+
+# -- driver --------------------------------------------------------------
+
+
+class Report:
+    """Throughput, routing and failures of one invocation."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.done = 0
+        self.failed = 0
+        self.turns = 0
+        self.routes = Counter()
+        self.writes = Counter()  # write tool -> calls skipped by the dry run
+        self.latency = defaultdict(Histogram)  # final destination -> ticket seconds
+        self.errors = []
+
+    def add(self, result: dict):
+        if result["error"]:
+            self.failed += 1
+            if len(self.errors) < MAX_ERRORS_SHOWN:
+                self.errors.append({"ticket_id": result["ticket_id"], "error": result["error"]})
+            return
+        self.done += 1
+        self.turns += result["turns"]
+        self.routes.update(result["destinations"])
+        self.writes.update(write["tool"] for write in result["writes"])
+        final = result["destinations"][-1] if result["destinations"] else "(no messages)"
+        self.latency[final].add(result["seconds"])
+
+    def as_dict(self) -> dict:
+        seconds = time.perf_counter() - self.started
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "turns": self.turns,
+            "seconds": round(seconds, 3),
+            "tickets_per_s": round((self.done + self.failed) / seconds, 2) if seconds else 0.0,
+            "turns_per_s": round(self.turns / seconds, 2) if seconds else 0.0,
+            "routes": dict(self.routes),
+            "dry_run_writes": dict(self.writes),
+            "latency": {name: hist.summary() for name, hist in sorted(self.latency.items())},
+            "errors": self.errors,
+        }
+
+
+def replay(
+    run_id: str,
+    workers: int = 8,
+    executor: str = "thread",
+    account: str | None = None,
+    limit: int | None = None,
+    checkpoint_path: str = CHECKPOINT_PATH,
+    batch_size: int = BATCH_SIZE,
+    retry_failed: bool = False,
+    live_writes: bool = False,
+    llm_triage: bool = False,
+    progress=None,
+) -> dict:
+    """
+    Replay the run's remaining tickets and return the report. `progress` is
+    called with the running report after each write-back. Write tools are
+    dry-run unless `live_writes` is set; `llm_triage` sends every turn to
+    the LLM triage chain.
+    """
+    engine = db.get_engine(db.UDAHUB)
+    start_run(engine, run_id, {"account": account, "limit": limit}, retry_failed)
+    report = Report()
+
+    if executor == "process":
+        # Forked workers must not inherit open connections: close them, then
+        # start the workers (a fork pool starts them all on the first task)
+        db.dispose_all()
+        pool = ProcessPoolExecutor(
+            workers,
+            initializer=init_worker,
+            initargs=(checkpoint_path, dict(db.DB_PATHS), live_writes, llm_triage),
+        )
+        pool.submit(os.getpid).result()
+    else:
+        # One orchestrator, shared by the threads
+        init_worker(checkpoint_path, dict(db.DB_PATHS), live_writes, llm_triage)
+        pool = ThreadPoolExecutor(workers, thread_name_prefix="replay")
+
+    pending, buffered = set(), []
+    flushed = time.monotonic()
+
+    def collect(futures):
+        nonlocal flushed
+        for future in futures:
+            result = future.result()
+            report.add(result)
+            buffered.append(result)
+        if len(buffered) >= batch_size or time.monotonic() - flushed >= FLUSH_INTERVAL:
+            write_results(engine, run_id, buffered)
+            buffered.clear()
+            flushed = time.monotonic()
+            if progress:
+                progress(report)
+
+    with pool:
+        for ticket_id, account_id, messages in iter_tickets(engine, run_id, account, limit):
+            if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            pending.add(pool.submit(replay_ticket, run_id, ticket_id, account_id, messages))
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(finished)
+    write_results(engine, run_id, buffered)
+    return report.as_dict()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--run-id", default=time.strftime("%Y%m%d-%H%M%S"), help="reuse to resume")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--account", help="only this account's tickets")
+    parser.add_argument("--limit", type=int, help="only the first N tickets (by id)")
+    parser.add_argument("--udahub", default=db.DB_PATHS[db.UDAHUB])
+    parser.add_argument("--cultpass", default=db.DB_PATHS[db.CULTPASS])
+    parser.add_argument("--checkpoints", default=CHECKPOINT_PATH, help="replay conversation state")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--retry-failed", action="store_true", help="replay failed tickets again")
+    parser.add_argument(
+        "--live-writes",
+        action="store_true",
+        help="run the real write tools (requires --cultpass pointing at a copy)",
+    )
+    parser.add_argument(
+        "--llm-triage",
+        action="store_true",
+        help="route every turn with the LLM (no fast path or sticky follow-ups)",
+    )
+    parser.add_argument("--compare", metavar="RUN_ID", help="count routing changes against a run")
+    parser.add_argument("--out", help="also write the report as JSON")
+    args = parser.parse_args(argv)
+    if args.live_writes and os.path.abspath(args.cultpass) == os.path.abspath(
+        db.DB_PATHS[db.CULTPASS]
+    ):
+        parser.error("--live-writes changes customer data; pass --cultpass with a scratch copy")
+
+    db.configure(db.UDAHUB, args.udahub)
+    db.configure(db.CULTPASS, args.cultpass)
+
+    def progress(report: Report):
+        current = report.as_dict()
+        print(
+            f"{args.run_id}: {current['done']:,} done, {current['failed']:,} failed "
+            f"({current['tickets_per_s']:,.1f} tickets/s)",
+            flush=True,
+        )
+
+    try:
+        report = replay(
+            args.run_id,
+            workers=args.workers,
+            executor=args.executor,
+            account=args.account,
+            limit=args.limit,
+            checkpoint_path=args.checkpoints,
+            batch_size=args.batch_size,
+            retry_failed=args.retry_failed,
+            live_writes=args.live_writes,
+            llm_triage=args.llm_triage,
+            progress=progress,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    report = {"run_id": args.run_id, **report}
+    if args.compare:
+        report["routing_changes"] = routing_changes(
+            db.get_engine(db.UDAHUB), args.run_id, args.compare
+        )
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+Contention-safe booking and cancellation for CultPass experiences.
+
+A booking runs in one `BEGIN IMMEDIATE` transaction, which takes SQLite's
+write lock up front, so two bookings can never interleave their reads and
+writes. Inside it:
+1. the reservation row is inserted unless the user already holds an active
+   reservation for the experience; the partial unique index
+   `ux_reservations_active_user_experience` enforces the same rule in the
+   database, and the check inside the transaction still holds on files
+   where the index could not be created
+2. a slot is taken with a conditional
+   `UPDATE ... SET slots_available = slots_available - 1 WHERE slots_available > 0`,
+   so the count can never go below zero
+3. the user's subscription quota is decremented the same way
+Any failed step rolls the whole transaction back. Cancelling restores the
+slot and the quota in one transaction too.
+
+Writers that find the database locked wait up to busy_timeout inside SQLite.
+If that expires, the attempt is retried a bounded number of times with
+jittered exponential back-off (`attempts`, `BASE_DELAY`, `MAX_DELAY`).
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+import uuid
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+ATTEMPTS = 5
+BASE_DELAY = 0.02  # seconds
+MAX_DELAY = 1.0
+
+ACTIVE_INDEX = "ux_reservations_active_user_experience"
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+class BookingError(Exception):
+    """A booking or cancellation rejected by a business rule; rolls back."""
+
+
+def check_schema(engine):
+    """
+    Warn once per database that lacks the active-reservation index. The
+    index comes from create_all or cultpass migration 1 (`python -m
+    data.migrations upgrade`), which fails while duplicate active
+    reservations exist; without it new duplicates are only prevented by
+    the check in `_book_once`.
+    """
+    key = str(engine.url)
+    if key in _schema_ready:
+        return
+    with _schema_lock:
+        if key in _schema_ready:
+            return
+        with engine.connect() as conn:
+            found = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (ACTIVE_INDEX,)
+            ).scalar()
+        if not found:
+            logger.warning(
+                "%s is missing; run `python -m data.migrations upgrade` (after cancelling "
+                "any duplicate active reservations)",
+                ACTIVE_INDEX,
+            )
+        _schema_ready.add(key)
+
+
+def _is_busy(error: OperationalError) -> bool:
+    message = str(error.orig).lower()
+    return "locked" in message or "busy" in message
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential back-off for the given (1-based) attempt."""
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** (attempt - 1)))
+
+
+# -- single attempts (one transaction each) --------------------------------
+
+
+def _begin_immediate(session):
+    # pysqlite/aiosqlite only open a transaction lazily (BEGIN DEFERRED, which
+    # upgrades to a write lock mid-transaction and can fail with "database is
+    # locked"); take the write lock before the first read instead
+    session.execute(text("BEGIN IMMEDIATE"))
+
+
+def _book_once(session, user_id: str, experience_id: str) -> dict:
+    _begin_immediate(session)
+    title = session.execute(
+        text("SELECT title FROM experiences WHERE experience_id = :experience_id"),
+        {"experience_id": experience_id},
+    ).scalar()
+    if title is None:
+        raise BookingError("Experience not found")
+
+    # Under the write lock, so no other booking can slip in between
+    active = session.execute(
+        text(
+            "SELECT 1 FROM reservations WHERE user_id = :user_id "
+            "AND experience_id = :experience_id AND status != 'cancelled' LIMIT 1"
+        ),
+        {"user_id": user_id, "experience_id": experience_id},
+    ).first()
+    if active is not None:
+        raise BookingError("User already booked this class")
+
+    reservation_id = f"res-{uuid.uuid4().hex[:6]}"
+    try:
+        session.execute(
+            text(
+                "INSERT INTO reservations "
+                "(reservation_id, user_id, experience_id, status, created_at, updated_at) "
+                "VALUES (:reservation_id, :user_id, :experience_id, 'confirmed', "
+                "CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+            ),
+            {
+                "reservation_id": reservation_id,
+                "user_id": user_id,
+                "experience_id": experience_id,
+            },
+        )
+    except IntegrityError:
+        raise BookingError("User already booked this class")
+
+    taken = session.execute(
+        text(
+            "UPDATE experiences SET slots_available = slots_available - 1, "
+            "updated_at = CURRENT_TIMESTAMP "
+            "WHERE experience_id = :experience_id AND slots_available > 0"
+        ),
+        {"experience_id": experience_id},
+    ).rowcount
+    if not taken:
+        raise BookingError("Class is full")
+
+    charged = session.execute(
+        text(
+            "UPDATE subscriptions SET monthly_quota = monthly_quota - 1, "
+            "updated_at = CURRENT_TIMESTAMP "
+            "WHERE user_id = :user_id AND status = 'active' AND monthly_quota > 0"
+        ),
+        {"user_id": user_id},
+    ).rowcount
+    if not charged:
+        status = session.execute(
+            text("SELECT status FROM subscriptions WHERE user_id = :user_id"),
+            {"user_id": user_id},
+        ).scalar()
+        if status is None or status != "active":
+            raise BookingError("No active subscription")
+        raise BookingError("Monthly quota exhausted")
+
+    session.commit()
+    return {
+        "status": "success",
+        "reservation_id": reservation_id,
+        "message": f"Successfully booked {title}.",
+    }
+
+
+def _cancel_once(session, reservation_id: str) -> dict:
+    _begin_immediate(session)
+    row = session.execute(
+        text(
+            "SELECT user_id, experience_id, status FROM reservations "
+            "WHERE reservation_id = :reservation_id"
+        ),
+        {"reservation_id": reservation_id},
+    ).first()
+    if row is None:
+        raise BookingError("Reservation not found")
+    if row.status == "cancelled":
+        session.rollback()
+        return {
+            "status": "success",
+            "user_id": row.user_id,
+            "message": f"Reservation {reservation_id} was already cancelled.",
+        }
+
+    session.execute(
+        text(
+            "UPDATE reservations SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP "
+            "WHERE reservation_id = :reservation_id"
+        ),
+        {"reservation_id": reservation_id},
+    )
+    session.execute(
+        text(
+            "UPDATE experiences SET slots_available = slots_available + 1, "
+            "updated_at = CURRENT_TIMESTAMP WHERE experience_id = :experience_id"
+        ),
+        {"experience_id": row.experience_id},
+    )
+    session.execute(
+        text(
+            "UPDATE subscriptions SET monthly_quota = monthly_quota + 1, "
+            "updated_at = CURRENT_TIMESTAMP WHERE user_id = :user_id"
+        ),
+        {"user_id": row.user_id},
+    )
+    session.commit()
+    return {
+        "status": "success",
+        "user_id": row.user_id,
+        "message": f"Reservation {reservation_id} cancelled.",
+    }
+
+
+# -- retry loops -----------------------------------------------------------
+
+
+def _attempt(session, operation, kwargs) -> dict | None:
+    """One transaction; None means the database stayed locked (retry)."""
+    try:
+        return operation(session, **kwargs)
+    except BookingError as e:
+        session.rollback()
+        return {"error": str(e)}
+    except OperationalError as e:
+        session.rollback()
+        if not _is_busy(e):
+            raise
+        return None
+
+
+def _retry(session, operation, attempts: int, **kwargs) -> dict:
+    check_schema(session.get_bind())
+    for attempt in range(1, attempts + 1):
+        result = _attempt(session, operation, kwargs)
+        if result is not None:
+            return result
+        if attempt < attempts:
+            time.sleep(backoff(attempt))
+    logger.warning("%s gave up after %d attempts", operation.__name__, attempts)
+    return {"error": "The booking system is busy, please try again shortly."}
+
+
+async def _aretry(session, operation, attempts: int, **kwargs) -> dict:
+    await session.run_sync(lambda s: check_schema(s.get_bind()))
+    for attempt in range(1, attempts + 1):
+        result = await session.run_sync(_attempt, operation, kwargs)
+        if result is not None:
+            return result
+        if attempt < attempts:
+            # Back off without blocking the event loop
+            await asyncio.sleep(backoff(attempt))
+    logger.warning("%s gave up after %d attempts", operation.__name__, attempts)
+    return {"error": "The booking system is busy, please try again shortly."}
+
+
+def book(session, user_id: str, experience_id: str, attempts: int = ATTEMPTS) -> dict:
+    """Book one slot of an experience for a user; see module docstring."""
+    return _retry(session, _book_once, attempts, user_id=user_id, experience_id=experience_id)
+
+
+def cancel(session, reservation_id: str, attempts: int = ATTEMPTS) -> dict:
+    """Cancel a reservation, returning its slot and the user's quota."""
+    return _retry(session, _cancel_once, attempts, reservation_id=reservation_id)
+
+
+async def abook(session, user_id: str, experience_id: str, attempts: int = ATTEMPTS) -> dict:
+    """`book` on an AsyncSession."""
+    return await _aretry(
+        session, _book_once, attempts, user_id=user_id, experience_id=experience_id
+    )
+
+
+async def acancel(session, reservation_id: str, attempts: int = ATTEMPTS) -> dict:
+    """`cancel` on an AsyncSession."""
+    return await _aretry(session, _cancel_once, attempts, reservation_id=reservation_id)
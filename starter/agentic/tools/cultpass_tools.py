@@ -1,14 +1,102 @@
 from langchain_core.tools import tool
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from data.models.cultpass import User, Subscription, Reservation, Experience
+from agentic import db
+from agentic.instrumentation import instrument_tool
+from agentic.tools import booking_engine, tool_cache
+import inspect
 import json
+from datetime import datetime
+
 
 # Setup DB connection
-# In a real app, this would be dependency injected or from a singleton config
-CP_DB_PATH = "sqlite:///cultpass.db"
-engine = create_engine(CP_DB_PATH)
-Session = sessionmaker(bind=engine)
+# Engines come from the shared registry (WAL, tuned pragmas, pooled) and are
+# created on the first tool call, not at import.
+# Read-only tools use a mode=ro engine so they never contend for the write lock.
+def _session(readonly: bool = False):
+    return db.get_sessionmaker(db.CULTPASS, readonly=readonly)()
+
+
+# Async engines for the asyncio path (ainvoke). The query code is shared:
+# each tool's logic takes a sync Session and is run on the async connection
+# with AsyncSession.run_sync (booking has native async variants that back off
+# without blocking the event loop).
+def _async_session(readonly: bool = False):
+    return db.get_async_sessionmaker(db.CULTPASS, readonly=readonly)()
+
+
+def _cache_lookup(cached_as: str | None, kwargs: dict):
+    """(key, cached output) for a cacheable read; key is None when not cached."""
+    if not cached_as or not tool_cache.ENABLED:
+        return None, None
+    key = tool_cache.cache.make_key(cached_as, kwargs)
+    return key, tool_cache.cache.get(key)
+
+
+def _cache_store(key: str, since: int, result, kwargs: dict) -> str:
+    output = json.dumps(result)
+    # Tagged with every user the result describes, for invalidation on writes
+    user_ids = {kwargs.get("user_id")}
+    if isinstance(result, dict):
+        user_ids.add(result.get("user_id"))
+    tags = [tool_cache.user_tag(user_id) for user_id in user_ids if user_id]
+    tool_cache.cache.put(key, output, tags, since)
+    return output
+
+
+def _run(query, readonly: bool = False, cached_as: str | None = None, **kwargs) -> str:
+    key, cached = _cache_lookup(cached_as, kwargs)
+    if cached is not None:
+        return cached
+    since = tool_cache.cache.begin() if key else 0
+    session = _session(readonly)
+    try:
+        result = query(session, **kwargs)
+    except Exception as e:
+        session.rollback()
+        return json.dumps({"error": str(e)})
+    finally:
+        session.close()
+    return _cache_store(key, since, result, kwargs) if key else json.dumps(result)
+
+
+async def _arun(query, readonly: bool = False, cached_as: str | None = None, **kwargs) -> str:
+    key, cached = _cache_lookup(cached_as, kwargs)
+    if cached is not None:
+        return cached
+    since = tool_cache.cache.begin() if key else 0
+    async with _async_session(readonly) as session:
+        try:
+            if inspect.iscoroutinefunction(query):
+                result = await query(session, **kwargs)
+            else:
+                result = await session.run_sync(query, **kwargs)
+        except Exception as e:
+            await session.rollback()
+            return json.dumps({"error": str(e)})
+    return _cache_store(key, since, result, kwargs) if key else json.dumps(result)
+
+
+def _with_async(sync_tool, query, readonly: bool = False, cached: bool = False):
+    """Give a tool a coroutine so `ainvoke` runs on the async engine."""
+    cached_as = sync_tool.name if cached else None
+
+    async def coroutine(**kwargs) -> str:
+        return await _arun(query, readonly=readonly, cached_as=cached_as, **kwargs)
+
+    sync_tool.coroutine = coroutine
+    return sync_tool
+
+
+def _lookup_user(session, email: str) -> dict:
+    user = session.query(User).filter(User.email == email).first()
+    if user:
+        return {
+            "user_id": user.user_id,
+            "full_name": user.full_name,
+            "email": user.email,
+            "is_blocked": user.is_blocked,
+        }
+    return {"error": "User not found"}
 
 
 @tool
@@ -17,23 +105,19 @@ def lookup_user(email: str) -> str:
     Search for a user by email.
     Returns JSON string with user details or error message.
     """
-    session = Session()
-    try:
-        user = session.query(User).filter(User.email == email).first()
-        if user:
-            return json.dumps(
-                {
-                    "user_id": user.user_id,
-                    "full_name": user.full_name,
-                    "email": user.email,
-                    "is_blocked": user.is_blocked,
-                }
-            )
-        return json.dumps({"error": "User not found"})
-    except Exception as e:
-        return json.dumps({"error": str(e)})
-    finally:
-        session.close()
+    return _run(_lookup_user, readonly=True, cached_as="lookup_user", email=email)
+
+
+def _get_subscription_status(session, user_id: str) -> dict:
+    sub = session.query(Subscription).filter(Subscription.user_id == user_id).first()
+    if sub:
+        return {
+            "status": sub.status,
+            "tier": sub.tier,
+            "monthly_quota": sub.monthly_quota,
+            "expires_at": str(sub.ended_at) if sub.ended_at else "Auto-renew",
+        }
+    return {"error": "No subscription found"}
 
 
 @tool
@@ -41,89 +125,180 @@ def get_subscription_status(user_id: str) -> str:
     """
     Get subscription details for a user given their user_id.
     """
-    session = Session()
-    try:
-        sub = (
-            session.query(Subscription).filter(Subscription.user_id == user_id).first()
-        )
-        if sub:
-            return json.dumps(
-                {
-                    "status": sub.status,
-                    "tier": sub.tier,
-                    "monthly_quota": sub.monthly_quota,
-                    "expires_at": str(sub.ended_at) if sub.ended_at else "Auto-renew",
-                }
-            )
-        return json.dumps({"error": "No subscription found"})
-    except Exception as e:
-        return json.dumps({"error": str(e)})
-    finally:
-        session.close()
+    return _run(
+        _get_subscription_status,
+        readonly=True,
+        cached_as="get_subscription_status",
+        user_id=user_id,
+    )
+
+
+# Max ids per IN (...) clause, below SQLite's bound-parameter limit
+IN_CHUNK = 500
+
+
+def _parse_date(value: str | None):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _reservations_query(session, status=None, date_from=None, date_to=None):
+    """
+    Reservations joined to their experience in one statement, projecting only
+    the columns the tools return.
+    """
+    query = session.query(
+        Reservation.user_id,
+        Reservation.reservation_id,
+        Reservation.status,
+        Experience.title,
+        Experience.when,
+    ).outerjoin(Experience, Experience.experience_id == Reservation.experience_id)
+    if status:
+        query = query.filter(Reservation.status == status)
+    if date_from:
+        query = query.filter(Experience.when >= _parse_date(date_from))
+    if date_to:
+        query = query.filter(Experience.when <= _parse_date(date_to))
+    return query.order_by(Experience.when, Reservation.reservation_id)
+
+
+def _reservation_row(row) -> dict:
+    return {
+        "reservation_id": row.reservation_id,
+        "status": row.status,
+        "class": row.title if row.title is not None else "Unknown",
+        "when": str(row.when) if row.when is not None else "Unknown",
+    }
+
+
+def _get_user_reservations(
+    session,
+    user_id: str,
+    status: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    limit: int = 50,
+    offset: int = 0,
+):
+    rows = (
+        _reservations_query(session, status, date_from, date_to)
+        .filter(Reservation.user_id == user_id)
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
+    results = [_reservation_row(row) for row in rows]
+    if not results:
+        return {"message": "No reservations found"}
+    return results
 
 
 @tool
-def get_user_reservations(user_id: str) -> str:
+def get_user_reservations(
+    user_id: str,
+    status: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    limit: int = 50,
+    offset: int = 0,
+) -> str:
+    """
+    List reservations for a user given their user_id, soonest first.
+    Optionally filter by status (e.g. 'reserved', 'cancelled') and by class
+    date with date_from/date_to (ISO dates, e.g. '2025-01-31').
+    Use limit/offset to page through long histories.
+    """
+    return _run(
+        _get_user_reservations,
+        readonly=True,
+        cached_as="get_user_reservations",
+        user_id=user_id,
+        status=status,
+        date_from=date_from,
+        date_to=date_to,
+        limit=limit,
+        offset=offset,
+    )
+
+
+def _get_reservations_for_users(
+    session, user_ids: list[str], status=None, date_from=None, date_to=None
+) -> dict:
+    results = {user_id: [] for user_id in user_ids}
+    for i in range(0, len(user_ids), IN_CHUNK):
+        chunk = user_ids[i : i + IN_CHUNK]
+        rows = (
+            _reservations_query(session, status, date_from, date_to)
+            .filter(Reservation.user_id.in_(chunk))
+            .all()
+        )
+        for row in rows:
+            results[row.user_id].append(_reservation_row(row))
+    return results
+
+
+def get_reservations_for_users(
+    user_ids: list[str],
+    status: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+) -> dict:
     """
-    List all reservations for a user given their user_id.
+    Batch variant for back-office and replay jobs: reservations for many
+    users, keyed by user_id, with one query per IN_CHUNK users.
     """
-    session = Session()
+    session = _session(readonly=True)
     try:
-        reservations = (
-            session.query(Reservation).filter(Reservation.user_id == user_id).all()
+        return _get_reservations_for_users(
+            session, list(dict.fromkeys(user_ids)), status, date_from, date_to
         )
-        results = []
-        for res in reservations:
-            # Join with experience for details
-            exp = (
-                session.query(Experience)
-                .filter(Experience.experience_id == res.experience_id)
-                .first()
-            )
-            results.append(
-                {
-                    "reservation_id": res.reservation_id,
-                    "status": res.status,
-                    "class": exp.title if exp else "Unknown",
-                    "when": str(exp.when) if exp else "Unknown",
-                }
-            )
-        if not results:
-            return json.dumps({"message": "No reservations found"})
-        return json.dumps(results)
-    except Exception as e:
-        return json.dumps({"error": str(e)})
     finally:
         session.close()
 
 
+def _cancel_reservation(session, reservation_id: str) -> dict:
+    # Restores the slot and the quota in the same transaction
+    return _cancelled(booking_engine.cancel(session, reservation_id))
+
+
+async def _acancel_reservation(session, reservation_id: str) -> dict:
+    return _cancelled(await booking_engine.acancel(session, reservation_id))
+
+
+def _cancelled(result: dict) -> dict:
+    user_id = result.pop("user_id", None)
+    if user_id:
+        tool_cache.cache.invalidate_user(user_id)
+    return result
+
+
 @tool
 def cancel_reservation(reservation_id: str) -> str:
     """
-    Cancel a reservation given its reservation_id.
+    Cancel a reservation given its reservation_id. The slot and the user's
+    monthly quota are given back.
     """
-    session = Session()
-    try:
-        res = (
-            session.query(Reservation)
-            .filter(Reservation.reservation_id == reservation_id)
-            .first()
-        )
-        if res:
-            res.status = "cancelled"
-            session.commit()
-            return json.dumps(
-                {
-                    "status": "success",
-                    "message": f"Reservation {reservation_id} cancelled.",
-                }
-            )
-        return json.dumps({"error": "Reservation not found"})
-    except Exception as e:
-        session.rollback()
-        return json.dumps({"error": str(e)})
-    finally:
-        session.close()
+    return _run(_cancel_reservation, reservation_id=reservation_id)
+
+
+def _update_subscription(session, user_id: str, new_tier: str) -> dict:
+    sub = session.query(Subscription).filter(Subscription.user_id == user_id).first()
+    if sub:
+        old_tier = sub.tier
+        sub.tier = new_tier
+        # Simple logic: Upgrade gives more quota, Downgrade reduces it
+        if new_tier == "elite":
+            sub.monthly_quota = 20
+        else:
+            sub.monthly_quota = 5
+
+        session.commit()
+        tool_cache.cache.invalidate_user(user_id)
+        return {
+            "status": "success",
+            "message": f"Upgraded from {old_tier} to {new_tier}. Quota updated to {sub.monthly_quota}.",
+        }
+    return {"error": "Subscription not found"}
 
 
 @tool
@@ -131,96 +306,31 @@ def update_subscription(user_id: str, new_tier: str) -> str:
     """
     Update a user's subscription tier (e.g., 'basic' or 'elite').
     """
-    session = Session()
-    try:
-        sub = (
-            session.query(Subscription).filter(Subscription.user_id == user_id).first()
-        )
-        if sub:
-            old_tier = sub.tier
-            sub.tier = new_tier
-            # Simple logic: Upgrade gives more quota, Downgrade reduces it
-            if new_tier == "elite":
-                sub.monthly_quota = 20
-            else:
-                sub.monthly_quota = 5
-
-            session.commit()
-            return json.dumps(
-                {
-                    "status": "success",
-                    "message": f"Upgraded from {old_tier} to {new_tier}. Quota updated to {sub.monthly_quota}.",
-                }
-            )
-        return json.dumps({"error": "Subscription not found"})
-    except Exception as e:
-        session.rollback()
-        return json.dumps({"error": str(e)})
-    finally:
-        session.close()
+    return _run(_update_subscription, user_id=user_id, new_tier=new_tier)
+
 
+def _book_reservation(session, user_id: str, experience_id: str) -> dict:
+    # Slot, duplicate and quota checks are atomic; see booking_engine
+    return _booked(booking_engine.book(session, user_id, experience_id), user_id)
 
-import uuid
+
+async def _abook_reservation(session, user_id: str, experience_id: str) -> dict:
+    return _booked(await booking_engine.abook(session, user_id, experience_id), user_id)
+
+
+def _booked(result: dict, user_id: str) -> dict:
+    if "error" not in result:
+        tool_cache.cache.invalidate_user(user_id)
+    return result
 
 
 @tool
 def book_reservation(user_id: str, experience_id: str) -> str:
     """
-    Book a class/experience for a user.
+    Book a class/experience for a user. Uses one slot of the experience and
+    one booking from the user's monthly quota.
     """
-    session = Session()
-    try:
-        # Check if experience exists and has slots
-        exp = (
-            session.query(Experience)
-            .filter(Experience.experience_id == experience_id)
-            .first()
-        )
-        if not exp:
-            return json.dumps({"error": "Experience not found"})
-
-        if exp.slots_available < 1:
-            return json.dumps({"error": "Class is full"})
-
-        # Check if user already booked
-        existing = (
-            session.query(Reservation)
-            .filter(
-                Reservation.user_id == user_id,
-                Reservation.experience_id == experience_id,
-            )
-            .first()
-        )
-
-        if existing and existing.status != "cancelled":
-            return json.dumps({"error": "User already booked this class"})
-
-        # Book it
-        # Note: In production we'd handle race conditions and subscription quota decrement
-        # Simplified for this project
-        new_res_id = f"res-{uuid.uuid4().hex[:6]}"
-        res = Reservation(
-            reservation_id=new_res_id,
-            user_id=user_id,
-            experience_id=experience_id,
-            status="confirmed",
-        )
-        exp.slots_available -= 1
-
-        session.add(res)
-        session.commit()
-        return json.dumps(
-            {
-                "status": "success",
-                "reservation_id": new_res_id,
-                "message": f"Successfully booked {exp.title}.",
-            }
-        )
-    except Exception as e:
-        session.rollback()
-        return json.dumps({"error": str(e)})
-    finally:
-        session.close()
+    return _run(_book_reservation, user_id=user_id, experience_id=experience_id)
 
 
 @tool
@@ -236,3 +346,25 @@ def get_retention_policy() -> str:
         "refund_policy": "No refunds for partial months. Strictly no refunds for used passes.",
     }
     return json.dumps(policy)
+
+
+# Async variants of the DB tools share the query code above; the read tools
+# go through the tool cache (agentic/tools/tool_cache.py) on both paths
+_with_async(lookup_user, _lookup_user, readonly=True, cached=True)
+_with_async(get_subscription_status, _get_subscription_status, readonly=True, cached=True)
+_with_async(get_user_reservations, _get_user_reservations, readonly=True, cached=True)
+_with_async(cancel_reservation, _acancel_reservation)
+_with_async(update_subscription, _update_subscription)
+_with_async(book_reservation, _abook_reservation)
+
+# Timing, query counts and the routed agent per call (agentic/instrumentation.py)
+for _tool in (
+    lookup_user,
+    get_subscription_status,
+    get_user_reservations,
+    cancel_reservation,
+    update_subscription,
+    book_reservation,
+    get_retention_policy,
+):
+    instrument_tool(_tool)
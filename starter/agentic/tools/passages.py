@@ -0,0 +1,206 @@
+"""
+Passage chunking of Knowledge articles and snippet selection for search.
+
+Articles are split when they are ingested (agentic/kb_ingest.py) into
+passages of at most PASSAGE_TOKENS: paragraphs are kept whole and merged
+while they fit, longer ones are split at sentence (then word) boundaries.
+Each passage stores its character offsets in the article, so a result can
+always point back to where it came from. Editing an article any other way
+(ORM, SQL) drops its passages by trigger; `backfill` re-chunks it, and until
+then search splits it on the fly.
+
+Search (agentic/tools/rag_tools.py) ranks passages instead of articles and
+returns only the best ones that fit RESULT_TOKEN_BUDGET, with the query
+terms highlighted, instead of up to three whole articles.
+"""
+import math
+import re
+from sqlalchemy import delete, insert, select
+from data.models.udahub import Knowledge, KnowledgePassage
+from agentic.tools import search_index
+
+PASSAGE_TOKENS = 120
+# Tokens of passage text one search returns, across all its results
+RESULT_TOKEN_BUDGET = 400
+MAX_PASSAGES = 6
+BACKFILL_BATCH = 500
+
+HIGHLIGHT = ("**", "**")
+
+_PARAGRAPH = re.compile(r"\S(?:.*?\S)?(?=\s*\n\s*\n|\s*\Z)", re.DOTALL)
+_SENTENCE = re.compile(r"\S.*?(?:[.!?](?=\s)|\n|\Z)", re.DOTALL)
+_WORD = re.compile(r"\S+")
+
+
+def approx_tokens(text: str) -> int:
+    """About four characters per token, like count_tokens_approximately."""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def _units(content: str, start: int, end: int, max_tokens: int) -> list[tuple[int, int]]:
+    """Spans of content[start:end] that each fit max_tokens (a word may not)."""
+    if approx_tokens(content[start:end]) <= max_tokens:
+        return [(start, end)]
+    for pattern in (_SENTENCE, _WORD):
+        spans = [
+            (start + m.start(), start + m.end())
+            for m in pattern.finditer(content[start:end])
+        ]
+        if len(spans) > 1:
+            return [unit for s, e in spans for unit in _units(content, s, e, max_tokens)]
+    return [(start, end)]
+
+
+def split_passages(content: str, max_tokens: int = PASSAGE_TOKENS) -> list[tuple[int, int]]:
+    """(start, end) offsets of the passages of an article's content."""
+    units = [
+        unit
+        for m in _PARAGRAPH.finditer(content)
+        for unit in _units(content, m.start(), m.end(), max_tokens)
+    ]
+    passages = []
+    for start, end in units:
+        if passages and approx_tokens(content[passages[-1][0] : end]) <= max_tokens:
+            passages[-1] = (passages[-1][0], end)
+        else:
+            passages.append((start, end))
+    return passages
+
+
+def passage_rows(article_id: str, account_id: str, title: str, content: str) -> list[dict]:
+    return [
+        {
+            "passage_id": f"{article_id}:{ordinal}",
+            "article_id": article_id,
+            "account_id": account_id,
+            "ordinal": ordinal,
+            "start_offset": start,
+            "end_offset": end,
+            "title": title,
+            "content": content[start:end],
+        }
+        for ordinal, (start, end) in enumerate(split_passages(content))
+    ]
+
+
+def replace_passages(conn, articles: list[dict]):
+    """
+    Re-chunk articles (dicts with article_id, account_id, title, content)
+    inside the caller's transaction; the FTS index follows by trigger.
+    """
+    if not articles:
+        return
+    conn.execute(
+        delete(KnowledgePassage).where(
+            KnowledgePassage.article_id.in_([article["article_id"] for article in articles])
+        )
+    )
+    rows = [
+        row
+        for article in articles
+        for row in passage_rows(
+            article["article_id"], article["account_id"], article["title"], article["content"]
+        )
+    ]
+    if rows:
+        conn.execute(insert(KnowledgePassage), rows)
+
+
+def backfill(engine) -> int:
+    """
+    Chunk the articles that have no passages: loaded before passages
+    existed, added outside kb_ingest, or edited since they were chunked (an
+    update trigger drops their passages). Returns how many were chunked.
+    """
+    chunked = 0
+    chunked_ids = select(KnowledgePassage.passage_id).where(
+        KnowledgePassage.article_id == Knowledge.article_id
+    )
+    missing = (
+        select(Knowledge.article_id, Knowledge.account_id, Knowledge.title, Knowledge.content)
+        .where(~chunked_ids.exists())
+        .limit(BACKFILL_BATCH)
+    )
+    while True:
+        with engine.begin() as conn:
+            articles = [dict(row) for row in conn.execute(missing).mappings()]
+            replace_passages(conn, articles)
+        chunked += len(articles)
+        if len(articles) < BACKFILL_BATCH:
+            return chunked
+
+
+# -- search results ------------------------------------------------------
+
+
+def query_terms(query: str) -> list[str]:
+    return list(dict.fromkeys(search_index.tokenize(query)))
+
+
+def _matches(word: str, term: str) -> bool:
+    # Rough stand-in for the FTS porter stemmer: "resetting" matches "reset"
+    word = word.lower()
+    return word == term or (len(term) >= 4 and word.startswith(term[: max(4, len(term) - 2)]))
+
+
+def overlap(text: str, terms: list[str]) -> float:
+    """Share of the query terms that occur in text."""
+    if not terms:
+        return 0.0
+    words = set(re.findall(r"\w+", text.lower()))
+    return sum(1 for term in terms if any(_matches(w, term) for w in words)) / len(terms)
+
+
+def highlight(text: str, terms: list[str]) -> str:
+    """text with the words matching a query term wrapped in HIGHLIGHT."""
+    before, after = HIGHLIGHT
+
+    def mark(m):
+        word = m.group(0)
+        return f"{before}{word}{after}" if any(_matches(word, t) for t in terms) else word
+
+    return re.sub(r"\w+", mark, text)
+
+
+def select_passages(
+    ranked: list[dict],
+    terms: list[str],
+    budget: int = RESULT_TOKEN_BUDGET,
+    max_passages: int = MAX_PASSAGES,
+) -> list[dict]:
+    """
+    Take passages best first while they fit the token budget (the best one
+    always, trimmed if needed), then group them by article in rank order.
+    `ranked` holds passage dicts (passage_id, article_id, ordinal, offsets,
+    title, content) sorted best first.
+    """
+    chosen, used = [], 0
+    for passage in ranked:
+        if len(chosen) >= max_passages:
+            break
+        tokens = approx_tokens(passage["content"])
+        if used + tokens > budget:
+            if chosen:
+                continue
+            passage = {**passage, "content": passage["content"][: budget * 4].rstrip() + "..."}
+            tokens = budget
+        chosen.append(passage)
+        used += tokens
+
+    articles = {}
+    for passage in chosen:
+        article = articles.setdefault(
+            passage["article_id"],
+            {"article_id": passage["article_id"], "title": passage["title"], "passages": []},
+        )
+        article["passages"].append(passage)
+    for article in articles.values():
+        article["passages"] = [
+            {
+                "start": p["start_offset"],
+                "end": p["end_offset"],
+                "snippet": highlight(p["content"], terms),
+            }
+            for p in sorted(article["passages"], key=lambda p: p["ordinal"])
+        ]
+    return list(articles.values())
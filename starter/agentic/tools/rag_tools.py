@@ -1,45 +1,332 @@
+from typing import Annotated
 from langchain_core.tools import tool
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from data.models.udahub import Knowledge
+from langgraph.prebuilt import InjectedState
+from sqlalchemy.orm import Session
+from data import migrations
+from data.models.udahub import Knowledge, KnowledgePassage
+from agentic import db
+from agentic.instrumentation import instrument_tool
+from agentic.tools import passages, search_index, vector_index
 import json
+import logging
+import os
+import time
+from types import SimpleNamespace
 
-UDA_DB_PATH = "sqlite:///udahub.db"
-engine = create_engine(UDA_DB_PATH)
-Session = sessionmaker(bind=engine)
+logger = logging.getLogger(__name__)
 
 
-@tool
-def search_knowledge_base(query: str) -> str:
+# Searching never writes, so it runs on the read-only engine; the schema,
+# passages and FTS indexes it reads are set up by `prepare()`. Engines are
+# created on the first search.
+def _session():
+    return db.get_sessionmaker(db.UDAHUB, readonly=True)()
+
+
+# Async sessions for ainvoke; the search itself runs through run_sync
+def _async_session():
+    return db.get_async_sessionmaker(db.UDAHUB, readonly=True)()
+
+
+TOP_K = 3
+
+# "keyword" (FTS5/BM25), "vector" (embeddings) or "hybrid" (both, fused)
+SEARCH_MODE = os.getenv("KB_SEARCH_MODE", "hybrid")
+# "passages" (the best passages of the top articles, within
+# passages.RESULT_TOKEN_BUDGET) or "articles" (the top articles, whole)
+RESULT_MODE = os.getenv("KB_RESULT_MODE", "passages")
+# Weight of the article's rank in a passage's score; the rest is the
+# passage's own match
+ARTICLE_WEIGHT = 0.5
+# Passages scoring below this share of the best passage's score are dropped
+MIN_RELATIVE_SCORE = 0.5
+# One vector index per account under this directory (see ShardCache)
+VECTOR_INDEX_DIR = os.getenv("KB_VECTOR_INDEX_DIR", "kb_index")
+# Memory budget of the loaded shards; least recently used ones are evicted
+SHARD_CACHE_MB = float(os.getenv("KB_SHARD_CACHE_MB", "512"))
+# Account searched when the ticket's account is unknown
+DEFAULT_ACCOUNT = os.getenv("KB_DEFAULT_ACCOUNT", "cultpass")
+# Weight of the vector score in hybrid mode
+HYBRID_ALPHA = 0.5
+# Vector hits below this cosine similarity are treated as unrelated, so the
+# tech agent can still escalate when nothing in the KB applies
+MIN_VECTOR_SCORE = 0.25
+# How many candidates each retriever contributes before fusion
+CANDIDATES = 20
+
+embedder = vector_index.HashingEmbedder()
+
+# Seconds between checks of a schema that was not ready yet
+SCHEMA_RECHECK = 60.0
+
+# (migrated, fts) as of the last check; None until the first search
+_schema = None
+_schema_checked = 0.0
+_shards = None
+
+
+def prepare(engine=None, index_dir: str | None = None, shards: bool = True) -> bool:
     """
-    Search the knowledge base for articles matching the query.
-    Returns a JSON string of matching articles (title and content snippet).
+    Bring udahub.db up to date for search: apply pending migrations, chunk
+    articles that have no passages, create the FTS indexes and (with
+    `shards`) build the missing or stale vector index shards under
+    `index_dir` (default: VECTOR_INDEX_DIR). Run once at startup or deploy (`python -m
+    agentic.kb_ingest --prepare`); search itself never writes. Returns False
+    when SQLite has no FTS5.
     """
-    session = Session()
-    try:
-        # Basic keyword search using SQL LIKE
-        formatted_query = f"%{query}%"
-        results = (
-            session.query(Knowledge)
-            .filter(
-                (Knowledge.title.ilike(formatted_query))
-                | (Knowledge.content.ilike(formatted_query))
-                | (Knowledge.tags.ilike(formatted_query))
-            )
-            .limit(3)
-            .all()
+    global _schema
+    engine = engine or db.get_engine(db.UDAHUB)
+    migrations.upgrade(engine, migrations.UDAHUB)
+    passages.backfill(engine)
+    fts = search_index.ensure_index(engine)
+    if shards:
+        with Session(engine) as session:
+            rebuilt = vector_index.build_shards(session, index_dir or VECTOR_INDEX_DIR, embedder)
+        if rebuilt:
+            logger.info("Built the vector index shards of %s", ", ".join(rebuilt))
+    _schema = None  # seen on the next search
+    return fts
+
+
+def _schema_state() -> tuple[bool, bool]:
+    """
+    (migrated, fts): whether udahub.db has every migration, so passages can be
+    ranked, and the FTS indexes. Checked read-only; until `prepare()` has run
+    search falls back to whole articles and LIKE matching.
+    """
+    global _schema, _schema_checked
+    if _schema == (True, True) or (
+        _schema is not None and time.monotonic() - _schema_checked < SCHEMA_RECHECK
+    ):
+        return _schema
+    engine = db.get_engine(db.UDAHUB, readonly=True)
+    migrated = migrations.current_version(engine) >= migrations.latest_version(migrations.UDAHUB)
+    with engine.connect() as conn:
+        tables = {
+            name
+            for name, in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+    state = (migrated, set(search_index.INDEXES) <= tables)
+    if state != (True, True) and state != _schema:
+        logger.warning(
+            "udahub.db is not prepared for search (migrated: %s, FTS: %s); using the "
+            "fallback. Run `python -m agentic.kb_ingest --prepare`.",
+            *state,
         )
+    _schema, _schema_checked = state, time.monotonic()
+    return state
 
-        if not results:
-            return json.dumps(
-                {"message": "No relevant articles found in knowledge base."}
+
+def _use_fts() -> bool:
+    return _schema_state()[1]
+
+
+def get_shards() -> vector_index.ShardCache:
+    global _shards
+    if _shards is None:
+        _shards = vector_index.ShardCache(
+            VECTOR_INDEX_DIR, embedder, max_bytes=int(SHARD_CACHE_MB * 2**20)
+        )
+    return _shards
+
+
+def get_vector_index(session, account_id: str = DEFAULT_ACCOUNT) -> vector_index.VectorIndex:
+    """
+    The account's index, memory-mapped from disk (built by `prepare()`) and
+    reloaded when an ingest (agentic/kb_ingest.py) saves a new version;
+    empty while it is missing or stale.
+    """
+    return get_shards().get(session, account_id)
+
+
+def _like_search(session, query: str, top_k: int, account_id: str):
+    # Fallback for SQLite builds without FTS5: substring match, unranked
+    formatted_query = f"%{query}%"
+    return (
+        session.query(Knowledge)
+        .filter(
+            Knowledge.account_id == account_id,
+            (Knowledge.title.ilike(formatted_query))
+            | (Knowledge.content.ilike(formatted_query))
+            | (Knowledge.tags.ilike(formatted_query)),
+        )
+        .limit(top_k)
+        .all()
+    )
+
+
+def _keyword_hits(session, query: str, top_k: int, account_id: str) -> list[tuple[str, float]]:
+    if not _use_fts():
+        return [(r.article_id, -1.0) for r in _like_search(session, query, top_k, account_id)]
+    return [
+        (r["article_id"], r["score"])
+        for r in search_index.search(session, query, top_k=top_k, account_id=account_id)
+    ]
+
+
+def _vector_hits(session, query: str, top_k: int, account_id: str) -> list[tuple[str, float]]:
+    hits = get_vector_index(session, account_id).search(embedder.embed_query(query), top_k)
+    return [(article_id, score) for article_id, score in hits if score >= MIN_VECTOR_SCORE]
+
+
+def rank_articles(
+    session,
+    query: str,
+    mode: str = SEARCH_MODE,
+    top_k: int = TOP_K,
+    account_id: str = DEFAULT_ACCOUNT,
+):
+    """Return up to top_k (article_id, score) pairs of the account's articles, best first."""
+    if mode == "keyword":
+        return _keyword_hits(session, query, top_k, account_id)
+    if mode == "vector":
+        return _vector_hits(session, query, top_k, account_id)
+    fused = vector_index.fuse_scores(
+        _vector_hits(session, query, CANDIDATES, account_id),
+        _keyword_hits(session, query, CANDIDATES, account_id),
+        alpha=HYBRID_ALPHA,
+    )
+    return fused[:top_k]
+
+
+def _passage_rows(session, ranked: list[str]) -> tuple[list, set[str]]:
+    """
+    (rows, split ids): the stored passages of the ranked articles, plus
+    passages split here for articles that have none. Editing an article
+    drops its passages (trigger in data/migrations.py) until `prepare()` or
+    an ingest re-chunks it, and search never writes.
+    """
+    rows = (
+        session.query(KnowledgePassage)
+        .filter(KnowledgePassage.article_id.in_(ranked))
+        .all()
+    )
+    chunked = {r.article_id for r in rows}
+    unchunked = [article_id for article_id in ranked if article_id not in chunked]
+    split = set()
+    if unchunked:
+        for article in session.query(Knowledge).filter(Knowledge.article_id.in_(unchunked)):
+            for row in passages.passage_rows(
+                article.article_id, article.account_id, article.title, article.content
+            ):
+                rows.append(SimpleNamespace(**row))
+                split.add(row["passage_id"])
+    return rows, split
+
+
+def rank_passages(session, query: str, ranked: list[str], account_id: str) -> list[dict]:
+    """
+    Passages of the ranked articles, best first: the article's rank and the
+    passage's own match (BM25 over passages, or term overlap without FTS5)
+    both count, so the best passage of a lower article can beat a weak
+    passage of the top one.
+    """
+    rows, split = _passage_rows(session, ranked)
+    terms = passages.query_terms(query)
+    if _use_fts():
+        hits = {
+            hit["passage_id"]: -hit["score"]
+            for hit in search_index.search_passages(
+                session, query, top_k=len(rows), account_id=account_id, article_ids=ranked
             )
+        }
+        best = max(hits.values(), default=0.0) or 1.0
+        match = {passage_id: score / best for passage_id, score in hits.items()}
+        # Not in the passage index yet; scored on the same 0..1 scale
+        match.update(
+            (r.passage_id, passages.overlap(r.content, terms)) for r in rows if r.passage_id in split
+        )
+    else:
+        match = {r.passage_id: passages.overlap(r.content, terms) for r in rows}
+    article_rank = {article_id: 1.0 / (1 + i) for i, article_id in enumerate(ranked)}
+
+    def score(r):
+        return (
+            ARTICLE_WEIGHT * article_rank[r.article_id]
+            + (1 - ARTICLE_WEIGHT) * match.get(r.passage_id, 0.0)
+        )
+
+    # Passages that match no query term, or much worse than the best one,
+    # only pad the prompt; the best passage is always kept
+    rows = sorted(rows, key=lambda r: (-score(r), -article_rank[r.article_id], r.ordinal))
+    cutoff = MIN_RELATIVE_SCORE * score(rows[0]) if rows else 0.0
+    return [
+        {
+            "passage_id": r.passage_id,
+            "article_id": r.article_id,
+            "ordinal": r.ordinal,
+            "start_offset": r.start_offset,
+            "end_offset": r.end_offset,
+            "title": r.title,
+            "content": r.content,
+        }
+        for i, r in enumerate(rows)
+        if i == 0 or (match.get(r.passage_id, 0.0) > 0 and score(r) >= cutoff)
+    ]
+
+
+def _search_knowledge_base(
+    session, query: str, account_id: str, mode: str | None = None
+):
+    ranked = [
+        article_id for article_id, _ in rank_articles(session, query, account_id=account_id)
+    ]
+
+    if not ranked:
+        return {"message": "No relevant articles found in knowledge base."}
+
+    # Passages exist once the schema is migrated (see prepare())
+    if (mode or RESULT_MODE) == "passages" and _schema_state()[0]:
+        return passages.select_passages(
+            rank_passages(session, query, ranked, account_id), passages.query_terms(query)
+        )
+
+    rows = (
+        session.query(Knowledge)
+        .filter(Knowledge.article_id.in_(ranked), Knowledge.account_id == account_id)
+        .all()
+    )
+    by_id = {r.article_id: r for r in rows}
 
-        articles = []
-        for r in results:
+    articles = []
+    for article_id in ranked:
+        r = by_id.get(article_id)
+        if r:
             articles.append({"title": r.title, "content": r.content, "tags": r.tags})
-        return json.dumps(articles)
+    return articles
+
+
+def _account(state: dict | None) -> str:
+    # The ticket's account, threaded through AgentState by the orchestrator
+    return (state or {}).get("account_id") or DEFAULT_ACCOUNT
+
+
+@tool
+def search_knowledge_base(query: str, state: Annotated[dict, InjectedState]) -> str:
+    """
+    Search the knowledge base for articles matching the query.
+    Returns a JSON string of the matching articles, each with its title and
+    the most relevant passages (query terms in **bold**).
+    """
+    session = _session()
+    try:
+        return json.dumps(_search_knowledge_base(session, query, _account(state)))
     except Exception as e:
         return json.dumps({"error": str(e)})
     finally:
         session.close()
+
+
+async def _asearch_knowledge_base(query: str, state: Annotated[dict, InjectedState]) -> str:
+    async with _async_session() as session:
+        try:
+            return json.dumps(
+                await session.run_sync(_search_knowledge_base, query, _account(state))
+            )
+        except Exception as e:
+            return json.dumps({"error": str(e)})
+
+
+search_knowledge_base.coroutine = _asearch_knowledge_base
+# Timing, query counts and the routed agent per call (agentic/instrumentation.py)
+instrument_tool(search_knowledge_base)
@@ -0,0 +1,199 @@
+"""
+Full-text index over the Knowledge table.
+
+The index is an SQLite FTS5 external-content table that reads its text from
+`knowledge` and is kept in sync by triggers, so rows added, edited or removed
+through the ORM (or the notebooks) are searchable without a reload.
+Results are ranked with BM25, which only touches the posting lists of the
+query terms instead of scanning every article. Searches can be limited to
+one account's articles.
+
+Passages (`knowledge_passages`, see agentic/tools/passages.py) have an index
+of their own, built the same way, so search can rank passages instead of
+whole articles.
+"""
+import re
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import OperationalError
+
+FTS_TABLE = "knowledge_fts"
+PASSAGE_FTS_TABLE = "knowledge_passages_fts"
+
+# Column weights for bm25(): title matches count most, then tags, then body
+BM25_WEIGHTS = (5.0, 1.0, 3.0)
+# Passages: (title, content); every passage repeats its article's title
+PASSAGE_BM25_WEIGHTS = (2.0, 1.0)
+
+# Words that carry no signal in support questions ("how do I ...")
+STOPWORDS = {
+    "a", "an", "and", "are", "can", "do", "does", "for", "how", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "the", "to", "what", "when",
+    "where", "why", "with", "you", "your",
+}
+
+def _fts_ddl(fts: str, table: str, columns: tuple[str, ...]) -> list[str]:
+    """External-content FTS5 table over `table` plus the triggers that sync it."""
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {names},
+            content='{table}', content_rowid='rowid',
+            tokenize='porter unicode61'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {names}) VALUES (new.rowid, {new});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old});
+            INSERT INTO {fts}(rowid, {names}) VALUES (new.rowid, {new});
+        END
+        """,
+    ]
+
+
+# FTS table -> (content table, indexed columns)
+INDEXES = {
+    FTS_TABLE: ("knowledge", ("title", "content", "tags")),
+    PASSAGE_FTS_TABLE: ("knowledge_passages", ("title", "content")),
+}
+
+
+def ensure_index(engine) -> bool:
+    """
+    Create the FTS table and sync triggers if missing, backfilling existing rows.
+    Returns False when the SQLite build has no FTS5 support.
+    """
+    try:
+        with engine.begin() as conn:
+            for fts, (table, columns) in INDEXES.items():
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"),
+                    {"n": fts},
+                ).first()
+                for stmt in _fts_ddl(fts, table, columns):
+                    conn.execute(text(stmt))
+                if not exists:
+                    conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        return True
+    except OperationalError:
+        return False
+
+
+def rebuild_index(engine):
+    """
+    Re-read every article and passage into the indexes.
+    Needed after a VACUUM, which may renumber the rowids the indexes point at.
+    """
+    with engine.begin() as conn:
+        for fts in INDEXES:
+            conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def tokenize(query: str) -> list[str]:
+    """Lowercased word tokens of a query with stopwords removed."""
+    words = re.findall(r"\w+", query.lower())
+    return [w for w in words if w not in STOPWORDS] or words
+
+
+def build_match_expression(query: str) -> str:
+    """
+    Turn a natural-language question into an FTS5 MATCH expression.
+    Terms are OR-ed so partial matches still rank; BM25 rewards articles
+    matching more of them.
+    """
+    terms = dict.fromkeys(tokenize(query))  # de-duplicate, keep order
+    return " OR ".join(f'"{t}"' for t in terms)
+
+
+def search(session, query: str, top_k: int = 3, account_id: str | None = None) -> list[dict]:
+    """
+    Return the top_k articles for the query (of `account_id`), best first.
+    Each result has article_id, title, content, tags and its BM25 score
+    (lower is better, as returned by SQLite).
+    """
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+    account_filter = "AND k.account_id = :account_id" if account_id is not None else ""
+    rows = session.execute(
+        text(
+            f"""
+            SELECT k.article_id, k.title, k.content, k.tags,
+                   bm25({FTS_TABLE}, :w_title, :w_content, :w_tags) AS score
+            FROM {FTS_TABLE}
+            JOIN knowledge k ON k.rowid = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH :expr {account_filter}
+            ORDER BY score
+            LIMIT :k
+            """
+        ),
+        {
+            "expr": expression,
+            "account_id": account_id,
+            "k": top_k,
+            "w_title": BM25_WEIGHTS[0],
+            "w_content": BM25_WEIGHTS[1],
+            "w_tags": BM25_WEIGHTS[2],
+        },
+    ).mappings()
+    return [dict(r) for r in rows]
+
+
+def search_passages(
+    session,
+    query: str,
+    top_k: int = 20,
+    account_id: str | None = None,
+    article_ids: list[str] | None = None,
+) -> list[dict]:
+    """
+    Return the top_k passages for the query (of `account_id`, and of
+    `article_ids` if given), best first, with passage_id, article_id,
+    ordinal, offsets, title, content and BM25 score (lower is better).
+    """
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+    filters = ""
+    if account_id is not None:
+        filters += " AND p.account_id = :account_id"
+    if article_ids is not None:
+        filters += " AND p.article_id IN :article_ids"
+    statement = text(
+        f"""
+        SELECT p.passage_id, p.article_id, p.ordinal, p.start_offset, p.end_offset,
+               p.title, p.content,
+               bm25({PASSAGE_FTS_TABLE}, :w_title, :w_content) AS score
+        FROM {PASSAGE_FTS_TABLE}
+        JOIN knowledge_passages p ON p.rowid = {PASSAGE_FTS_TABLE}.rowid
+        WHERE {PASSAGE_FTS_TABLE} MATCH :expr{filters}
+        ORDER BY score
+        LIMIT :k
+        """
+    )
+    if article_ids is not None:
+        statement = statement.bindparams(bindparam("article_ids", expanding=True))
+    rows = session.execute(
+        statement,
+        {
+            "expr": expression,
+            "account_id": account_id,
+            "article_ids": article_ids,
+            "k": top_k,
+            "w_title": PASSAGE_BM25_WEIGHTS[0],
+            "w_content": PASSAGE_BM25_WEIGHTS[1],
+        },
+    ).mappings()
+    return [dict(r) for r in rows]
@@ -0,0 +1,177 @@
+"""
+Read-through cache for the read-only CultPass tools.
+
+`lookup_user`, `get_subscription_status` and `get_user_reservations` results
+are cached by tool name and arguments (LRU, TTL). Every entry is tagged with
+the user it describes (`user:<user_id>`), and the write tools
+(`update_subscription`, `cancel_reservation`, `book_reservation`) invalidate
+that tag after they commit.
+
+A read that overlaps with a write must not repopulate the cache with the
+pre-write result. Each invalidation therefore stamps its tag with a
+monotonically increasing epoch, and `put()` drops a result when any of its
+tags was invalidated after the read began (`begin()`).
+
+Invalidation is per process; writes made by other processes are only picked
+up when the entry expires, so keep TOOL_CACHE_TTL short when several workers
+share one database.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = int(os.getenv("TOOL_CACHE_SIZE", "10000"))
+TTL_SECONDS = float(os.getenv("TOOL_CACHE_TTL", "60"))
+ENABLED = os.getenv("TOOL_CACHE", "1") != "0"
+
+
+def user_tag(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+class ToolCache:
+    """LRU + TTL map from (tool, arguments) to the tool's JSON output."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_seconds: float = TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (value, expires_at, tags)
+        self._tagged = {}  # tag -> set of keys
+        # tag -> epoch of its last invalidation; bounded like the entries.
+        # Tags dropped from it count as invalidated at `_floor`.
+        self._invalidated = OrderedDict()
+        self._floor = 0
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+        self._by_tool = {}
+
+    @staticmethod
+    def make_key(tool: str, arguments: dict) -> str:
+        return f"{tool}|{json.dumps(arguments, sort_keys=True, default=str)}"
+
+    def _count(self, key: str, field: str):
+        tool = key.split("|", 1)[0]
+        counts = self._by_tool.setdefault(tool, {"hits": 0, "misses": 0})
+        counts[field] += 1
+
+    def _remove(self, key: str):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    # -- reads -------------------------------------------------------------
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                self._count(key, "misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._count(key, "hits")
+            return entry[0]
+
+    def begin(self) -> int:
+        """Epoch to pass to put() for a read that starts now."""
+        with self._lock:
+            return self._epoch
+
+    def put(self, key: str, value: str, tags: list[str], since: int):
+        with self._lock:
+            # A write to one of the tags landed while the value was being read
+            for tag in tags:
+                if self._invalidated.get(tag, self._floor) > since:
+                    self.stale_puts += 1
+                    return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.time() + self.ttl_seconds, tuple(tags))
+            for tag in tags:
+                self._tagged.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    # -- writes ------------------------------------------------------------
+
+    def invalidate(self, tag: str) -> int:
+        """Drop every entry carrying `tag`; returns how many were dropped."""
+        with self._lock:
+            self._epoch += 1
+            self._invalidated[tag] = self._epoch
+            self._invalidated.move_to_end(tag)
+            while len(self._invalidated) > self.max_entries:
+                _, epoch = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, epoch)
+            keys = self._tagged.pop(tag, set())
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def invalidate_user(self, user_id: str) -> int:
+        return self.invalidate(user_tag(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tagged.clear()
+            # Reads already in flight must not repopulate the cache
+            self._epoch += 1
+            self._invalidated.clear()
+            self._floor = self._epoch
+
+    # -- stats -------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            by_tool = {
+                tool: {
+                    **counts,
+                    "hit_rate": counts["hits"] / (counts["hits"] + counts["misses"])
+                    if counts["hits"] + counts["misses"]
+                    else 0.0,
+                }
+                for tool, counts in self._by_tool.items()
+            }
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+                "hit_rate": self.hit_rate,
+                "by_tool": by_tool,
+            }
+
+
+cache = ToolCache()
@@ -0,0 +1,427 @@
+"""
+Dense-vector index over the Knowledge table.
+
+Articles are embedded once and stored as a contiguous float32 matrix
+(`vectors-<n>.npy`) next to the list of article ids. The matrix is
+memory-mapped on load, so a worker starts without reading it into RAM, and
+queries are a single matrix-vector product followed by an argpartition top-k.
+
+`updated` patches changed and removed articles into a copy of the index
+(see agentic/kb_ingest.py). Saves write a new matrix file and then swap
+`meta.json`, so a reader never sees ids and vectors from different versions.
+
+Each account has its own index (a shard) under `<root>/<account_id>/`.
+Shards are built ahead of search by `build_shards` (run by
+`rag_tools.prepare()`) and kept up to date by ingests. `ShardCache` loads
+them on first query, never builds them, and keeps the recently used ones
+within a memory budget.
+
+Any LangChain `Embeddings` implementation can be plugged in. `HashingEmbedder`
+is the default: deterministic, dependency-free and needs no network.
+"""
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from urllib.parse import quote
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import func
+from data.models.udahub import Knowledge
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.npy"  # indexes saved before versioned matrix files
+META_FILE = "meta.json"
+# Seconds a loaded shard is served before its fingerprint is checked again
+SHARD_RECHECK = 60.0
+
+
+class HashingEmbedder(Embeddings):
+    """
+    Signed feature hashing of word unigrams, word bigrams and character
+    trigrams into a fixed number of dimensions, L2-normalised.
+    Character trigrams give some recall across spelling variants
+    ("log in" / "login") that plain keyword search misses.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    @property
+    def name(self) -> str:
+        return f"hashing-{self.dim}"
+
+    def _features(self, text: str) -> list[str]:
+        words = re.findall(r"\w+", text.lower())
+        features = list(words)
+        features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for w in words:
+            padded = f"#{w}#"
+            features += [padded[i : i + 3] for i in range(len(padded) - 2)]
+        return features
+
+    def _embed(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            # crc32 is stable across processes, unlike hash()
+            h = zlib.crc32(feature.encode("utf-8"))
+            vec[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(t).tolist() for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text).tolist()
+
+
+def embedder_name(embedder: Embeddings) -> str:
+    """Identifier stored with an index so it is never queried with another model."""
+    return getattr(embedder, "name", None) or getattr(
+        embedder, "model", type(embedder).__name__
+    )
+
+
+def article_text(title: str, content: str, tags: str | None) -> str:
+    """The text that gets embedded for one article."""
+    return f"{title}\n{tags or ''}\n{content}"
+
+
+def knowledge_fingerprint(session, account_id: str | None = None) -> dict:
+    """
+    Cheap summary of the Knowledge table (or of one account's articles) used
+    to detect a stale index.
+    """
+    query = session.query(func.count(Knowledge.article_id), func.max(Knowledge.updated_at))
+    if account_id is not None:
+        query = query.filter(Knowledge.account_id == account_id)
+    count, last_update = query.one()
+    return {"count": count, "last_update": str(last_update)}
+
+
+def shard_path(root: str, account_id: str) -> str:
+    """Directory of an account's index under root."""
+    return os.path.join(root, quote(account_id, safe=""))
+
+
+def saved_version(path: str) -> int | None:
+    """Changes whenever the index at path is saved again; None if there is none."""
+    try:
+        return os.stat(os.path.join(path, META_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """Article ids plus a row-aligned (n, dim) float32 matrix of unit vectors."""
+
+    def __init__(self, ids: list[str], vectors: np.ndarray, meta: dict):
+        self.ids = ids
+        self.vectors = vectors
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory of the matrix and the id list."""
+        return self.vectors.nbytes + 64 * len(self.ids)
+
+    @classmethod
+    def build(cls, session, embedder: Embeddings, batch_size: int = 256, account_id: str | None = None):
+        """Embed every Knowledge article (of one account), streaming rows in batches."""
+        ids, chunks, batch = [], [], []
+
+        def flush():
+            texts = [article_text(*row[1:]) for row in batch]
+            chunks.append(np.asarray(embedder.embed_documents(texts), dtype=np.float32))
+            ids.extend(row[0] for row in batch)
+            batch.clear()
+
+        rows = session.query(
+            Knowledge.article_id, Knowledge.title, Knowledge.content, Knowledge.tags
+        )
+        if account_id is not None:
+            rows = rows.filter(Knowledge.account_id == account_id)
+        for row in rows.order_by(Knowledge.article_id).yield_per(batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        if chunks:
+            vectors = _normalize(np.vstack(chunks))
+        else:
+            vectors = np.zeros((0, 0), dtype=np.float32)
+        meta = {
+            "embedder": embedder_name(embedder),
+            "dim": int(vectors.shape[1]) if len(ids) else 0,
+            "account_id": account_id,
+            "fingerprint": knowledge_fingerprint(session, account_id),
+        }
+        return cls(ids, np.ascontiguousarray(vectors, dtype=np.float32), meta)
+
+    def updated(self, ids: list[str], vectors, removed=()) -> "VectorIndex":
+        """
+        A copy with the rows of `ids` replaced (or appended, for new ids) by
+        `vectors` and the rows of `removed` dropped. Meta is copied as is.
+        """
+        matrix = np.array(self.vectors, dtype=np.float32)  # off the memory map
+        new = np.zeros((0, 0), dtype=np.float32)
+        if len(ids):
+            new = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+            if not len(self.ids):
+                matrix = np.zeros((0, new.shape[1]), dtype=np.float32)
+        position = {article_id: i for i, article_id in enumerate(self.ids)}
+        appended = []
+        for article_id, vector in zip(ids, new):
+            if article_id in position:
+                matrix[position[article_id]] = vector
+            else:
+                position[article_id] = len(self.ids) + len(appended)
+                appended.append((article_id, vector))
+        all_ids = self.ids + [article_id for article_id, _ in appended]
+        if appended:
+            matrix = np.vstack([matrix, np.stack([vector for _, vector in appended])])
+        removed = set(removed)
+        if removed:
+            keep = [i for i, article_id in enumerate(all_ids) if article_id not in removed]
+            all_ids = [all_ids[i] for i in keep]
+            matrix = matrix[keep]
+        meta = {**self.meta, "dim": int(matrix.shape[1]) if all_ids else 0}
+        return VectorIndex(all_ids, np.ascontiguousarray(matrix), meta)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        vectors_file = f"vectors-{uuid.uuid4().hex[:12]}.npy"
+        np.save(os.path.join(path, vectors_file), self.vectors)
+        tmp = os.path.join(path, f"{META_FILE}.{uuid.uuid4().hex[:12]}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**self.meta, "vectors_file": vectors_file, "ids": self.ids}, f)
+        os.replace(tmp, os.path.join(path, META_FILE))
+        # Readers that mapped an older matrix keep it until they reload
+        for old in glob.glob(os.path.join(path, "vectors*.npy")):
+            if os.path.basename(old) != vectors_file:
+                os.remove(old)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True):
+        """Load a saved index; with mmap the matrix is paged in on demand."""
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        ids = meta.pop("ids")
+        vectors = np.load(
+            os.path.join(path, meta.pop("vectors_file", VECTORS_FILE)),
+            mmap_mode="r" if mmap else None,
+        )
+        return cls(ids, vectors, meta)
+
+    def search(self, query_vector, top_k: int = 3) -> list[tuple[str, float]]:
+        """Return (article_id, cosine similarity) pairs, best first."""
+        if not self.ids:
+            return []
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if not norm:
+            return []
+        scores = self.vectors @ (q / norm)
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+
+def load_current(
+    path: str, session, embedder: Embeddings, account_id: str | None = None
+) -> VectorIndex | None:
+    """
+    The index at path, or None when it is missing, was built with a
+    different embedder, or no longer matches the table (or the account).
+    """
+    if os.path.exists(os.path.join(path, META_FILE)):
+        index = VectorIndex.load(path)
+        if is_current(index, session, embedder, account_id):
+            return index
+    return None
+
+
+def is_current(
+    index: VectorIndex, session, embedder: Embeddings, account_id: str | None = None
+) -> bool:
+    """Whether index was built with embedder and still matches the table (or the account)."""
+    return index.meta.get("embedder") == embedder_name(embedder) and index.meta.get(
+        "fingerprint"
+    ) == knowledge_fingerprint(session, account_id)
+
+
+def build_shards(
+    session, root: str, embedder: Embeddings, accounts: list[str] | None = None
+) -> dict[str, int]:
+    """
+    Build and save the shards of `accounts` (default: every account with
+    articles) that are missing or stale; returns {account_id: articles
+    embedded} for the rebuilt ones.
+    """
+    if accounts is None:
+        accounts = [account_id for account_id, in session.query(Knowledge.account_id).distinct()]
+    rebuilt = {}
+    for account_id in sorted(accounts):
+        path = shard_path(root, account_id)
+        if load_current(path, session, embedder, account_id) is None:
+            index = VectorIndex.build(session, embedder, account_id=account_id)
+            index.save(path)
+            rebuilt[account_id] = len(index)
+    return rebuilt
+
+
+def _empty_index() -> VectorIndex:
+    return VectorIndex([], np.zeros((0, 0), dtype=np.float32), {})
+
+
+class ShardCache:
+    """
+    Per-account indexes under `root`, loaded on an account's first query and
+    evicted least recently used once their memory exceeds `max_bytes`. A
+    shard saved again (by an ingest) is reloaded on its next query, and a
+    loaded shard's fingerprint is checked against the table again every
+    `recheck` seconds. A missing or stale shard is served as an empty index
+    (no vector hits) until `build_shards` or an ingest replaces it; search
+    never builds one. Thread-safe; concurrent first queries of an account
+    load it once.
+    """
+
+    def __init__(
+        self, root: str, embedder: Embeddings, max_bytes: int, recheck: float = SHARD_RECHECK
+    ):
+        self.root = root
+        self.embedder = embedder
+        self.max_bytes = max_bytes
+        self.recheck = recheck
+        # account_id -> (index, saved version, monotonic time it was checked)
+        self._shards = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}  # account_id -> lock held while it loads
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.missing = 0
+
+    def get(self, session, account_id: str) -> VectorIndex:
+        path = shard_path(self.root, account_id)
+        version = saved_version(path)
+        with self._lock:
+            entry = self._cached(account_id, version)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            loading = self._loading.setdefault(account_id, threading.Lock())
+        with loading:
+            with self._lock:
+                entry = self._cached(account_id, version)
+                if entry is not None:
+                    self.hits += 1
+                    return entry
+                previous = self._shards.get(account_id)
+            loaded = False
+            if previous is not None and previous[1] == version and len(previous[0]):
+                # Same file, due for a recheck against the table
+                index = previous[0]
+                if not is_current(index, session, self.embedder, account_id):
+                    index = None
+            else:
+                try:
+                    index = load_current(path, session, self.embedder, account_id)
+                except (OSError, ValueError):
+                    if previous is None:
+                        raise
+                    return previous[0]  # caught mid-save; serve the loaded version
+                loaded = True
+            if index is None:
+                if previous is None or len(previous[0]):
+                    logger.warning(
+                        "Vector index of %s is missing or stale; searching without it "
+                        "until `python -m agentic.kb_ingest --prepare` rebuilds it",
+                        account_id,
+                    )
+                index = _empty_index()
+            with self._lock:
+                self._store(account_id, index, saved_version(path))
+                self._loading.pop(account_id, None)
+                self.loads += loaded
+                self.missing += not len(index)
+        return index
+
+    def _cached(self, account_id: str, version) -> VectorIndex | None:
+        entry = self._shards.get(account_id)
+        if entry is None or entry[1] != version or time.monotonic() - entry[2] >= self.recheck:
+            return None
+        self._shards.move_to_end(account_id)
+        return entry[0]
+
+    def _store(self, account_id: str, index: VectorIndex, version):
+        old = self._shards.pop(account_id, None)
+        if old is not None:
+            self._bytes -= old[0].nbytes
+        self._shards[account_id] = (index, version, time.monotonic())
+        self._bytes += index.nbytes
+        # The shard just stored stays even if it alone exceeds the budget
+        while self._bytes > self.max_bytes and len(self._shards) > 1:
+            _, (evicted, _, _) = self._shards.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._shards.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "shards": len(self._shards),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "missing": self.missing,
+            }
+
+
+def fuse_scores(
+    vector_hits: list[tuple[str, float]],
+    keyword_hits: list[tuple[str, float]],
+    alpha: float = 0.5,
+) -> list[tuple[str, float]]:
+    """
+    Combine vector similarity with keyword relevance.
+    BM25 scores from SQLite are negative (lower is better), so they are flipped
+    and scaled to [0, 1] by the best hit before the weighted sum.
+    """
+    combined = {}
+    if vector_hits:
+        for article_id, score in vector_hits:
+            combined[article_id] = alpha * max(score, 0.0)
+    if keyword_hits:
+        best = max(-score for _, score in keyword_hits) or 1.0
+        for article_id, score in keyword_hits:
+            combined[article_id] = combined.get(article_id, 0.0) + (1 - alpha) * (
+                -score / best
+            )
+    return sorted(combined.items(), key=lambda item: item[1], reverse=True)
@@ -1,14 +1,118 @@
+import importlib
+import threading
+from dataclasses import dataclass, field
 from typing import TypedDict, Annotated, Union
 from langgraph.graph import StateGraph, END, START
 from langgraph.graph.message import add_messages
 from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
-from agentic.agents.billing import billing_agent
-from agentic.agents.booking import booking_agent
-from agentic.agents.tech_support import tech_agent
-from agentic.agents.retention import retention_agent
-from agentic.agents.triage import triage_chain
+from agentic.agents import fast_triage
+from agentic.agents.triage import RouteQuery
+from agentic import context, prefetch
+from agentic.context import windowed_state, windowed_messages
+from agentic.agents.triage_cache import CachedTriageChain, TriageCache
+from agentic.checkpoints import CHECKPOINT_DB_PATH, PooledSqliteSaver
+from agentic.instrumentation import instrument_node
+from agentic.lazy import lazy_attributes
+
+# Specialist node name -> (module, builder). A module, its tools and its
+# agent are only loaded the first time the route is taken.
+SPECIALISTS = {
+    "billing_agent": ("agentic.agents.billing", "build_billing_agent"),
+    "booking_agent": ("agentic.agents.booking", "build_booking_agent"),
+    "tech_agent": ("agentic.agents.tech_support", "build_tech_agent"),
+    "retention_agent": ("agentic.agents.retention", "build_retention_agent"),
+}
+
+
+@dataclass
+class OrchestratorConfig:
+    """
+    What `build_orchestrator` wires together. Unset fields fall back to the
+    shared defaults (agentic/llm.py, checkpoints.db), created on first use.
+    """
+
+    # Chat model for the specialists, and for triage and the rolling summary
+    # unless they get their own
+    model: BaseChatModel | None = None
+    triage_model: BaseChatModel | None = None
+    summary_model: BaseChatModel | None = None
+    # Prebuilt agents by node name, e.g. {"booking_agent": ...}
+    agents: dict = field(default_factory=dict)
+    # Replacement tools by tool name, e.g. {"book_reservation": dry_run_tool},
+    # given to every specialist that has a tool of that name
+    tools: dict = field(default_factory=dict)
+    checkpointer: BaseCheckpointSaver | None = None
+    checkpoint_path: str = CHECKPOINT_DB_PATH
+    # Start the background checkpoint compactor (the default savers only)
+    compact: bool = True
+    # Build every agent now instead of on its first ticket
+    eager: bool = False
+    # Cache of LLM triage answers (default: the shared, persistent one)
+    triage_cache: TriageCache | None = None
+    # Local fast-path classification and sticky follow-ups; None follows
+    # TRIAGE_FAST_PATH / TRIAGE_STICKY (agentic/agents/fast_triage.py)
+    fast_path: bool | None = None
+    sticky: bool | None = None
+    # Retrain the fast-path classifier from udahub.db's labelled tickets
+    # when the orchestrator is built
+    train_triage: bool = False
+
+
+class AgentRegistry:
+    """The specialists and the triage chain of one orchestrator, built on first use."""
+
+    def __init__(self, config: OrchestratorConfig):
+        self.config = config
+        self._agents = dict(config.agents)
+        self._triage_chain = None
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        agent = self._agents.get(name)
+        if agent is None:
+            with self._lock:
+                agent = self._agents.get(name)
+                if agent is None:
+                    module, builder = SPECIALISTS[name]
+                    module = importlib.import_module(module)
+                    build = getattr(module, builder)
+                    tools = [self.config.tools.get(t.name, t) for t in module.tools]
+                    agent = self._agents[name] = build(self.config.model, tools=tools)
+        return agent
+
+    @property
+    def triage_chain(self) -> CachedTriageChain:
+        # Repeated wordings are answered from the cache instead of the LLM
+        if self._triage_chain is None:
+            with self._lock:
+                if self._triage_chain is None:
+                    from agentic.agents import triage, triage_cache
+
+                    self._triage_chain = CachedTriageChain(
+                        triage.build_triage_chain(self.config.triage_model or self.config.model),
+                        self.config.triage_cache or triage_cache.cache,
+                    )
+        return self._triage_chain
+
+    def summarizer(self) -> BaseChatModel:
+        """The model folding old turns into the rolling summary (agentic/context.py)."""
+        return self.config.summary_model or self.config.model or context.get_summarizer()
+
+    def build_all(self):
+        for name in SPECIALISTS:
+            self.get(name)
+        return self.triage_chain
+
+    def train_triage(self):
+        from agentic import db
+
+        with db.get_sessionmaker(db.UDAHUB, readonly=True)() as session:
+            fast_triage.train_from_db(session)
 
 
 class AgentState(TypedDict):
@@ -16,78 +120,191 @@ class AgentState(TypedDict):
     destination: str
     sentiment: str
     urgency: str
+    # Rolling summary of messages[:summarized_count] (see agentic/context.py)
+    summary: str
+    summarized_count: int
+    # User, subscription and reservations loaded next to triage (agentic/prefetch.py)
+    customer_context: dict
+    # The ticket's account; scopes knowledge-base searches to its articles
+    account_id: str
 
 
 # Wrapper nodes for the sub-agents
-def billing_node(state: AgentState):
-    result = billing_agent.invoke(state)
-    return {"messages": result["messages"][-1]}  # Return the last message (response)
+# Each agent sees the rolling summary plus the newest turns within its token
+# budget rather than the whole checkpointed history
+def specialist_input(state: AgentState, name: str) -> dict:
+    """The specialist's window, led by the prefetched customer context if it uses it."""
+    inputs = windowed_state(state, name)
+    if name in prefetch.CONTEXT_ROUTES and state.get("customer_context"):
+        inputs["messages"] = [
+            prefetch.context_message(state["customer_context"]),
+            *inputs["messages"],
+        ]
+    return inputs
 
 
-def booking_node(state: AgentState):
-    result = booking_agent.invoke(state)
-    return {"messages": result["messages"][-1]}
+def specialist_nodes(agents: AgentRegistry, name: str):
+    """Sync and async node for one specialist; returns only its reply."""
 
+    def node(state: AgentState):
+        result = agents.get(name).invoke(specialist_input(state, name))
+        return {"messages": result["messages"][-1]}  # Return the last message (response)
 
-def tech_node(state: AgentState):
-    result = tech_agent.invoke(state)
-    return {"messages": result["messages"][-1]}
+    # Async version, used when the graph is driven with ainvoke/astream so many
+    # tickets can wait on the LLM concurrently on one event loop
+    async def anode(state: AgentState):
+        result = await agents.get(name).ainvoke(specialist_input(state, name))
+        return {"messages": result["messages"][-1]}
 
+    node.__name__, anode.__name__ = f"{name}_node", f"a{name}_node"
+    return node, anode
 
-def retention_node(state: AgentState):
-    result = retention_agent.invoke(state)
-    return {"messages": result["messages"][-1]}
 
+def previous_route(state: AgentState) -> RouteQuery | None:
+    """The route checkpointed by the ticket's last turn, if any."""
+    if not state.get("destination"):
+        return None
+    return RouteQuery(
+        destination=state["destination"],
+        sentiment=state.get("sentiment") or "Neutral",
+        urgency=state.get("urgency") or "Low",
+    )
 
-def triage_node(state: AgentState):
-    classification = triage_chain.invoke({"messages": state["messages"]})
-    return {
-        "destination": classification.destination,
-        "sentiment": classification.sentiment,
-        "urgency": classification.urgency,
-    }
+
+def triage_nodes(agents: AgentRegistry):
+    config = agents.config
+
+    # Follow-ups stay on the ticket's specialist, confident cases are
+    # classified in-process; the rest go to the (cached) LLM chain
+    def triage_node(state: AgentState):
+        classification = fast_triage.classify(
+            windowed_messages(state, "triage"),
+            fallback=agents.triage_chain,
+            context={"previous_destination": state.get("destination", "")},
+            previous=previous_route(state),
+            fast_path=config.fast_path,
+            sticky=config.sticky,
+        )
+        return {
+            "destination": classification.destination,
+            "sentiment": classification.sentiment,
+            "urgency": classification.urgency,
+        }
+
+    async def atriage_node(state: AgentState):
+        classification = await fast_triage.aclassify(
+            windowed_messages(state, "triage"),
+            fallback=agents.triage_chain,
+            context={"previous_destination": state.get("destination", "")},
+            previous=previous_route(state),
+            fast_path=config.fast_path,
+            sticky=config.sticky,
+        )
+        return {
+            "destination": classification.destination,
+            "sentiment": classification.sentiment,
+            "urgency": classification.urgency,
+        }
+
+    return triage_node, atriage_node
 
 
 def route_logic(state: AgentState):
     return state["destination"]
 
 
-# Define the graph
-builder = StateGraph(AgentState)
+def build_graph(agents: AgentRegistry) -> StateGraph:
+    """The uncompiled graph; compile it with a checkpointer."""
+    builder = StateGraph(AgentState)
 
-builder.add_node("triage", triage_node)
-builder.add_node("billing_agent", billing_node)
-builder.add_node("booking_agent", booking_node)
-builder.add_node("tech_agent", tech_node)
-builder.add_node("retention_agent", retention_node)
+    # Each node has a sync and an async implementation; LangGraph picks the one
+    # matching invoke/ainvoke. Both are instrumented (agentic/instrumentation.py).
+    def add_node(name: str, func, afunc):
+        builder.add_node(
+            name,
+            RunnableLambda(instrument_node(name, func), afunc=instrument_node(name, afunc)),
+        )
 
-# Start ---> Triage ---> [Conditional] ---> Agents ---> End
-builder.add_edge(START, "triage")
+    add_node("context", *context.context_nodes(agents.summarizer))
+    add_node("triage", *triage_nodes(agents))
+    for name in SPECIALISTS:
+        add_node(name, *specialist_nodes(agents, name))
 
-builder.add_conditional_edges(
-    "triage",
-    route_logic,
-    {
-        "billing_agent": "billing_agent",
-        "booking_agent": "booking_agent",
-        "tech_agent": "tech_agent",
-        "retention_agent": "retention_agent",
-    },
-)
+    # Start ---> Context ---> Triage ---> [Conditional] ---> Agents ---> End
+    #                    \--> Prefetch --/
+    # Prefetch runs in the same step as triage, so the specialist (next
+    # step) starts once both have finished.
+    builder.add_edge(START, "context")
+    builder.add_edge("context", "triage")
+    if prefetch.ENABLED:
+        add_node("prefetch", prefetch.prefetch_node, prefetch.aprefetch_node)
+        builder.add_edge("context", "prefetch")
+
+    builder.add_conditional_edges(
+        "triage",
+        route_logic,
+        {name: name for name in SPECIALISTS},
+    )
+
+    # After agent speaks, we end the turn
+    for name in SPECIALISTS:
+        builder.add_edge(name, END)
+    return builder
 
-# After agent speaks, we end the turn
-builder.add_edge("billing_agent", END)
-builder.add_edge("booking_agent", END)
-builder.add_edge("tech_agent", END)
-builder.add_edge("retention_agent", END)
 
-from langgraph.checkpoint.sqlite import SqliteSaver
-import sqlite3
+def build_orchestrator(config: OrchestratorConfig | None = None):
+    """
+    Compile an orchestrator. Agents, models and database engines are created
+    when a ticket first needs them (or now, with `config.eager`).
+    """
+    config = config or OrchestratorConfig()
+    agents = AgentRegistry(config)
+    if config.eager:
+        agents.build_all()
+    if config.train_triage:
+        agents.train_triage()
+    checkpointer = config.checkpointer
+    if checkpointer is None:
+        # Use a SqliteSaver with per-thread WAL connections for persistence.
+        # Only the newest CHECKPOINT_KEEP_LAST checkpoints per ticket are kept;
+        # the compactor prunes the rest in the background.
+        checkpointer = PooledSqliteSaver(config.checkpoint_path)
+        if config.compact:
+            checkpointer.start_compactor()
+    return build_graph(agents).compile(checkpointer=checkpointer)
 
-# Use SqliteSaver for persistence
-# We need to create a connection. check_same_thread=False is needed if shared,
-# but for this simple app it's fine.
-conn = sqlite3.connect("checkpoints.db", check_same_thread=False)
-checkpointer = SqliteSaver(conn)
 
-orchestrator = builder.compile(checkpointer=checkpointer)
+async def build_async_orchestrator(path: str | None = None, config: OrchestratorConfig | None = None):
+    """
+    Compile the graph with an async checkpointer for use with ainvoke/astream
+    (default: a BoundedAsyncSqliteSaver, pruned like the sync one). Must be
+    awaited inside the event loop that will drive the graph.
+    """
+    from agentic.async_checkpoints import BoundedAsyncSqliteSaver
+
+    config = config or OrchestratorConfig()
+    agents = AgentRegistry(config)
+    if config.eager:
+        agents.build_all()
+    if config.train_triage:
+        agents.train_triage()
+    checkpointer = config.checkpointer
+    if checkpointer is None:
+        checkpointer = await BoundedAsyncSqliteSaver.connect(path or config.checkpoint_path)
+        if config.compact:
+            checkpointer.start_compactor()
+    return build_graph(agents).compile(checkpointer=checkpointer)
+
+
+def _default_checkpointer():
+    return __getattr__("orchestrator").checkpointer
+
+
+# The default orchestrator (and its checkpointer) is compiled on first access:
+#     from agentic.workflow import orchestrator
+__getattr__ = lazy_attributes(
+    globals(),
+    orchestrator=build_orchestrator,
+    checkpointer=_default_checkpointer,
+    builder=lambda: build_graph(AgentRegistry(OrchestratorConfig())),
+)
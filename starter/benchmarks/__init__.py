@@ -0,0 +1,8 @@
+"""
+Offline benchmarks for the orchestrator.
+
+The shared chat model (agentic/llm.py) is replaced by a deterministic fake model
+(`benchmarks.fake_models`) that follows a scripted scenario per ticket, so
+the graph, tools, databases and checkpointer can be measured without network
+calls. Run with `python -m benchmarks.run` from the `starter/` directory.
+"""
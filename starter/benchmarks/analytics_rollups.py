@@ -0,0 +1,189 @@
+"""
+Dashboard queries on the analytics rollups vs the raw per-turn table.
+
+Writes `--turns` synthetic turns (spread over `--tickets` tickets, `--accounts`
+accounts and `--days` days) through `analytics.apply_turns` in the writer's
+batch size, then answers the same dashboard questions twice:
+- from the rollups (`analytics.rollup` / `analytics.current`)
+- with a GROUP BY over every row of `analytics_turns`
+
+and reports write throughput, both query latencies and whether the answers
+agree (exits with status 1 if they do not).
+
+    cd starter
+    python -m benchmarks.analytics_rollups --turns 1000000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+
+SENTIMENTS = ["Positive", "Neutral", "Negative", "Frustrated"]
+URGENCIES = ["Low", "Medium", "High", "Critical"]
+AGENTS = ["billing_agent", "booking_agent", "tech_agent", "retention_agent"]
+COUNTS = ("turns", "tickets", "tickets_opened", "mean_latency_ms")
+
+
+def synthetic_turns(args, start: datetime):
+    """Turns in time order; each ticket keeps its agent with probability 0.8."""
+    rng = random.Random(args.seed)
+    step = timedelta(days=args.days) / args.turns
+    agents = {}
+    for i in range(args.turns):
+        ticket = rng.randrange(args.tickets)
+        agent = agents.get(ticket)
+        if agent is None or rng.random() < 0.2:
+            agent = agents[ticket] = rng.choice(AGENTS)
+        yield {
+            "turn_id": f"turn-{i:09d}",
+            "ticket_id": f"ticket-{ticket:07d}",
+            "account_id": f"account-{ticket % args.accounts:03d}",
+            "agent": agent,
+            "sentiment": rng.choices(SENTIMENTS, weights=[2, 6, 2, 1])[0],
+            "urgency": rng.choices(URGENCIES, weights=[6, 3, 2, 1])[0],
+            "latency_ms": round(rng.uniform(200, 4000), 1),
+            "created_at": start + i * step,
+        }
+
+
+# (question, rollup call, equivalent raw SQL over analytics_turns)
+def questions(analytics, since: datetime, account: str):
+    hour = since.replace(minute=0, second=0, microsecond=0)
+    return [
+        (
+            "turns by agent and sentiment, last 7 days",
+            lambda engine: analytics.rollup(engine, ("agent", "sentiment"), since=since),
+            "SELECT agent, sentiment, COUNT(*) AS turns FROM analytics_turns "
+            "WHERE created_at >= :hour GROUP BY agent, sentiment ORDER BY agent, sentiment",
+        ),
+        (
+            "hourly turns of one account, last 7 days",
+            lambda engine: analytics.rollup(engine, ("hour",), since=since, account_id=account),
+            "SELECT strftime('%Y-%m-%d %H:00:00', created_at) AS hour, COUNT(*) AS turns "
+            "FROM analytics_turns WHERE created_at >= :hour AND account_id = :account "
+            "GROUP BY 1 ORDER BY 1",
+        ),
+        (
+            "daily turns by agent, all time",
+            lambda engine: analytics.rollup(engine, ("day", "agent")),
+            "SELECT date(created_at) || ' 00:00:00' AS day, agent, COUNT(*) AS turns "
+            "FROM analytics_turns GROUP BY 1, 2 ORDER BY 1, 2",
+        ),
+        (
+            "turns by urgency, all time",
+            lambda engine: analytics.rollup(engine, ("urgency",)),
+            "SELECT urgency, COUNT(*) AS turns FROM analytics_turns GROUP BY urgency ORDER BY urgency",
+        ),
+        (
+            "tickets by latest urgency",
+            lambda engine: analytics.current(engine, ("urgency",)),
+            "SELECT urgency, COUNT(*) AS tickets FROM ("
+            "  SELECT urgency, ROW_NUMBER() OVER ("
+            "    PARTITION BY ticket_id ORDER BY created_at DESC, turn_id DESC) AS n"
+            "  FROM analytics_turns) WHERE n = 1 GROUP BY urgency ORDER BY urgency",
+        ),
+    ], {"hour": hour, "account": account}
+
+
+def timed(func, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def _counts(rows: list[dict]) -> list[tuple]:
+    # Compare on the group keys and the count, whatever the column types
+    return [
+        tuple(str(value) for name, value in row.items() if name not in COUNTS)
+        + (row.get("turns", row.get("tickets")),)
+        for row in rows
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=1_000_000)
+    parser.add_argument("--tickets", type=int, default=200_000)
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=1000, help="turns per write transaction")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per query (best is kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the temporary database")
+    args = parser.parse_args(argv)
+
+    from data import migrations
+    from data.models import udahub
+    from agentic import analytics
+
+    workdir = tempfile.mkdtemp(prefix="analytics-bench-")
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'udahub.db')}")
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    # The analytics tables come with the udahub migrations, on top of the models
+    udahub.Base.metadata.create_all(engine)
+    migrations.upgrade(engine, migrations.UDAHUB)
+
+    end = datetime.now().replace(microsecond=0)
+    started = time.perf_counter()
+    batch = []
+    for turn in synthetic_turns(args, end - timedelta(days=args.days)):
+        batch.append(turn)
+        if len(batch) >= args.batch_size:
+            analytics._transaction(engine, analytics.apply_turns, batch)
+            batch = []
+    analytics._transaction(engine, analytics.apply_turns, batch)
+    write_seconds = time.perf_counter() - started
+    print(
+        f"wrote {args.turns:,} turns in {write_seconds:.1f}s "
+        f"({args.turns / write_seconds:,.0f} turns/s, batches of {args.batch_size})"
+    )
+
+    failures = 0
+    checks, params = questions(analytics, end - timedelta(days=7), "account-007")
+    for question, from_rollups, raw_sql in checks:
+        rollup_seconds, rollup_rows = timed(lambda: from_rollups(engine), args.repeat)
+
+        def raw():
+            with engine.connect() as conn:
+                return [dict(row) for row in conn.execute(text(raw_sql), params).mappings()]
+
+        raw_seconds, raw_rows = timed(raw, args.repeat)
+        agree = _counts(rollup_rows) == _counts(raw_rows)
+        failures += not agree
+        print(
+            f"  {question:<44} rollup {1000 * rollup_seconds:>8.2f} ms  "
+            f"raw {1000 * raw_seconds:>9.2f} ms  ({raw_seconds / rollup_seconds:>6.0f}x)  "
+            f"{'same answer' if agree else 'DIFFERENT ANSWER'}"
+        )
+
+    with engine.connect() as conn:
+        sizes = {
+            table: conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+            for table in (
+                "analytics_turns",
+                "analytics_hourly",
+                "analytics_daily",
+                "analytics_current",
+                "analytics_tickets",
+            )
+        }
+    print(f"rows: {sizes}")
+    engine.dispose()
+    if args.keep:
+        print(f"Database kept in {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Concurrency stress test for the booking engine (agentic/tools/booking_engine.py).
+
+Many threads book (and occasionally cancel) a handful of scarce experiences
+for a small pool of users, so slot, duplicate and quota conflicts are the
+norm rather than the exception. Afterwards the database is checked for:
+- no experience with negative slots, and slots taken == active reservations
+- at most one active reservation per (user, experience)
+- every user's quota reduced by exactly their active reservations
+- successful bookings minus successful cancellations == active reservations
+
+Exits with status 1 if any invariant is violated.
+
+    cd starter
+    python -m benchmarks.booking_stress --threads 64 --attempts 5000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+def seed(path: str, experiences: int, slots: int, users: int, quota: int):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from data.models import cultpass
+
+    engine = create_engine(f"sqlite:///{path}")
+    cultpass.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    for i in range(experiences):
+        session.add(
+            cultpass.Experience(
+                experience_id=f"exp-{i:03d}",
+                title=f"Class drop {i}",
+                description="Stress test class",
+                location="Online",
+                when=datetime(2025, 1, 1, 18, 0),
+                slots_available=slots,
+                is_premium=False,
+            )
+        )
+    for i in range(users):
+        session.add(
+            cultpass.User(
+                user_id=f"user-{i:04d}",
+                full_name=f"User {i}",
+                email=f"user{i}@example.com",
+                is_blocked=False,
+            )
+        )
+        session.add(
+            cultpass.Subscription(
+                subscription_id=f"sub-{i:04d}",
+                user_id=f"user-{i:04d}",
+                status="active",
+                tier="basic",
+                monthly_quota=quota,
+            )
+        )
+    session.commit()
+    session.close()
+    engine.dispose()
+
+
+def verify(path: str, args, outcomes: Counter) -> list[str]:
+    import sqlite3
+
+    conn = sqlite3.connect(path)
+    failures = []
+    active = dict(
+        conn.execute(
+            "SELECT experience_id, COUNT(*) FROM reservations "
+            "WHERE status != 'cancelled' GROUP BY experience_id"
+        ).fetchall()
+    )
+    for experience_id, slots in conn.execute(
+        "SELECT experience_id, slots_available FROM experiences"
+    ):
+        if slots < 0:
+            failures.append(f"{experience_id}: negative slots ({slots})")
+        taken = args.slots - slots
+        if taken != active.get(experience_id, 0):
+            failures.append(
+                f"{experience_id}: {taken} slots taken but "
+                f"{active.get(experience_id, 0)} active reservations"
+            )
+
+    duplicates = conn.execute(
+        "SELECT user_id, experience_id, COUNT(*) FROM reservations "
+        "WHERE status != 'cancelled' GROUP BY user_id, experience_id HAVING COUNT(*) > 1"
+    ).fetchall()
+    for user_id, experience_id, count in duplicates:
+        failures.append(f"{user_id}/{experience_id}: {count} active reservations")
+
+    per_user = dict(
+        conn.execute(
+            "SELECT user_id, COUNT(*) FROM reservations "
+            "WHERE status != 'cancelled' GROUP BY user_id"
+        ).fetchall()
+    )
+    for user_id, quota in conn.execute("SELECT user_id, monthly_quota FROM subscriptions"):
+        if quota < 0 or args.quota - quota != per_user.get(user_id, 0):
+            failures.append(
+                f"{user_id}: quota {quota}, {per_user.get(user_id, 0)} active reservations"
+            )
+
+    rows = sum(active.values())
+    expected = outcomes["booked"] - outcomes["cancelled"]
+    if rows != expected:
+        failures.append(f"{rows} active reservations, expected {expected}")
+    conn.close()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--attempts", type=int, default=5000, help="booking attempts in total")
+    parser.add_argument("--experiences", type=int, default=3)
+    parser.add_argument("--slots", type=int, default=200, help="slots per experience")
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--quota", type=int, default=2, help="monthly quota per user")
+    parser.add_argument("--cancel-rate", type=float, default=0.1, help="chance to cancel after a booking")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the temporary database")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="booking-stress-")
+    path = os.path.join(workdir, "cultpass.db")
+    # Every worker holds a connection while it waits for the write lock
+    os.environ["DB_POOL_SIZE"] = str(args.threads)
+    os.environ["DB_MAX_OVERFLOW"] = "0"
+    seed(path, args.experiences, args.slots, args.users, args.quota)
+
+    from agentic import db
+    from agentic.tools import booking_engine
+
+    db.configure(db.CULTPASS, path)
+    Session = db.get_sessionmaker(db.CULTPASS)
+
+    outcomes = Counter()
+    outcomes_lock = threading.Lock()
+
+    def worker(index: int):
+        rng = random.Random(args.seed * 1_000_003 + index)
+        user_id = f"user-{rng.randrange(args.users):04d}"
+        experience_id = f"exp-{rng.randrange(args.experiences):03d}"
+        session = Session()
+        try:
+            result = booking_engine.book(session, user_id, experience_id)
+            outcome = "booked" if "error" not in result else result["error"]
+            cancelled = False
+            if "error" not in result and rng.random() < args.cancel_rate:
+                cancelled = "error" not in booking_engine.cancel(session, result["reservation_id"])
+        finally:
+            session.close()
+        with outcomes_lock:
+            outcomes[outcome] += 1
+            outcomes["cancelled"] += cancelled
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(worker, range(args.attempts)))
+    elapsed = time.perf_counter() - started
+    db.dispose_all()
+
+    failures = verify(path, args, outcomes)
+    print(f"{args.attempts} attempts on {args.threads} threads in {elapsed:.2f}s "
+          f"({args.attempts / elapsed:.0f}/s)")
+    for outcome, count in outcomes.most_common():
+        print(f"  {outcome:<60} {count:>7}")
+    if failures:
+        print(f"FAILED: {len(failures)} invariant violations")
+        for failure in failures[:20]:
+            print(f"  {failure}")
+    else:
+        print("OK: no oversell, no duplicate active reservations, quotas consistent")
+
+    if args.keep:
+        print(f"Database kept in {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Cold-start benchmark: how long a fresh process takes to serve its first ticket.
+
+Each run starts a new interpreter and times:
+- import: `import agentic.workflow`
+- build: `build_orchestrator(config)`
+- first_ticket: one ticket end to end (agents, tools and engines for its
+  route are created here in lazy mode)
+
+in two modes:
+- lazy: the default; everything is created on first use
+- eager: `OrchestratorConfig(eager=True)` builds every agent and the triage
+  chain up front, like the import-time construction it replaced
+
+Models are the scripted fakes (benchmarks.fake_models), so no network is
+used; `openai_client` separately times importing langchain_openai and
+creating one ChatOpenAI, the cost lazy mode defers until a real model is
+first needed.
+
+`--baseline <git ref>` also times `import agentic.workflow` in an older
+checkout, where importing built every client, agent and the graph:
+
+    cd starter
+    python -m benchmarks.cold_start --runs 5 --baseline <ref>
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = ("lazy", "eager")
+PHASES = ("import", "build", "first_ticket", "total")
+
+
+def child(mode: str):
+    """Runs in the fresh interpreter; prints one JSON line of timings."""
+    start = time.perf_counter()
+    import agentic.workflow as workflow
+
+    imported = time.perf_counter()
+
+    from langchain_core.messages import HumanMessage
+    from benchmarks.fake_models import install
+    from benchmarks.scenarios import SCENARIOS
+
+    install(SCENARIOS)
+    setup = time.perf_counter()
+    graph = workflow.build_orchestrator(
+        workflow.OrchestratorConfig(eager=mode == "eager", compact=False)
+    )
+    built = time.perf_counter()
+
+    scenario = SCENARIOS[0]
+    graph.invoke(
+        {"messages": [HumanMessage(content=scenario.text)]},
+        {"configurable": {"thread_id": "cold-start"}},
+    )
+    done = time.perf_counter()
+    print(
+        json.dumps(
+            {
+                "import": imported - start,
+                "build": built - setup,
+                "first_ticket": done - built,
+                "total": done - start - (setup - imported),
+                "modules": len(sys.modules),
+                "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            }
+        )
+    )
+
+
+def openai_client() -> float:
+    code = (
+        "import time; t = time.perf_counter()\n"
+        "from langchain_openai import ChatOpenAI\n"
+        "ChatOpenAI(model='gpt-4o-mini')\n"
+        "print(time.perf_counter() - t)"
+    )
+    return float(_python(["-c", code]))
+
+
+def baseline_import(ref: str, workdir: str) -> float:
+    """Import time of agentic.workflow at `ref` (a fresh process)."""
+    checkout = os.path.join(workdir, "baseline")
+    os.makedirs(checkout)
+    root = subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"], capture_output=True, text=True, check=True
+    ).stdout.strip()
+    archive = subprocess.run(
+        ["git", "-C", root, "archive", ref, "starter"], capture_output=True, check=True
+    ).stdout
+    subprocess.run(["tar", "-x", "-C", checkout], input=archive, check=True)
+    code = (
+        "import time; t = time.perf_counter()\n"
+        "import agentic.workflow\n"
+        "print(time.perf_counter() - t)"
+    )
+    return float(_python(["-c", code], cwd=os.path.join(checkout, "starter")))
+
+
+def _python(args: list[str], cwd: str | None = None) -> str:
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=cwd,
+        env=os.environ,
+    )
+    return result.stdout.strip().splitlines()[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per mode")
+    parser.add_argument("--baseline", help="git ref to compare import time against")
+    parser.add_argument("--out", help="also write the results as JSON")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        child(args.child)
+        return 0
+
+    from benchmarks.seed import seed_databases
+
+    workdir = tempfile.mkdtemp(prefix="cold-start-")
+    seed_databases(workdir)
+    os.environ.update(
+        {
+            "CULTPASS_DB_PATH": os.path.join(workdir, "cultpass.db"),
+            "UDAHUB_DB_PATH": os.path.join(workdir, "udahub.db"),
+            "CHECKPOINT_DB_PATH": os.path.join(workdir, "checkpoints.db"),
+            "TRIAGE_CACHE_PATH": os.path.join(workdir, "triage_cache.db"),
+            "KB_VECTOR_INDEX_DIR": os.path.join(workdir, "kb_index"),
+            "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "offline"),
+        }
+    )
+    try:
+        runs = {mode: [] for mode in MODES}
+        # Interleave the modes so both see the same disk cache state
+        for _ in range(args.runs):
+            for mode in MODES:
+                runs[mode].append(json.loads(_python(["-m", "benchmarks.cold_start", "--child", mode])))
+        client = statistics.median(openai_client() for _ in range(args.runs))
+        baseline = None
+        if args.baseline:
+            baseline = statistics.median(
+                baseline_import(args.baseline, os.path.join(workdir, f"run-{i}"))
+                for i in range(args.runs)
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        mode: {
+            key: round(statistics.median(run[key] for run in results), 4)
+            for key in (*PHASES, "modules", "max_rss_mb")
+        }
+        for mode, results in runs.items()
+    }
+    report["openai_client"] = round(client, 4)
+    if baseline is not None:
+        report["baseline"] = {"ref": args.baseline, "import": round(baseline, 4)}
+
+    print(f"median of {args.runs} fresh processes (seconds)")
+    print(f"{'':<14}" + "".join(f"{mode:>10}" for mode in MODES))
+    for key in (*PHASES, "modules", "max_rss_mb"):
+        print(f"{key:<14}" + "".join(f"{report[mode][key]:>10}" for mode in MODES))
+    print(f"openai_client {client:>10.4f}  (deferred by lazy mode until a real model is used)")
+    if baseline is not None:
+        print(f"baseline      {baseline:>10.4f}  (import at {args.baseline}, everything built eagerly)")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
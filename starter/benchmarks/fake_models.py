@@ -0,0 +1,230 @@
+"""
+Deterministic stand-ins for ChatOpenAI.
+
+`ScriptedChatModel` answers from a table of scenarios keyed by the user's
+message. For a react agent it first emits the scenario's tool calls, one
+model step each (skipping lookups answered by a prefetched customer
+context, see agentic/prefetch.py), then the scripted reply; for the triage chain
+(`with_structured_output`) it returns the scenario's route. Every call sleeps
+for a configurable latency so the graph overhead can be compared against a
+realistic model wait.
+"""
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, NamedTuple
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import RunnableLambda
+from agentic.prefetch import CONTEXT_HEADER, PREFETCHED_TOOLS
+
+DEFAULT_REPLY = "Thanks for reaching out, I have noted your request."
+
+
+class Scenario(NamedTuple):
+    route: str
+    text: str
+    tool_calls: list  # [(tool_name, args), ...] in call order
+    reply: str
+    sentiment: str = "Neutral"
+    urgency: str = "Low"
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Fake chat model that plays back scenarios; see module docstring."""
+
+    scenarios: dict = {}
+    latency: float = 0.0  # seconds per model call
+    token_latency: float = 0.0  # seconds per streamed token
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    # -- scenario lookup ---------------------------------------------------
+
+    def find(self, text: str) -> Scenario | None:
+        scenario = self.scenarios.get(text)
+        if scenario is not None:
+            return scenario
+        # The triage prompt embeds the messages in a larger string
+        matches = [key for key in self.scenarios if key in text]
+        return self.scenarios[max(matches, key=len)] if matches else None
+
+    def _next_message(self, messages: list[BaseMessage]) -> AIMessage:
+        last_human = max(
+            (i for i, m in enumerate(messages) if isinstance(m, HumanMessage)),
+            default=-1,
+        )
+        text = messages[last_human].content if last_human >= 0 else ""
+        scenario = self.find(text if isinstance(text, str) else str(text))
+        if scenario is None:
+            return self._with_usage(AIMessage(content=DEFAULT_REPLY), messages)
+        # Like a real agent, skip lookups the prefetched customer context answers
+        tool_calls = scenario.tool_calls
+        if any(
+            isinstance(m, SystemMessage) and m.content.startswith(CONTEXT_HEADER)
+            for m in messages
+        ):
+            tool_calls = [call for call in tool_calls if call[0] not in PREFETCHED_TOOLS]
+        # One tool call per model step after the user's message
+        step = sum(
+            1
+            for m in messages[last_human + 1 :]
+            if isinstance(m, AIMessage) and m.tool_calls
+        )
+        if step < len(tool_calls):
+            name, args = tool_calls[step]
+            reply = AIMessage(
+                content="",
+                tool_calls=[{"name": name, "args": args, "id": f"call-{step}"}],
+            )
+        else:
+            reply = AIMessage(content=scenario.reply)
+        return self._with_usage(reply, messages)
+
+    @staticmethod
+    def _with_usage(reply: AIMessage, messages: list[BaseMessage]) -> AIMessage:
+        """Approximate token usage, like the real model reports it."""
+        input_tokens = count_tokens_approximately(messages)
+        output_tokens = count_tokens_approximately([reply])
+        reply.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return reply
+
+    # -- BaseChatModel -----------------------------------------------------
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        for chunk in self._chunks(self._next_message(messages)):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for chunk in self._chunks(self._next_message(messages)):
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    @staticmethod
+    def _chunks(message: AIMessage):
+        if message.tool_calls:
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        {
+                            "name": call["name"],
+                            "args": json.dumps(call["args"]),
+                            "id": call["id"],
+                            "index": i,
+                        }
+                        for i, call in enumerate(message.tool_calls)
+                    ],
+                    usage_metadata=message.usage_metadata,
+                )
+            )
+            return
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=word if last else word + " ",
+                    # Usage is reported once, with the final chunk
+                    usage_metadata=message.usage_metadata if last else None,
+                )
+            )
+
+    def bind_tools(self, tools, **kwargs):
+        # Tool calls come from the script, so the schemas are not needed
+        return self
+
+    def with_structured_output(self, schema, **kwargs):
+        def to_messages(prompt: Any) -> list[BaseMessage]:
+            if isinstance(prompt, PromptValue):
+                return prompt.to_messages()
+            if isinstance(prompt, str):
+                return [HumanMessage(content=prompt)]
+            return list(prompt)
+
+        def classify(prompt: Any):
+            if self.latency:
+                time.sleep(self.latency)
+            return self._route(schema, to_messages(prompt))
+
+        async def aclassify(prompt: Any):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self._route(schema, to_messages(prompt))
+
+        return RunnableLambda(classify, afunc=aclassify, name="ScriptedStructuredOutput")
+
+    def _route(self, schema, messages: list[BaseMessage]):
+        text = "\n".join(str(m.content) for m in messages if isinstance(m, HumanMessage))
+        scenario = self.find(text)
+        if scenario is None:
+            return schema(destination="tech_agent")
+        return schema(
+            destination=scenario.route,
+            sentiment=scenario.sentiment,
+            urgency=scenario.urgency,
+        )
+
+
+def install(scenarios: list[Scenario], latency: float = 0.0, token_latency: float = 0.0):
+    """
+    Register a ScriptedChatModel as the shared chat model (agentic/llm.py),
+    so every agent, the triage chain and the summarizer use it.
+    Returns the shared scenario table, which can be extended afterwards.
+    """
+    from agentic import llm
+
+    table = {scenario.text: scenario for scenario in scenarios}
+    model = ScriptedChatModel(scenarios=table, latency=latency, token_latency=token_latency)
+    llm.set_chat_model(model)
+    llm.set_chat_model(model, temperature=0)
+    return table
+
+
+def repeat(scenarios: list[Scenario], per_route: int) -> list[Scenario]:
+    """`per_route` scenarios for each route, cycling through the given ones."""
+    by_route = {}
+    for scenario in scenarios:
+        by_route.setdefault(scenario.route, []).append(scenario)
+    return [
+        scenario
+        for route in sorted(by_route)
+        for scenario in itertools.islice(itertools.cycle(by_route[route]), per_route)
+    ]
@@ -0,0 +1,178 @@
+"""
+Prompt size of knowledge-base search results: whole articles vs passages.
+
+Runs the same queries through `search_knowledge_base` in both result modes
+(KB_RESULT_MODE, see agentic/tools/rag_tools.py) on freshly seeded databases
+and reports, per corpus:
+- tokens the tool result adds to the agent's prompt (mean, p95, max)
+- how often both modes put the same article first
+- recall: how often the article a query was written for is in the result
+
+Queries are the tech scenarios' searches plus every article's title. The
+"seed" corpus is the CultPass articles as shipped (short, mostly one passage
+each); the "long" corpus appends four other articles to each, as further
+sections, which is where returning whole articles hurts.
+
+    cd starter
+    python -m benchmarks.rag_prompt_size --sections 4
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from benchmarks.run import percentile
+
+MODES = ("articles", "passages")
+LONG_ACCOUNT = "cultpass-long"
+
+
+def long_feed(path: str, articles: list[dict], sections: int) -> str:
+    """JSONL of the articles, each followed by `sections` others."""
+    with open(path, "w") as f:
+        for i, article in enumerate(articles):
+            others = [articles[(i + k) % len(articles)] for k in range(1, sections + 1)]
+            content = "\n\n".join(
+                [article["content"]] + [f"{o['title']}\n\n{o['content']}" for o in others]
+            )
+            record = {
+                "article_id": f"{LONG_ACCOUNT}-{article['article_id']}",
+                "title": article["title"],
+                "content": content,
+                "tags": article["tags"],
+            }
+            f.write(json.dumps(record) + "\n")
+    return path
+
+
+def measure(session, queries: list[tuple[str, str | None]], account_id: str) -> dict:
+    from agentic.tools import passages, rag_tools
+
+    results = {mode: {"tokens": [], "seconds": [], "top": [], "hits": 0} for mode in MODES}
+    for query, expected in queries:
+        for mode in MODES:
+            started = time.perf_counter()
+            result = rag_tools._search_knowledge_base(session, query, account_id, mode=mode)
+            results[mode]["seconds"].append(time.perf_counter() - started)
+            results[mode]["tokens"].append(passages.approx_tokens(json.dumps(result)))
+            if not isinstance(result, list):
+                ids = []
+            elif mode == "articles":
+                # Whole-article results carry no id; they come in rank order
+                ranked = rag_tools.rank_articles(session, query, account_id=account_id)
+                ids = [article_id for article_id, _ in ranked]
+            else:
+                ids = [article["article_id"] for article in result]
+            results[mode]["top"].append(ids[0] if ids else None)
+            results[mode]["hits"] += expected is not None and expected in ids
+
+    expected_count = sum(1 for _, expected in queries if expected is not None)
+    report = {"queries": len(queries)}
+    for mode, r in results.items():
+        tokens = r["tokens"]
+        report[mode] = {
+            "mean_tokens": round(sum(tokens) / len(tokens), 1),
+            "p95_tokens": percentile(tokens, 0.95),
+            "max_tokens": max(tokens),
+            "mean_ms": round(1000 * sum(r["seconds"]) / len(r["seconds"]), 3),
+            "recall": round(r["hits"] / expected_count, 3) if expected_count else None,
+        }
+    report["token_reduction"] = round(
+        1 - report["passages"]["mean_tokens"] / report["articles"]["mean_tokens"], 3
+    )
+    report["same_top_article"] = round(
+        sum(a == p for a, p in zip(results["articles"]["top"], results["passages"]["top"]))
+        / len(queries),
+        3,
+    )
+    return report
+
+
+def print_report(name: str, report: dict):
+    print(f"{name}: {report['queries']} queries")
+    print(f"  {'mode':<10} {'mean tok':>9} {'p95 tok':>8} {'max tok':>8} {'mean ms':>8} {'recall':>7}")
+    for mode in MODES:
+        r = report[mode]
+        recall = "-" if r["recall"] is None else f"{r['recall']:.2f}"
+        print(
+            f"  {mode:<10} {r['mean_tokens']:>9} {r['p95_tokens']:>8} {r['max_tokens']:>8} "
+            f"{r['mean_ms']:>8} {recall:>7}"
+        )
+    print(
+        f"  tokens saved: {100 * report['token_reduction']:.1f}%, "
+        f"same top article: {100 * report['same_top_article']:.0f}%"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sections", type=int, default=4, help="articles appended in the long corpus")
+    parser.add_argument("--out", help="also write the report as JSON")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary databases")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="rag-prompt-size-")
+    os.environ["UDAHUB_DB_PATH"] = os.path.join(workdir, "udahub.db")
+    os.environ["CULTPASS_DB_PATH"] = os.path.join(workdir, "cultpass.db")
+    os.environ["KB_VECTOR_INDEX_DIR"] = os.path.join(workdir, "kb_index")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    from benchmarks.scenarios import SCENARIOS
+    from benchmarks.seed import ACCOUNT_ID, seed_databases
+
+    seed_databases(workdir)
+
+    from agentic import db, kb_ingest
+    from agentic.tools import rag_tools
+    from data.models.udahub import Knowledge
+
+    session = rag_tools._session()
+    try:
+        articles = [
+            {"article_id": r.article_id, "title": r.title, "content": r.content, "tags": r.tags}
+            for r in session.query(Knowledge).order_by(Knowledge.article_id)
+        ]
+        kb_ingest.ingest(
+            [long_feed(os.path.join(workdir, "long.jsonl"), articles, args.sections)],
+            account=LONG_ACCOUNT,
+            vector_index_dir=rag_tools.VECTOR_INDEX_DIR,
+        )
+        searches = [
+            (call_args["query"], None)
+            for scenario in SCENARIOS
+            for name, call_args in scenario.tool_calls
+            if name == "search_knowledge_base"
+        ]
+        report = {
+            "seed": measure(
+                session,
+                searches + [(a["title"], a["article_id"]) for a in articles],
+                ACCOUNT_ID,
+            ),
+            "long": measure(
+                session,
+                searches
+                + [(a["title"], f"{LONG_ACCOUNT}-{a['article_id']}") for a in articles],
+                LONG_ACCOUNT,
+            ),
+        }
+    finally:
+        session.close()
+        db.dispose_all()
+
+    for name, corpus in report.items():
+        print_report(name, corpus)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.keep:
+        print(f"Databases kept in {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,461 @@
+"""
+Offline benchmark of `workflow.orchestrator`.
+
+Runs `--per-route` tickets for each route through the compiled graph with
+the shared chat model replaced by a scripted fake (see benchmarks.fake_models),
+against freshly seeded databases in a temporary directory, and reports:
+- latency per graph node and per tool call
+- checkpoint read/write cost (get_tuple / put / put_writes)
+- SQL statements per database, in total and per ticket
+- end-to-end ticket latency and throughput
+- triage decisions: local, sticky follow-ups (`--follow-ups`) and LLM calls
+
+Results are written as JSON keyed by the git commit, so two runs can be
+compared:
+
+    cd starter
+    python -m benchmarks.run --per-route 25 --latency-ms 50 --concurrency 8
+    python -m benchmarks.run --compare benchmarks/results/<baseline>.json
+"""
+import argparse
+import contextvars
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+# -- measurements --------------------------------------------------------
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class Timings:
+    """Thread-safe lists of durations (seconds) by name."""
+
+    def __init__(self):
+        self._values = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self._values[name].append(seconds)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {name: summarize(values) for name, values in sorted(self._values.items())}
+
+
+def summarize(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(1000 * sum(values) / len(values), 3),
+        "p50_ms": round(1000 * percentile(values, 0.50), 3),
+        "p95_ms": round(1000 * percentile(values, 0.95), 3),
+        "max_ms": round(1000 * max(values), 3),
+        "total_ms": round(1000 * sum(values), 3),
+    }
+
+
+class GraphTimer(BaseCallbackHandler):
+    """Times top-level graph nodes and every tool call via callbacks."""
+
+    def __init__(self):
+        self.nodes = Timings()
+        self.tools = Timings()
+        self.errors = Counter()
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, kind: str, name: str):
+        with self._lock:
+            self._started[run_id] = (kind, name, time.perf_counter())
+
+    def _end(self, run_id, error: bool = False):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        kind, name, start = started
+        (self.nodes if kind == "node" else self.tools).add(name, time.perf_counter() - start)
+        if error:
+            self.errors[f"{kind}:{name}"] += 1
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        metadata = metadata or {}
+        name = kwargs.get("name")
+        # Outer-graph nodes only; nested react-agent nodes have "|" in their namespace
+        if name and name == metadata.get("langgraph_node") and "|" not in metadata.get(
+            "langgraph_checkpoint_ns", "|"
+        ):
+            self._start(run_id, "node", name)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=True)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        self._start(run_id, "tool", name)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=True)
+
+
+# SQL statements of the ticket currently running in this context. LangGraph
+# copies the context into its tool threads, so tool queries are attributed
+# to the right ticket.
+_ticket_queries = contextvars.ContextVar("ticket_queries", default=None)
+
+
+class QueryCounter:
+    """Counts SQL statements per database file through SQLAlchemy events."""
+
+    def __init__(self):
+        self.totals = Counter()
+        self._lock = threading.Lock()
+
+    def install(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        event.listen(Engine, "before_cursor_execute", self._count)
+
+    def uninstall(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        event.remove(Engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        database = os.path.basename(conn.engine.url.database or "memory")
+        with self._lock:
+            self.totals[database] += 1
+            ticket = _ticket_queries.get()
+            if ticket is not None:
+                ticket[database] += 1
+
+
+def timing_saver(path: str, timings: Timings):
+    """PooledSqliteSaver that records how long each checkpoint call takes."""
+    from agentic.checkpoints import PooledSqliteSaver
+
+    class TimingSaver(PooledSqliteSaver):
+        def _timed(self, name, method, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                timings.add(name, time.perf_counter() - start)
+
+        def get_tuple(self, config):
+            return self._timed("get_tuple", super().get_tuple, config)
+
+        def put(self, config, checkpoint, metadata, new_versions):
+            return self._timed(
+                "put", super().put, config, checkpoint, metadata, new_versions
+            )
+
+        def put_writes(self, config, writes, task_id, task_path=""):
+            return self._timed(
+                "put_writes", super().put_writes, config, writes, task_id, task_path
+            )
+
+    return TimingSaver(path)
+
+
+# -- run -----------------------------------------------------------------
+
+
+def git_commit() -> tuple[str, bool]:
+    """(HEAD commit, whether the working tree has uncommitted changes)."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+        )
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def configure_environment(workdir: str, args):
+    """Point every database and cache at `workdir`; must precede agentic imports."""
+    os.environ["CULTPASS_DB_PATH"] = os.path.join(workdir, "cultpass.db")
+    os.environ["UDAHUB_DB_PATH"] = os.path.join(workdir, "udahub.db")
+    os.environ["CHECKPOINT_DB_PATH"] = os.path.join(workdir, "default_checkpoints.db")
+    os.environ["TRIAGE_CACHE_PATH"] = os.path.join(workdir, "triage_cache.db")
+    os.environ["KB_VECTOR_INDEX_DIR"] = os.path.join(workdir, "kb_index")
+    os.environ["TRIAGE_FAST_PATH"] = "1" if args.triage == "fast" else "0"
+    os.environ["TRIAGE_STICKY"] = "1" if args.sticky else "0"
+    # The fakes never call OpenAI, but the client refuses to build without a key
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+
+def run_ticket(
+    graph, scenario, thread_id: str, callbacks: list, follow_ups: list[str] = ()
+) -> dict:
+    """Run the scenario's message, then each follow-up as a turn of the same ticket."""
+    queries = Counter()
+    token = _ticket_queries.set(queries)
+    start = time.perf_counter()
+    try:
+        for text in [scenario.text, *follow_ups]:
+            result = graph.invoke(
+                {"messages": [HumanMessage(content=text)]},
+                {"configurable": {"thread_id": thread_id}, "callbacks": callbacks},
+            )
+        error = None
+    except Exception as e:
+        result, error = {}, repr(e)
+    finally:
+        _ticket_queries.reset(token)
+    return {
+        "route": scenario.route,
+        "destination": result.get("destination"),
+        "seconds": time.perf_counter() - start,
+        "queries": queries,
+        "error": error,
+    }
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="orchestrator-bench-")
+    configure_environment(workdir, args)
+
+    from benchmarks.fake_models import install, repeat
+    from benchmarks.scenarios import FOLLOW_UPS, SCENARIOS
+    from benchmarks.seed import seed_databases
+
+    install(
+        SCENARIOS,
+        latency=args.latency_ms / 1000,
+        token_latency=args.token_latency_ms / 1000,
+    )
+    seed_databases(workdir)
+
+    from agentic import instrumentation, workflow
+    from agentic.agents import fast_triage
+    from agentic.agents.triage_cache import cache as triage_cache
+    from agentic.tools import tool_cache
+
+    checkpoint_timings = Timings()
+    checkpointer = timing_saver(os.path.join(workdir, "checkpoints.db"), checkpoint_timings)
+    graph = workflow.build_orchestrator(workflow.OrchestratorConfig(checkpointer=checkpointer))
+
+    # Warm-up: import-time work, first connections, index builds
+    for i, scenario in enumerate(SCENARIOS):
+        run_ticket(graph, scenario, f"warmup-{i}", [])
+    checkpoint_timings.clear()
+    instrumentation.metrics.reset()
+    fast_triage.stats.reset()
+
+    timer = GraphTimer()
+    queries = QueryCounter()
+    queries.install()
+    tickets = repeat(SCENARIOS, args.per_route)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(
+            pool.map(
+                lambda item: run_ticket(
+                    graph, item[1], f"bench-{item[0]}", [timer], FOLLOW_UPS[: args.follow_ups]
+                ),
+                enumerate(tickets),
+            )
+        )
+    wall = time.perf_counter() - start
+    queries.uninstall()
+
+    per_route = defaultdict(list)
+    for result in results:
+        per_route[result["route"]].append(result)
+    per_ticket_queries = Counter()
+    for result in results:
+        per_ticket_queries.update(result["queries"])
+    checkpoint_bytes = sum(
+        os.path.getsize(os.path.join(workdir, name))
+        for name in os.listdir(workdir)
+        if name.startswith("checkpoints.db")
+    )
+    commit, dirty = git_commit()
+
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "per_route": args.per_route,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "token_latency_ms": args.token_latency_ms,
+            "triage": args.triage,
+            "sticky": args.sticky,
+            "follow_ups": args.follow_ups,
+        },
+        "throughput": {
+            "tickets": len(results),
+            "seconds": round(wall, 3),
+            "tickets_per_second": round(len(results) / wall, 2),
+            "errors": sum(1 for r in results if r["error"]),
+        },
+        "tickets": summarize([r["seconds"] for r in results]),
+        "routes": {
+            route: {
+                **summarize([r["seconds"] for r in items]),
+                "misrouted": sum(1 for r in items if r["destination"] != route),
+            }
+            for route, items in sorted(per_route.items())
+        },
+        "nodes": timer.nodes.summary(),
+        "tools": timer.tools.summary(),
+        "callback_errors": dict(timer.errors),
+        "checkpoint": {**checkpoint_timings.summary(), "db_bytes": checkpoint_bytes},
+        "db_queries": {
+            "total": dict(queries.totals),
+            "per_ticket": {
+                database: round(count / len(results), 2)
+                for database, count in sorted(per_ticket_queries.items())
+            },
+        },
+        "instrumentation": instrumentation.snapshot(),
+        "triage": {
+            "fast_path": fast_triage.stats.as_dict(),
+            "cache": triage_cache.stats(),
+        },
+        "tool_cache": tool_cache.cache.stats(),
+    }
+    errors = [r["error"] for r in results if r["error"]]
+    if errors:
+        report["first_error"] = errors[0]
+
+    checkpointer.close()
+    if args.keep:
+        report["workdir"] = workdir
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+# -- comparison ----------------------------------------------------------
+
+
+def _metrics(report: dict) -> dict:
+    """Flat {metric: value} view of a report, for comparisons."""
+    flat = {"throughput.tickets_per_second": report["throughput"]["tickets_per_second"]}
+    for stat in ("p50_ms", "p95_ms"):
+        flat[f"tickets.{stat}"] = report["tickets"].get(stat)
+    for section in ("nodes", "tools", "checkpoint"):
+        for name, summary in report[section].items():
+            if isinstance(summary, dict):
+                for stat in ("p50_ms", "p95_ms"):
+                    flat[f"{section}.{name}.{stat}"] = summary.get(stat)
+    for database, count in report["db_queries"]["per_ticket"].items():
+        flat[f"db_queries.{database}.per_ticket"] = count
+    return flat
+
+
+def compare(baseline: dict, current: dict) -> list[tuple]:
+    """(metric, baseline, current, change %) for metrics present in both."""
+    old, new = _metrics(baseline), _metrics(current)
+    rows = []
+    for metric in sorted(old.keys() & new.keys()):
+        before, after = old[metric], new[metric]
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        rows.append((metric, before, after, change))
+    return rows
+
+
+def print_report(report: dict):
+    throughput = report["throughput"]
+    print(
+        f"{throughput['tickets']} tickets in {throughput['seconds']}s "
+        f"({throughput['tickets_per_second']} tickets/s, {throughput['errors']} errors)"
+    )
+    print(f"ticket p50 {report['tickets']['p50_ms']} ms, p95 {report['tickets']['p95_ms']} ms")
+    for section in ("nodes", "tools", "checkpoint"):
+        print(f"\n{section}:")
+        for name, summary in report[section].items():
+            if isinstance(summary, dict):
+                print(
+                    f"  {name:<28} n={summary['count']:<6} "
+                    f"p50={summary.get('p50_ms', 0):>9.3f} ms  p95={summary.get('p95_ms', 0):>9.3f} ms"
+                )
+    print(f"\ndb queries per ticket: {report['db_queries']['per_ticket']}")
+    print(f"triage: {report['triage']['fast_path']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--per-route", type=int, default=20, help="tickets per route")
+    parser.add_argument("--concurrency", type=int, default=4, help="tickets in flight")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fake model latency per call")
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="fake latency per streamed token")
+    parser.add_argument("--triage", choices=["fast", "llm"], default="fast", help="triage fast path on/off")
+    parser.add_argument(
+        "--sticky",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="keep follow-up turns on their specialist instead of re-triaging",
+    )
+    parser.add_argument(
+        "--follow-ups", type=int, default=0, help="follow-up turns per ticket (at most 3)"
+    )
+    parser.add_argument("--out", help="result file (default: results/<commit>.json)")
+    parser.add_argument("--compare", help="baseline result file to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary databases")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+
+    out = args.out or os.path.join(
+        RESULTS_DIR, f"{report['commit'][:12]}{'-dirty' if report['dirty'] else ''}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {baseline['commit'][:12]}:")
+        for metric, before, after, change in compare(baseline, report):
+            print(f"  {metric:<48} {before:>10} -> {after:>10}  ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Representative tickets per route, written against the benchmark seed data
+(`benchmarks.seed`): users from cultpass_users.jsonl, experiences exp-000..,
+one reservation res-NNN per user. FOLLOW_UPS are the replies that continue a
+ticket on the same topic (`benchmarks.run --follow-ups`).
+"""
+from benchmarks.fake_models import Scenario
+
+SCENARIOS = [
+    # billing_agent
+    Scenario(
+        "billing_agent",
+        "What is my current subscription plan? My email is bob.stone@granite.com",
+        [
+            ("lookup_user", {"email": "bob.stone@granite.com"}),
+            ("get_subscription_status", {"user_id": "f556c0"}),
+        ],
+        "You are on the basic plan with 5 experiences per month, renewing automatically.",
+    ),
+    Scenario(
+        "billing_agent",
+        "I want to upgrade my plan to elite, account cathy.bloom@florals.org",
+        [
+            ("lookup_user", {"email": "cathy.bloom@florals.org"}),
+            ("update_subscription", {"user_id": "88382b", "new_tier": "elite"}),
+        ],
+        "Done! Your plan is now elite and your monthly quota is 20.",
+        sentiment="Positive",
+    ),
+    Scenario(
+        "billing_agent",
+        "Why was I charged twice this month? eva.green@ecosoul.net",
+        [
+            ("lookup_user", {"email": "eva.green@ecosoul.net"}),
+            ("get_subscription_status", {"user_id": "f1f10d"}),
+            ("get_user_reservations", {"user_id": "f1f10d"}),
+        ],
+        "I see a single active subscription; the second charge should be refunded by your bank within 5 days.",
+        sentiment="Frustrated",
+        urgency="High",
+    ),
+    # booking_agent
+    Scenario(
+        "booking_agent",
+        "Please book the sunset paddleboarding class for me, frank.ocean@seawaves.io",
+        [
+            ("lookup_user", {"email": "frank.ocean@seawaves.io"}),
+            ("book_reservation", {"user_id": "e6376d", "experience_id": "exp-001"}),
+        ],
+        "You are booked for Sunset Paddleboarding. See you there!",
+    ),
+    Scenario(
+        "booking_agent",
+        "Show me my upcoming reservations, bob.stone@granite.com",
+        [
+            ("lookup_user", {"email": "bob.stone@granite.com"}),
+            ("get_user_reservations", {"user_id": "f556c0"}),
+        ],
+        "You have one upcoming reservation for Sunset Paddleboarding.",
+    ),
+    Scenario(
+        "booking_agent",
+        "Cancel my reservation res-002 please",
+        [("cancel_reservation", {"reservation_id": "res-002"})],
+        "Reservation res-002 has been cancelled.",
+    ),
+    # tech_agent
+    Scenario(
+        "tech_agent",
+        "The app crashes when I open my QR code, what should I do?",
+        [("search_knowledge_base", {"query": "app crashes QR code"})],
+        "Please update the app and restart your phone; if it still crashes, reinstall it.",
+        sentiment="Frustrated",
+    ),
+    Scenario(
+        "tech_agent",
+        "How do I reserve a spot for an event?",
+        [("search_knowledge_base", {"query": "reserve a spot for an event"})],
+        "Open the CultPass app, pick the experience and tap 'Reserve'.",
+    ),
+    Scenario(
+        "tech_agent",
+        "I cannot log in to my account since yesterday",
+        [("search_knowledge_base", {"query": "cannot log in"})],
+        "Try resetting your password from the login screen.",
+        urgency="Medium",
+    ),
+    # retention_agent
+    Scenario(
+        "retention_agent",
+        "I want to cancel my subscription, it is too expensive. eva.green@ecosoul.net",
+        [
+            ("lookup_user", {"email": "eva.green@ecosoul.net"}),
+            ("get_retention_policy", {}),
+        ],
+        "Before you go: we can give you 10% off for the next 3 months, or pause your plan.",
+        sentiment="Negative",
+    ),
+    Scenario(
+        "retention_agent",
+        "Can I pause my membership for two months while I travel?",
+        [("get_retention_policy", {})],
+        "Yes, you can pause for up to 3 months and your data is preserved.",
+    ),
+]
+
+# Follow-up turns, sent in this order after a ticket's first message
+FOLLOW_UPS = [
+    "yes, please",
+    "ok, the second one",
+    "thanks, that's all",
+]
@@ -0,0 +1,103 @@
+"""
+Throwaway cultpass.db / udahub.db for benchmark runs, built from the seed
+files in data/external so results do not depend on a developer's local data.
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from data.models import cultpass, udahub
+
+EXTERNAL_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "external")
+ACCOUNT_ID = "cultpass"
+# Generous so repeated booking scenarios do not run out of slots
+SLOTS_PER_EXPERIENCE = 100_000
+
+
+def _jsonl(name: str) -> list[dict]:
+    with open(os.path.join(EXTERNAL_DIR, name)) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def seed_cultpass(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    cultpass.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    first_class = datetime(2025, 1, 1, 18, 0)
+    for i, exp in enumerate(_jsonl("cultpass_experiences.jsonl")):
+        session.add(
+            cultpass.Experience(
+                experience_id=f"exp-{i:03d}",
+                title=exp["title"],
+                description=exp["description"],
+                location=exp["location"],
+                when=first_class + timedelta(days=i + 1),
+                slots_available=SLOTS_PER_EXPERIENCE,
+                is_premium=i % 2 == 0,
+            )
+        )
+    for i, user in enumerate(_jsonl("cultpass_users.jsonl")):
+        session.add(
+            cultpass.User(
+                user_id=user["id"],
+                full_name=user["name"],
+                email=user["email"],
+                is_blocked=user["is_blocked"],
+            )
+        )
+        session.add(
+            cultpass.Subscription(
+                subscription_id=f"sub-{i:03d}",
+                user_id=user["id"],
+                status="active",
+                tier="basic",
+                monthly_quota=5,
+            )
+        )
+        session.add(
+            cultpass.Reservation(
+                reservation_id=f"res-{i:03d}",
+                user_id=user["id"],
+                experience_id=f"exp-{i % 7:03d}",
+                status="reserved",
+            )
+        )
+    session.commit()
+    session.close()
+    engine.dispose()
+
+
+def seed_udahub(path: str):
+    engine = create_engine(f"sqlite:///{path}")
+    udahub.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(udahub.Account(account_id=ACCOUNT_ID, account_name="CultPass"))
+    for i, article in enumerate(_jsonl("cultpass_articles.jsonl")):
+        session.add(
+            udahub.Knowledge(
+                article_id=f"kb-{i:03d}",
+                account_id=ACCOUNT_ID,
+                title=article["title"],
+                content=article["content"],
+                tags=article["tags"],
+            )
+        )
+    session.commit()
+    session.close()
+    # Migrations, passages, FTS and vector indexes, as a deploy would set
+    # them up (the benchmarks point KB_VECTOR_INDEX_DIR next to the databases)
+    from agentic.tools import rag_tools
+
+    rag_tools.prepare(engine, index_dir=os.path.join(os.path.dirname(path), "kb_index"))
+    engine.dispose()
+
+
+def seed_databases(directory: str) -> tuple[str, str]:
+    """Create both databases in `directory`; returns (cultpass, udahub) paths."""
+    cultpass_path = os.path.join(directory, "cultpass.db")
+    udahub_path = os.path.join(directory, "udahub.db")
+    seed_cultpass(cultpass_path)
+    seed_udahub(udahub_path)
+    return cultpass_path, udahub_path
+
@@ -0,0 +1,574 @@
+"""
+Synthetic, production-sized data for cultpass.db and udahub.db.
+
+Rows follow the schemas in data/models and borrow names, experiences and
+articles from the seed files in data/external, at any volume:
+
+    cd starter
+    python -m data.generate --users 1000000 --reservations 10000000 \\
+        --articles 100000 --ticket-messages 50000000
+
+Data is written in stages (experiences, users, reservations, articles,
+tickets). Each stage streams fixed-size chunks, and every chunk is inserted in
+one transaction together with the stage's progress row in
+`generator_progress`, so memory stays bounded and an interrupted run resumes
+from the last committed chunk when started again with the same arguments.
+Chunks are generated from their own seed, so a resumed run produces the same
+rows as an uninterrupted one.
+
+Skew: user activity (reservations, tickets) follows a mean-one lognormal
+distribution, so a few users are far busier than the median; experience
+popularity and ticket issue types follow Zipf-like weights. Row counts for
+per-user stages are therefore approximate targets; the totals are printed at
+the end.
+"""
+import argparse
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Callable, NamedTuple
+import numpy as np
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    event,
+    func,
+    insert,
+    select,
+)
+from data.models import cultpass, udahub
+
+EXTERNAL_DIR = os.path.join(os.path.dirname(__file__), "external")
+ACCOUNT_ID = "cultpass"
+
+CHUNK_SIZE = 50_000  # rows per transaction (approximately, for per-user stages)
+SEED = 42
+ACTIVITY_SIGMA = 1.0  # lognormal sigma of per-user activity
+POPULARITY_EXPONENT = 1.0  # Zipf exponent of experience popularity
+# Data covers the year before this date
+END_DATE = datetime(2025, 1, 1)
+
+RESERVATION_STATUSES = (["reserved", "confirmed", "cancelled"], [0.6, 0.25, 0.15])
+SUBSCRIPTION_STATUSES = (["active", "paused", "cancelled"], [0.8, 0.05, 0.15])
+SUBSCRIPTION_TIERS = (["basic", "premium", "elite"], [0.6, 0.3, 0.1])
+TICKET_CHANNELS = (["chat", "email", "phone"], [0.6, 0.3, 0.1])
+TICKET_STATUSES = (["closed", "open", "escalated"], [0.75, 0.2, 0.05])
+
+# Issue type -> (user messages, agent replies); types are Zipf-weighted in order
+ISSUE_TEMPLATES = {
+    "booking": (
+        ["I want to book {experience}", "Can you cancel my reservation for {experience}?",
+         "Is there still a slot for {experience}?"],
+        ["You are booked for {experience}.", "Your reservation for {experience} was cancelled."],
+    ),
+    "login": (
+        ["I can't log in to the app", "The app keeps logging me out",
+         "I never received the password reset email"],
+        ["Please reset your password from the login screen.",
+         "Try reinstalling the app and logging in again."],
+    ),
+    "subscription": (
+        ["What plan am I on?", "I want to upgrade to premium",
+         "How many experiences are left this month?"],
+        ["You are on the {tier} plan.", "Your plan was updated."],
+    ),
+    "billing": (
+        ["I was charged twice this month", "Why did my payment fail?"],
+        ["I see a single charge; the duplicate will be refunded.",
+         "Please update your card in the app."],
+    ),
+    "cancellation": (
+        ["I want to cancel my subscription", "Can I pause my membership while I travel?"],
+        ["You can pause for up to 3 months instead of cancelling.",
+         "We can offer 10% off for the next 3 months."],
+    ),
+    "how-to": (
+        ["How do I reserve a spot for an event?", "Where is my QR code?"],
+        ["Open the experience in the app and tap 'Reserve'.",
+         "Your QR code is under My Reservations."],
+    ),
+}
+
+
+def _jsonl(name: str) -> list[dict]:
+    with open(os.path.join(EXTERNAL_DIR, name)) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def zipf_weights(n: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+class Templates:
+    """Seed rows from data/external, split into reusable parts."""
+
+    def __init__(self):
+        users = _jsonl("cultpass_users.jsonl")
+        self.first_names = [u["name"].split()[0] for u in users]
+        self.last_names = [u["name"].split()[-1] for u in users]
+        self.domains = [u["email"].split("@")[1] for u in users]
+        self.experiences = _jsonl("cultpass_experiences.jsonl")
+        self.articles = _jsonl("cultpass_articles.jsonl")
+
+
+class Stage(NamedTuple):
+    name: str
+    engine_name: str  # "cultpass" or "udahub"
+    units: int  # items the stage iterates over (e.g. users)
+    unit_rows: float  # expected rows written per unit, sizes the chunks
+    build: Callable  # (rng, start, stop) -> {table: [row dicts]}
+
+
+progress_metadata = MetaData()
+progress_table = Table(
+    "generator_progress",
+    progress_metadata,
+    Column("stage", String, primary_key=True),
+    Column("done", Integer, nullable=False),
+    Column("units", Integer, nullable=False),
+    Column("params", String, nullable=False),
+)
+
+
+class Generator:
+    """Builds the stages for the requested volumes; see module docstring."""
+
+    def __init__(
+        self,
+        users: int,
+        experiences: int,
+        reservations: int,
+        articles: int,
+        tickets: int,
+        ticket_messages: int,
+        seed: int = SEED,
+        activity_sigma: float = ACTIVITY_SIGMA,
+    ):
+        self.users = users
+        self.experiences = max(experiences, 1)
+        self.reservations = reservations
+        self.articles = articles
+        self.tickets = tickets
+        self.ticket_messages = max(ticket_messages, tickets)
+        self.seed = seed
+        self.activity_sigma = activity_sigma
+        self.templates = Templates()
+        self.experience_cdf = np.cumsum(zipf_weights(self.experiences, POPULARITY_EXPONENT))
+        issue_weights = zipf_weights(len(ISSUE_TEMPLATES), 1.0)
+        self.issue_types = list(ISSUE_TEMPLATES)
+        self.issue_cdf = np.cumsum(issue_weights)
+
+    # -- ids and shared helpers --------------------------------------------
+
+    @staticmethod
+    def user_id(index: int) -> str:
+        return f"u{index:08d}"
+
+    @staticmethod
+    def experience_id(index: int) -> str:
+        return f"e{index:07d}"
+
+    def _activity(self, rng, size: int) -> np.ndarray:
+        """Mean-one lognormal activity multipliers."""
+        sigma = self.activity_sigma
+        return rng.lognormal(-(sigma**2) / 2, sigma, size)
+
+    @staticmethod
+    def _choice(rng, options, size: int) -> list:
+        values, weights = options
+        return [values[i] for i in rng.choice(len(values), size=size, p=weights)]
+
+    @staticmethod
+    def _dates(rng, size: int, days: int = 365) -> list[datetime]:
+        offsets = rng.integers(0, days * 86400, size)
+        return [END_DATE - timedelta(seconds=int(s)) for s in offsets]
+
+    def _experience_title(self, index: int) -> str:
+        template = self.templates.experiences[index % len(self.templates.experiences)]
+        return f"{template['title']} #{index // len(self.templates.experiences) + 1}"
+
+    # -- cultpass ----------------------------------------------------------
+
+    def build_experiences(self, rng, start: int, stop: int) -> dict:
+        templates = self.templates.experiences
+        size = stop - start
+        whens = self._dates(rng, size, days=730)
+        slots = rng.integers(0, 31, size).tolist()
+        premium = (rng.random(size) < 0.3).tolist()
+        rows = []
+        for i, index in enumerate(range(start, stop)):
+            template = templates[index % len(templates)]
+            rows.append(
+                {
+                    "experience_id": self.experience_id(index),
+                    "title": self._experience_title(index),
+                    "description": template["description"],
+                    "location": template["location"],
+                    # Spread over the year before and after END_DATE
+                    "when": whens[i] + timedelta(days=365),
+                    "slots_available": slots[i],
+                    "is_premium": premium[i],
+                    "created_at": END_DATE - timedelta(days=365),
+                }
+            )
+        return {cultpass.Experience.__table__: rows}
+
+    def build_users(self, rng, start: int, stop: int) -> dict:
+        t = self.templates
+        size = stop - start
+        first = rng.integers(0, len(t.first_names), size).tolist()
+        last = rng.integers(0, len(t.last_names), size).tolist()
+        domain = rng.integers(0, len(t.domains), size).tolist()
+        blocked = (rng.random(size) < 0.02).tolist()
+        created = self._dates(rng, size)
+        statuses = self._choice(rng, SUBSCRIPTION_STATUSES, size)
+        tiers = self._choice(rng, SUBSCRIPTION_TIERS, size)
+        users, subscriptions = [], []
+        for i, index in enumerate(range(start, stop)):
+            user_id = self.user_id(index)
+            first_name, last_name = t.first_names[first[i]], t.last_names[last[i]]
+            users.append(
+                {
+                    "user_id": user_id,
+                    "full_name": f"{first_name} {last_name}",
+                    "email": f"{first_name}.{last_name}.{index}@{t.domains[domain[i]]}".lower(),
+                    "is_blocked": blocked[i],
+                    "created_at": created[i],
+                    "updated_at": created[i],
+                }
+            )
+            subscriptions.append(
+                {
+                    "subscription_id": f"s{index:08d}",
+                    "user_id": user_id,
+                    "status": statuses[i],
+                    "tier": tiers[i],
+                    "monthly_quota": {"basic": 5, "premium": 10, "elite": 20}[tiers[i]],
+                    "started_at": created[i],
+                    "ended_at": created[i] + timedelta(days=180)
+                    if statuses[i] == "cancelled"
+                    else None,
+                    "created_at": created[i],
+                    "updated_at": created[i],
+                }
+            )
+        return {cultpass.User.__table__: users, cultpass.Subscription.__table__: subscriptions}
+
+    def build_reservations(self, rng, start: int, stop: int) -> dict:
+        mean = self.reservations / max(self.users, 1)
+        counts = rng.poisson(mean * self._activity(rng, stop - start))
+        rows = []
+        for index, count in zip(range(start, stop), counts.tolist()):
+            if not count:
+                continue
+            # Popular experiences are picked more often; one reservation per
+            # (user, experience), so draw extra and keep the first distinct ones
+            count = min(count, self.experiences)
+            draws = np.searchsorted(
+                self.experience_cdf, rng.random(count * 2 + 4), side="right"
+            )
+            picks = list(dict.fromkeys(np.minimum(draws, self.experiences - 1).tolist()))
+            picks = picks[:count]
+            statuses = self._choice(rng, RESERVATION_STATUSES, len(picks))
+            created = self._dates(rng, len(picks))
+            user_id = self.user_id(index)
+            for j, experience in enumerate(picks):
+                rows.append(
+                    {
+                        "reservation_id": f"r{index:08d}-{j}",
+                        "user_id": user_id,
+                        "experience_id": self.experience_id(experience),
+                        "status": statuses[j],
+                        "created_at": created[j],
+                        "updated_at": created[j],
+                    }
+                )
+        return {cultpass.Reservation.__table__: rows}
+
+    # -- udahub ------------------------------------------------------------
+
+    def build_articles(self, rng, start: int, stop: int) -> dict:
+        templates = self.templates.articles
+        created = self._dates(rng, stop - start)
+        rows = []
+        for i, index in enumerate(range(start, stop)):
+            template = templates[index % len(templates)]
+            variant = index // len(templates)
+            title, content = template["title"], template["content"]
+            if variant:
+                experience = self._experience_title(variant % self.experiences)
+                title = f"{title} ({experience})"
+                content = f"{content}\n\nApplies to: {experience}."
+            rows.append(
+                {
+                    "article_id": f"kb{index:07d}",
+                    "account_id": ACCOUNT_ID,
+                    "title": title,
+                    "content": content,
+                    "tags": template["tags"],
+                    "created_at": created[i],
+                    "updated_at": created[i],
+                }
+            )
+        return {udahub.Knowledge.__table__: rows}
+
+    def build_tickets(self, rng, start: int, stop: int) -> dict:
+        """udahub users plus their tickets, ticket metadata and messages."""
+        tickets_per_user = self.tickets / max(self.users, 1)
+        extra_messages = self.ticket_messages / max(self.tickets, 1) - 1
+        counts = rng.poisson(tickets_per_user * self._activity(rng, stop - start))
+        users, tickets, metadata, messages = [], [], [], []
+        for index, count in zip(range(start, stop), counts.tolist()):
+            user_id = f"uu{index:08d}"
+            users.append(
+                {
+                    "user_id": user_id,
+                    "account_id": ACCOUNT_ID,
+                    "external_user_id": self.user_id(index),
+                    "user_name": f"user-{index}",
+                }
+            )
+            if not count:
+                continue
+            issues = np.searchsorted(self.issue_cdf, rng.random(count), side="right").tolist()
+            lengths = (1 + rng.poisson(max(extra_messages, 0), count)).tolist()
+            channels = self._choice(rng, TICKET_CHANNELS, count)
+            statuses = self._choice(rng, TICKET_STATUSES, count)
+            opened = self._dates(rng, count)
+            for j in range(count):
+                ticket_id = f"t{index:08d}-{j}"
+                issue = self.issue_types[min(issues[j], len(self.issue_types) - 1)]
+                tickets.append(
+                    {
+                        "ticket_id": ticket_id,
+                        "account_id": ACCOUNT_ID,
+                        "user_id": user_id,
+                        "channel": channels[j],
+                        "created_at": opened[j],
+                    }
+                )
+                metadata.append(
+                    {
+                        "ticket_id": ticket_id,
+                        "status": statuses[j],
+                        "main_issue_type": issue,
+                        "tags": issue,
+                        "created_at": opened[j],
+                        "updated_at": opened[j],
+                    }
+                )
+                messages.extend(self._messages(rng, ticket_id, issue, lengths[j], opened[j]))
+        return {
+            udahub.User.__table__: users,
+            udahub.Ticket.__table__: tickets,
+            udahub.TicketMetadata.__table__: metadata,
+            udahub.TicketMessage.__table__: messages,
+        }
+
+    def _messages(self, rng, ticket_id: str, issue: str, length: int, opened: datetime):
+        questions, replies = ISSUE_TEMPLATES[issue]
+        picks = rng.integers(0, 1 << 30, length).tolist()
+        values = {
+            "experience": self._experience_title(picks[0] % self.experiences),
+            "tier": SUBSCRIPTION_TIERS[0][picks[0] % len(SUBSCRIPTION_TIERS[0])],
+        }
+        rows = []
+        for k in range(length):
+            is_user = k % 2 == 0
+            templates = questions if is_user else replies
+            rows.append(
+                {
+                    "message_id": f"m{ticket_id[1:]}-{k}",
+                    "ticket_id": ticket_id,
+                    "role": udahub.RoleEnum.user if is_user else udahub.RoleEnum.ai,
+                    "content": templates[picks[k] % len(templates)].format(**values),
+                    "created_at": opened + timedelta(minutes=2 * k),
+                }
+            )
+        return rows
+
+    # -- stages ------------------------------------------------------------
+
+    def stages(self) -> list[Stage]:
+        users = max(self.users, 1)
+        return [
+            Stage("experiences", "cultpass", self.experiences, 1, self.build_experiences),
+            Stage("users", "cultpass", self.users, 2, self.build_users),
+            Stage(
+                "reservations", "cultpass", self.users,
+                self.reservations / users, self.build_reservations,
+            ),
+            Stage("articles", "udahub", self.articles, 1, self.build_articles),
+            Stage(
+                "tickets", "udahub", self.users,
+                1 + (self.tickets * 2 + self.ticket_messages) / users, self.build_tickets,
+            ),
+        ]
+
+    def params(self, stage: Stage, chunk_units: int) -> str:
+        """Arguments a stage's rows depend on; a resume must match them."""
+        return json.dumps(
+            {
+                "seed": self.seed,
+                "chunk_units": chunk_units,
+                "users": self.users,
+                "experiences": self.experiences,
+                "reservations": self.reservations,
+                "articles": self.articles,
+                "tickets": self.tickets,
+                "ticket_messages": self.ticket_messages,
+                "activity_sigma": self.activity_sigma,
+            },
+            sort_keys=True,
+        )
+
+
+def bulk_engine(path: str):
+    """Engine tuned for loading: WAL, no fsync per commit, big page cache."""
+    engine = create_engine(f"sqlite:///{path}")
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.execute("PRAGMA cache_size=-262144")  # 256 MB
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    return engine
+
+
+def prepare(engines: dict):
+    """Create the schemas, the progress table and the single account row."""
+    if "cultpass" in engines:
+        cultpass.Base.metadata.create_all(engines["cultpass"])
+        progress_metadata.create_all(engines["cultpass"])
+    if "udahub" in engines:
+        udahub.Base.metadata.create_all(engines["udahub"])
+        progress_metadata.create_all(engines["udahub"])
+        with engines["udahub"].begin() as conn:
+            conn.execute(
+                insert(udahub.Account.__table__).prefix_with("OR IGNORE"),
+                {"account_id": ACCOUNT_ID, "account_name": "CultPass"},
+            )
+
+
+def run_stage(engine, generator: Generator, stage: Stage, chunk_size: int = CHUNK_SIZE):
+    chunk_units = max(1, int(chunk_size / max(stage.unit_rows, 1e-9)))
+    params = generator.params(stage, chunk_units)
+    with engine.begin() as conn:
+        row = conn.execute(
+            select(progress_table.c.done, progress_table.c.params).where(
+                progress_table.c.stage == stage.name
+            )
+        ).first()
+        if row is None:
+            conn.execute(
+                insert(progress_table),
+                {"stage": stage.name, "done": 0, "units": stage.units, "params": params},
+            )
+            done = 0
+        elif row.params != params:
+            raise ValueError(
+                f"Stage '{stage.name}' was started with different arguments "
+                f"({row.params}); rerun with those or start over with --fresh"
+            )
+        else:
+            done = row.done
+
+    if done >= stage.units:
+        print(f"{stage.name}: already complete")
+        return
+    started = time.perf_counter()
+    stage_key = zlib.crc32(stage.name.encode())
+    for start in range(done, stage.units, chunk_units):
+        stop = min(start + chunk_units, stage.units)
+        # Seeded per chunk, so a resumed run regenerates identical rows
+        rng = np.random.default_rng([generator.seed, stage_key, start])
+        tables = stage.build(rng, start, stop)
+        with engine.begin() as conn:
+            for table, rows in tables.items():
+                if rows:
+                    conn.execute(insert(table), rows)
+            conn.execute(
+                progress_table.update()
+                .where(progress_table.c.stage == stage.name)
+                .values(done=stop)
+            )
+        elapsed = time.perf_counter() - started
+        print(
+            f"{stage.name}: {stop:,}/{stage.units:,} "
+            f"({(stop - done) / elapsed:,.0f} units/s)",
+            flush=True,
+        )
+
+
+def row_counts(engine, tables) -> dict:
+    with engine.connect() as conn:
+        return {
+            table.name: conn.execute(select(func.count()).select_from(table)).scalar()
+            for table in tables
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cultpass", default=os.getenv("CULTPASS_DB_PATH", "cultpass.db"))
+    parser.add_argument("--udahub", default=os.getenv("UDAHUB_DB_PATH", "udahub.db"))
+    parser.add_argument("--only", choices=["cultpass", "udahub"], help="generate one database")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--experiences", type=int, help="default: users / 100")
+    parser.add_argument("--reservations", type=int, default=100_000, help="approximate")
+    parser.add_argument("--articles", type=int, default=1_000)
+    parser.add_argument("--tickets", type=int, help="approximate; default: ticket messages / 5")
+    parser.add_argument("--ticket-messages", type=int, default=200_000, help="approximate")
+    parser.add_argument("--activity-sigma", type=float, default=ACTIVITY_SIGMA)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--fresh", action="store_true", help="delete the databases first")
+    args = parser.parse_args(argv)
+
+    generator = Generator(
+        users=args.users,
+        experiences=args.experiences or max(args.users // 100, 10),
+        reservations=args.reservations,
+        articles=args.articles,
+        tickets=args.tickets or max(args.ticket_messages // 5, 1),
+        ticket_messages=args.ticket_messages,
+        seed=args.seed,
+        activity_sigma=args.activity_sigma,
+    )
+    paths = {"cultpass": args.cultpass, "udahub": args.udahub}
+    if args.only:
+        paths = {args.only: paths[args.only]}
+    if args.fresh:
+        for path in paths.values():
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+    engines = {name: bulk_engine(path) for name, path in paths.items()}
+    prepare(engines)
+
+    for stage in generator.stages():
+        if stage.engine_name in engines:
+            try:
+                run_stage(engines[stage.engine_name], generator, stage, args.chunk_size)
+            except ValueError as e:
+                parser.error(str(e))
+
+    for name, engine in engines.items():
+        models = cultpass if name == "cultpass" else udahub
+        print(f"{paths[name]}: {row_counts(engine, models.Base.metadata.sorted_tables)}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+"""
+Versioned schema migrations for existing cultpass.db and udahub.db files.
+
+`Base.metadata.create_all` only creates missing tables, so indexes added to
+the models never reach a database that already exists, and `utils.reset_db`
+throws the data away. Migrations bring a live file up to date instead:
+
+    cd starter
+    python -m data.migrations status
+    python -m data.migrations upgrade                # both databases, latest
+    python -m data.migrations downgrade --only udahub --to 0
+    python -m data.migrations check                  # EXPLAIN QUERY PLAN
+
+Each database has its own sequence of numbered migrations and records the
+ones applied in a `schema_version` table. Every migration runs in its own
+`BEGIN IMMEDIATE` transaction together with its `schema_version` row, so a
+failed step leaves the file at the previous version and two processes
+upgrading the same file apply each step once.
+
+Indexes and columns are also declared on the models, so a database built
+with create_all already has them; their migrations check for them first
+(IF NOT EXISTS, or `table_info` for columns) and only stamp the version there.
+"""
+import argparse
+import logging
+import os
+from datetime import datetime, timezone
+from typing import NamedTuple
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+CULTPASS = "cultpass"
+UDAHUB = "udahub"
+
+VERSION_TABLE = "schema_version"
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    # SQL strings, or callables taking the connection for conditional steps
+    up: tuple
+    down: tuple
+
+
+def _index(name: str, table: str, columns: str, where: str = "", unique: bool = False) -> tuple[str, str]:
+    """(up, down) statements for one index."""
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    where = f" WHERE {where}" if where else ""
+    return (
+        f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({columns}){where}",
+        f"DROP INDEX IF EXISTS {name}",
+    )
+
+
+def _table(name: str, columns: str, dependents: tuple[str, ...] = ()) -> tuple:
+    """(up, down) steps creating one table; down also drops `dependents`."""
+
+    def drop(conn):
+        for table in (*dependents, name):
+            conn.exec_driver_sql(f"DROP TABLE IF EXISTS {table}")
+
+    return f"CREATE TABLE IF NOT EXISTS {name} ({columns})", drop
+
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.exec_driver_sql(f"PRAGMA table_info({table})"))
+
+
+def _column(table: str, column: str, type_: str) -> tuple:
+    """(up, down) steps adding one nullable column."""
+
+    def add(conn):
+        if not _has_column(conn, table, column):
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {type_}")
+
+    def drop(conn):
+        # DROP COLUMN needs SQLite 3.35+
+        if _has_column(conn, table, column):
+            conn.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {column}")
+
+    return add, drop
+
+
+def _migrations(*steps: tuple[str, tuple[tuple, ...]]) -> list[Migration]:
+    return [
+        Migration(
+            version=version,
+            description=description,
+            up=tuple(up for up, _ in changes),
+            # Undo in reverse order
+            down=tuple(down for _, down in reversed(changes)),
+        )
+        for version, (description, changes) in enumerate(steps, start=1)
+    ]
+
+
+MIGRATIONS = {
+    CULTPASS: _migrations(
+        (
+            "one active reservation per user and experience",
+            (
+                _index(
+                    "ux_reservations_active_user_experience",
+                    "reservations",
+                    "user_id, experience_id",
+                    where="status != 'cancelled'",
+                    unique=True,
+                ),
+            ),
+        ),
+        (
+            "reservation lookups by user (and status) and by experience",
+            (
+                _index("ix_reservations_user_status", "reservations", "user_id, status"),
+                _index("ix_reservations_experience_id", "reservations", "experience_id"),
+            ),
+        ),
+    ),
+    UDAHUB: _migrations(
+        (
+            "ticket history: messages and agent logs by ticket, in order",
+            (
+                _index("ix_ticket_messages_ticket_created", "ticket_messages", "ticket_id, created_at"),
+                _index("ix_agent_logs_ticket_created", "agent_logs", "ticket_id, created_at"),
+            ),
+        ),
+        (
+            "tickets by user and knowledge articles by account",
+            (
+                _index("ix_tickets_user_created", "tickets", "user_id, created_at"),
+                _index("ix_knowledge_account_id", "knowledge", "account_id"),
+            ),
+        ),
+        (
+            "knowledge content hashes for incremental ingestion",
+            (_column("knowledge", "content_hash", "VARCHAR"),),
+        ),
+        (
+            "knowledge passages, removed with their article",
+            (
+                _table(
+                    "knowledge_passages",
+                    "passage_id VARCHAR NOT NULL PRIMARY KEY, "
+                    "article_id VARCHAR NOT NULL REFERENCES knowledge (article_id), "
+                    "account_id VARCHAR NOT NULL, "
+                    "ordinal INTEGER NOT NULL, "
+                    "start_offset INTEGER NOT NULL, "
+                    "end_offset INTEGER NOT NULL, "
+                    "title VARCHAR NOT NULL, "
+                    "content TEXT NOT NULL",
+                    # Its full-text index (agentic/tools/search_index.py)
+                    dependents=("knowledge_passages_fts",),
+                ),
+                _index("ix_knowledge_passages_article", "knowledge_passages", "article_id, ordinal"),
+                (
+                    "CREATE TRIGGER IF NOT EXISTS knowledge_passages_ad AFTER DELETE ON knowledge "
+                    "BEGIN DELETE FROM knowledge_passages WHERE article_id = old.article_id; END",
+                    "DROP TRIGGER IF EXISTS knowledge_passages_ad",
+                ),
+            ),
+        ),
+        (
+            "drop the passages of edited articles, to be re-chunked",
+            (
+                (
+                    "CREATE TRIGGER IF NOT EXISTS knowledge_passages_au "
+                    "AFTER UPDATE OF account_id, title, content ON knowledge "
+                    "BEGIN DELETE FROM knowledge_passages WHERE article_id = old.article_id; END",
+                    "DROP TRIGGER IF EXISTS knowledge_passages_au",
+                ),
+            ),
+        ),
+        (
+            "replay runs and their per-ticket results (agentic/replay.py)",
+            (
+                _table(
+                    "replay_runs",
+                    "run_id VARCHAR NOT NULL PRIMARY KEY, "
+                    "params VARCHAR NOT NULL, "
+                    "done INTEGER NOT NULL, "
+                    "failed INTEGER NOT NULL, "
+                    "started_at DATETIME NOT NULL, "
+                    "updated_at DATETIME NOT NULL",
+                ),
+                _table(
+                    "replay_results",
+                    "run_id VARCHAR NOT NULL, "
+                    "ticket_id VARCHAR NOT NULL, "
+                    "destinations TEXT, "
+                    "sentiment VARCHAR, "
+                    "urgency VARCHAR, "
+                    "replies TEXT, "
+                    "writes TEXT, "
+                    "turns INTEGER NOT NULL, "
+                    "seconds FLOAT NOT NULL, "
+                    "error TEXT, "
+                    "created_at DATETIME NOT NULL, "
+                    "PRIMARY KEY (run_id, ticket_id)",
+                ),
+                # Results tables created before dry runs recorded their writes
+                _column("replay_results", "writes", "TEXT"),
+            ),
+        ),
+        (
+            "ticket analytics: raw turns, latest classifications and rollups (agentic/analytics.py)",
+            (
+                _table(
+                    "analytics_turns",
+                    "turn_id VARCHAR NOT NULL PRIMARY KEY, "
+                    "ticket_id VARCHAR NOT NULL, "
+                    "account_id VARCHAR NOT NULL, "
+                    "agent VARCHAR NOT NULL, "
+                    "sentiment VARCHAR NOT NULL, "
+                    "urgency VARCHAR NOT NULL, "
+                    "latency_ms FLOAT, "
+                    "created_at DATETIME NOT NULL",
+                ),
+                _index("ix_analytics_turns_created", "analytics_turns", "created_at"),
+                _index("ix_analytics_turns_ticket", "analytics_turns", "ticket_id, created_at"),
+                _table(
+                    "analytics_tickets",
+                    "ticket_id VARCHAR NOT NULL PRIMARY KEY, "
+                    "account_id VARCHAR NOT NULL, "
+                    "agent VARCHAR NOT NULL, "
+                    "sentiment VARCHAR NOT NULL, "
+                    "urgency VARCHAR NOT NULL, "
+                    "turns INTEGER NOT NULL, "
+                    "first_at DATETIME NOT NULL, "
+                    "last_at DATETIME NOT NULL",
+                ),
+                *(
+                    change
+                    for name, bucket in (("analytics_hourly", "hour"), ("analytics_daily", "day"))
+                    for change in (
+                        _table(
+                            name,
+                            f"{bucket} DATETIME NOT NULL, "
+                            "account_id VARCHAR NOT NULL, "
+                            "agent VARCHAR NOT NULL, "
+                            "sentiment VARCHAR NOT NULL, "
+                            "urgency VARCHAR NOT NULL, "
+                            "turns INTEGER NOT NULL, "
+                            "tickets_opened INTEGER NOT NULL, "
+                            "latency_ms_total FLOAT NOT NULL, "
+                            "latency_count INTEGER NOT NULL, "
+                            f"PRIMARY KEY ({bucket}, account_id, agent, sentiment, urgency)",
+                        ),
+                        _index(f"ix_{name}_account_{bucket}", name, f"account_id, {bucket}"),
+                    )
+                ),
+                _table(
+                    "analytics_current",
+                    "account_id VARCHAR NOT NULL, "
+                    "agent VARCHAR NOT NULL, "
+                    "sentiment VARCHAR NOT NULL, "
+                    "urgency VARCHAR NOT NULL, "
+                    "tickets INTEGER NOT NULL, "
+                    "PRIMARY KEY (account_id, agent, sentiment, urgency)",
+                ),
+            ),
+        ),
+    ),
+}
+
+
+class PlanCheck(NamedTuple):
+    description: str
+    sql: str
+    index: str  # the plan must search this index
+    sorted: bool = False  # the plan must not sort in a temp b-tree
+
+
+PLAN_CHECKS = {
+    CULTPASS: [
+        PlanCheck(
+            "reservations of a user",
+            "SELECT * FROM reservations WHERE user_id = ?",
+            "ix_reservations_user_status",
+        ),
+        PlanCheck(
+            "reservations of a user by status",
+            "SELECT * FROM reservations WHERE user_id = ? AND status = ?",
+            "ix_reservations_user_status",
+        ),
+        PlanCheck(
+            "reservations of an experience",
+            "SELECT * FROM reservations WHERE experience_id = ?",
+            "ix_reservations_experience_id",
+        ),
+        PlanCheck(
+            "active reservation of a user for an experience",
+            "SELECT * FROM reservations "
+            "WHERE user_id = ? AND experience_id = ? AND status != 'cancelled'",
+            "ux_reservations_active_user_experience",
+        ),
+    ],
+    UDAHUB: [
+        PlanCheck(
+            "messages of a ticket, oldest first",
+            "SELECT * FROM ticket_messages WHERE ticket_id = ? ORDER BY created_at",
+            "ix_ticket_messages_ticket_created",
+            sorted=True,
+        ),
+        PlanCheck(
+            "agent logs of a ticket, oldest first",
+            "SELECT * FROM agent_logs WHERE ticket_id = ? ORDER BY created_at",
+            "ix_agent_logs_ticket_created",
+            sorted=True,
+        ),
+        PlanCheck(
+            "tickets of a user, newest first",
+            "SELECT * FROM tickets WHERE user_id = ? ORDER BY created_at DESC",
+            "ix_tickets_user_created",
+            sorted=True,
+        ),
+        PlanCheck(
+            "knowledge articles of an account",
+            "SELECT * FROM knowledge WHERE account_id = ?",
+            "ix_knowledge_account_id",
+        ),
+    ],
+}
+
+
+def latest_version(database: str) -> int:
+    return len(MIGRATIONS[database])
+
+
+def _engine(target) -> Engine:
+    return target if isinstance(target, Engine) else create_engine(f"sqlite:///{target}")
+
+
+def _ensure_version_table(conn):
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} "
+        "(version INTEGER PRIMARY KEY, description TEXT NOT NULL, applied_at TEXT NOT NULL)"
+    )
+
+
+def _read_version(conn) -> int:
+    return conn.exec_driver_sql(f"SELECT COALESCE(MAX(version), 0) FROM {VERSION_TABLE}").scalar()
+
+
+def current_version(target) -> int:
+    """Highest applied migration of a database (an Engine or a file path)."""
+    with _engine(target).connect() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (VERSION_TABLE,)
+        ).scalar()
+        return _read_version(conn) if exists else 0
+
+
+def _step(engine: Engine, database: str, migration: Migration, upgrading: bool) -> bool:
+    """Apply or revert one migration; False if another process already did."""
+    with engine.connect() as conn:
+        # Take the write lock before reading the version (see module docstring)
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            _ensure_version_table(conn)
+            version = _read_version(conn)
+            expected = migration.version - 1 if upgrading else migration.version
+            if version != expected:
+                conn.rollback()
+                return False
+            for statement in migration.up if upgrading else migration.down:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.exec_driver_sql(statement)
+            if upgrading:
+                conn.exec_driver_sql(
+                    f"INSERT INTO {VERSION_TABLE} (version, description, applied_at) VALUES (?, ?, ?)",
+                    (
+                        migration.version,
+                        migration.description,
+                        datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    ),
+                )
+            else:
+                conn.exec_driver_sql(
+                    f"DELETE FROM {VERSION_TABLE} WHERE version = ?", (migration.version,)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    logger.info(
+        "%s: %s migration %d (%s)",
+        database,
+        "applied" if upgrading else "reverted",
+        migration.version,
+        migration.description,
+    )
+    return True
+
+
+def upgrade(target, database: str, to: int | None = None) -> int:
+    """Apply pending migrations up to `to` (default: latest); returns the version."""
+    engine = _engine(target)
+    to = latest_version(database) if to is None else to
+    if not 0 <= to <= latest_version(database):
+        raise ValueError(f"{database} has no migration {to}")
+    for migration in MIGRATIONS[database][current_version(engine):to]:
+        _step(engine, database, migration, upgrading=True)
+    return current_version(engine)
+
+
+def downgrade(target, database: str, to: int) -> int:
+    """Revert applied migrations down to version `to`; returns the version."""
+    engine = _engine(target)
+    if not 0 <= to <= latest_version(database):
+        raise ValueError(f"{database} has no migration {to}")
+    for migration in reversed(MIGRATIONS[database][to:current_version(engine)]):
+        _step(engine, database, migration, upgrading=False)
+    return current_version(engine)
+
+
+def explain(conn, sql: str) -> list[str]:
+    """EXPLAIN QUERY PLAN details; parameters are bound to NULL."""
+    params = (None,) * sql.count("?")
+    return [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def verify_query_plans(target, database: str) -> list[str]:
+    """
+    Check that the hot queries of a database use their indexes; returns one
+    message per failing check (empty when all pass).
+    """
+    failures = []
+    with _engine(target).connect() as conn:
+        for check in PLAN_CHECKS[database]:
+            plan = explain(conn, check.sql)
+            if not any(f"INDEX {check.index}" in step for step in plan):
+                failures.append(f"{database}: {check.description} does not use {check.index}: {plan}")
+            elif check.sorted and any("TEMP B-TREE" in step for step in plan):
+                failures.append(f"{database}: {check.description} sorts in a temp b-tree: {plan}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["status", "upgrade", "downgrade", "check"])
+    parser.add_argument("--cultpass", default=os.getenv("CULTPASS_DB_PATH", "cultpass.db"))
+    parser.add_argument("--udahub", default=os.getenv("UDAHUB_DB_PATH", "udahub.db"))
+    parser.add_argument("--only", choices=[CULTPASS, UDAHUB], help="one database only")
+    parser.add_argument("--to", type=int, help="target version (upgrade: latest, downgrade: required)")
+    args = parser.parse_args(argv)
+    if args.command == "downgrade" and args.to is None:
+        parser.error("downgrade needs --to")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    paths = {CULTPASS: args.cultpass, UDAHUB: args.udahub}
+    failures = []
+    for database, path in paths.items():
+        if args.only and database != args.only:
+            continue
+        if not os.path.exists(path):
+            parser.error(f"{path} does not exist")
+        engine = _engine(path)
+        try:
+            if args.command == "upgrade":
+                upgrade(engine, database, args.to)
+            elif args.command == "downgrade":
+                downgrade(engine, database, args.to)
+            elif args.command == "check":
+                failures += verify_query_plans(engine, database)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"{database}: version {current_version(engine)} of {latest_version(database)} ({path})")
+        engine.dispose()
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
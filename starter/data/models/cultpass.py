@@ -6,7 +6,9 @@ from sqlalchemy import (
     Boolean,
     DateTime,
     ForeignKey,
+    Index,
     UniqueConstraint,
+    text,
 )
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.orm.decl_api import DeclarativeBase
@@ -73,6 +75,18 @@ class Experience(Base):
 
 class Reservation(Base):
     __tablename__ = "reservations"
+    __table_args__ = (
+        # At most one active (non-cancelled) reservation per user and experience
+        Index(
+            "ux_reservations_active_user_experience",
+            "user_id",
+            "experience_id",
+            unique=True,
+            sqlite_where=text("status != 'cancelled'"),
+        ),
+        Index("ix_reservations_user_status", "user_id", "status"),
+        Index("ix_reservations_experience_id", "experience_id"),
+    )
 
     reservation_id = Column(String, primary_key=True)
     user_id = Column(String, ForeignKey("users.user_id"), nullable=False)
@@ -6,6 +6,8 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
+    Integer,
     UniqueConstraint,
 )
 from sqlalchemy.ext.declarative import declarative_base
@@ -57,6 +59,7 @@ class User(Base):
 
 class Ticket(Base):
     __tablename__ = "tickets"
+    __table_args__ = (Index("ix_tickets_user_created", "user_id", "created_at"),)
     ticket_id = Column(String, primary_key=True)
     account_id = Column(String, ForeignKey("accounts.account_id"), nullable=False)
     user_id = Column(String, ForeignKey("users.user_id"), nullable=False)
@@ -98,6 +101,7 @@ class RoleEnum(enum.Enum):
 
 class TicketMessage(Base):
     __tablename__ = "ticket_messages"
+    __table_args__ = (Index("ix_ticket_messages_ticket_created", "ticket_id", "created_at"),)
     message_id = Column(String, primary_key=True)
     ticket_id = Column(String, ForeignKey("tickets.ticket_id"), nullable=False)
     role = Column(Enum(RoleEnum, name="role_enum"), nullable=False)
@@ -117,11 +121,14 @@ class TicketMessage(Base):
 
 class Knowledge(Base):
     __tablename__ = "knowledge"
+    __table_args__ = (Index("ix_knowledge_account_id", "account_id"),)
     article_id = Column(String, primary_key=True)
     account_id = Column(String, ForeignKey("accounts.account_id"), nullable=False)
     title = Column(String, nullable=False)
     content = Column(Text, nullable=False)
     tags = Column(Text)
+    # sha256 of title, content and tags, set by agentic/kb_ingest.py
+    content_hash = Column(String)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
@@ -131,8 +138,28 @@ class Knowledge(Base):
         return f"<Knowledge(article_id='{self.article_id}', title='{self.title}')>"
 
 
+class KnowledgePassage(Base):
+    """A chunk of an article's content, the unit knowledge search ranks."""
+
+    __tablename__ = "knowledge_passages"
+    __table_args__ = (Index("ix_knowledge_passages_article", "article_id", "ordinal"),)
+    passage_id = Column(String, primary_key=True)  # f"{article_id}:{ordinal}"
+    article_id = Column(String, ForeignKey("knowledge.article_id"), nullable=False)
+    account_id = Column(String, nullable=False)
+    ordinal = Column(Integer, nullable=False)
+    # Character offsets of the passage in Knowledge.content
+    start_offset = Column(Integer, nullable=False)
+    end_offset = Column(Integer, nullable=False)
+    title = Column(String, nullable=False)  # the article's, so it weighs in ranking
+    content = Column(Text, nullable=False)
+
+    def __repr__(self):
+        return f"<KnowledgePassage(passage_id='{self.passage_id}')>"
+
+
 class AgentLog(Base):
     __tablename__ = "agent_logs"
+    __table_args__ = (Index("ix_agent_logs_ticket_created", "ticket_id", "created_at"),)
     log_id = Column(String, primary_key=True)
     ticket_id = Column(String, ForeignKey("tickets.ticket_id"), nullable=False)
     agent_name = Column(String, nullable=False)
@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+import pytest
+
+# Files the modules would otherwise create in the working directory; set
+# before any test module imports them
+_scratch = tempfile.mkdtemp(prefix="starter-tests-")
+for variable, name in [
+    ("TRIAGE_CACHE_PATH", "triage_cache.db"),
+    ("CHECKPOINT_DB_PATH", "checkpoints.db"),
+    ("KB_VECTOR_INDEX_DIR", "kb_index"),
+]:
+    os.environ.setdefault(variable, os.path.join(_scratch, name))
+
+
+@pytest.fixture
+def configure_db():
+    """`agentic.db.configure`, with the previous database paths restored afterwards."""
+    from agentic import db
+
+    previous = dict(db.DB_PATHS)
+    yield db.configure
+    for name, path in previous.items():
+        db.configure(name, path)
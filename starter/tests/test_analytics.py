@@ -0,0 +1,36 @@
+from sqlalchemy import create_engine
+
+from data import migrations
+from data.models import udahub
+from agentic import analytics, db
+
+
+def test_turns_are_recorded_once_the_migration_is_applied(tmp_path, configure_db, monkeypatch):
+    path = str(tmp_path / "udahub.db")
+    engine = create_engine(f"sqlite:///{path}")
+    udahub.Base.metadata.create_all(engine)
+    configure_db(db.UDAHUB, path)
+    monkeypatch.setattr(analytics, "_writer", None)
+    monkeypatch.setattr(analytics, "_unmigrated_at", None)
+    monkeypatch.setattr(analytics, "SCHEMA_RECHECK", 0.0)
+    state = {"destination": "billing_agent", "sentiment": "Neutral", "urgency": "Low"}
+
+    # Without the tables, turns are skipped rather than failing the chat
+    analytics.record_turn("t1", "cultpass", state, 0.2)
+    assert analytics.get_analytics_writer() is None
+
+    migrations.upgrade(engine, migrations.UDAHUB)
+    analytics.record_turn("t1", "cultpass", state, 0.2)
+    analytics.record_turn("t1", "cultpass", {**state, "urgency": "High"}, 0.4)
+    writer = analytics.get_analytics_writer()
+    try:
+        assert writer.flush(timeout=10)
+        assert writer.written == 2
+        assert analytics.ticket(engine, "t1")["urgency"] == "High"
+        assert analytics.rollup(engine, ("agent",)) == [
+            {"agent": "billing_agent", "turns": 2, "tickets_opened": 1, "mean_latency_ms": 300.0}
+        ]
+        assert analytics.current(engine, ("urgency",)) == [{"urgency": "High", "tickets": 1}]
+    finally:
+        writer.close()
+        engine.dispose()
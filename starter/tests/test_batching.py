@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+from agentic.batching import BatchWriter
+
+
+class ListWriter(BatchWriter):
+    """Collects the batches it is handed."""
+
+    name = "list-writer"
+
+    def __init__(self, **kwargs):
+        self.batches = []
+        self.wrote = threading.Event()
+        super().__init__(engine=None, **kwargs)
+
+    def write_batch(self, records: list):
+        self.batches.append(list(records))
+        self.wrote.set()
+
+
+def test_write_batch_must_be_implemented():
+    with pytest.raises(TypeError):
+        BatchWriter(engine=None)
+
+
+def test_a_full_batch_is_written_at_once():
+    writer = ListWriter(batch_size=3, flush_interval=60)
+    try:
+        for record in range(4):
+            writer._put(record)
+        assert writer.wrote.wait(5)
+        assert writer.batches == [[0, 1, 2]]
+    finally:
+        writer.close()
+    assert writer.batches == [[0, 1, 2], [3]]
+
+
+def test_a_partial_batch_is_written_after_the_flush_interval():
+    writer = ListWriter(batch_size=100, flush_interval=0.05)
+    try:
+        writer._put("a")
+        writer._put("b")
+        assert writer.wrote.wait(5)
+        assert writer.batches == [["a", "b"]]
+    finally:
+        writer.close()
+
+
+def test_close_writes_whatever_is_pending():
+    writer = ListWriter(batch_size=100, flush_interval=60)
+    writer._put("a")
+    writer._put("b")
+
+    writer.close()
+
+    assert writer.batches == [["a", "b"]]
+    assert writer.written == 2
+    with pytest.raises(RuntimeError):
+        writer._put("c")
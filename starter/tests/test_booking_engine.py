@@ -0,0 +1,100 @@
+import random
+import sqlite3
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from agentic import db
+from agentic.tools import booking_engine
+from benchmarks import booking_stress
+from data import migrations
+
+THREADS = 16
+ATTEMPTS = 400
+LIMITS = SimpleNamespace(experiences=2, slots=20, users=40, quota=2)
+
+
+def _seed(tmp_path) -> str:
+    path = str(tmp_path / "cultpass.db")
+    booking_stress.seed(path, LIMITS.experiences, LIMITS.slots, LIMITS.users, LIMITS.quota)
+    return path
+
+
+def _hammer(cancel_rate: float = 0.1) -> Counter:
+    """Book (and sometimes cancel) from THREADS threads; returns the outcomes."""
+    Session = db.get_sessionmaker(db.CULTPASS)
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def worker(index: int):
+        rng = random.Random(index)
+        session = Session()
+        try:
+            result = booking_engine.book(
+                session,
+                f"user-{rng.randrange(LIMITS.users):04d}",
+                f"exp-{rng.randrange(LIMITS.experiences):03d}",
+            )
+            cancelled = False
+            if "error" not in result and rng.random() < cancel_rate:
+                cancelled = "error" not in booking_engine.cancel(session, result["reservation_id"])
+        finally:
+            session.close()
+        with lock:
+            outcomes[result.get("error", "booked")] += 1
+            outcomes["cancelled"] += cancelled
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(worker, range(ATTEMPTS)))
+    db.dispose_all()
+    return outcomes
+
+
+def test_concurrent_bookings_never_oversell(tmp_path, configure_db):
+    path = _seed(tmp_path)
+    configure_db(db.CULTPASS, path)
+
+    outcomes = _hammer()
+
+    assert outcomes["booked"] > 0
+    assert outcomes["Class is full"] > 0  # the slots really ran out
+    assert booking_stress.verify(path, LIMITS, outcomes) == []
+
+
+def test_duplicates_are_rejected_without_the_unique_index(tmp_path, configure_db, caplog):
+    path = _seed(tmp_path)
+    # An older file (no index) that already holds a duplicate, so the index
+    # migration fails
+    conn = sqlite3.connect(path)
+    conn.execute(f"DROP INDEX {booking_engine.ACTIVE_INDEX}")
+    conn.executemany(
+        "INSERT INTO reservations (reservation_id, user_id, experience_id, status) "
+        "VALUES (?, 'user-0000', 'exp-000', 'reserved')",
+        [("res-dup-1",), ("res-dup-2",)],
+    )
+    conn.commit()
+    conn.close()
+    with pytest.raises(IntegrityError):
+        migrations.upgrade(path, migrations.CULTPASS)
+    configure_db(db.CULTPASS, path)
+
+    outcomes = _hammer(cancel_rate=0.0)
+
+    conn = sqlite3.connect(path)
+    index = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = ?", (booking_engine.ACTIVE_INDEX,)
+    ).fetchone()
+    duplicates = conn.execute(
+        "SELECT user_id, experience_id, COUNT(*) FROM reservations "
+        "WHERE status != 'cancelled' GROUP BY user_id, experience_id HAVING COUNT(*) > 1"
+    ).fetchall()
+    conn.close()
+    assert index is None
+    assert booking_engine.ACTIVE_INDEX in caplog.text
+    assert outcomes["User already booked this class"] > 0
+    # Only the pair that was duplicated before the test
+    assert duplicates == [("user-0000", "exp-000", 2)]
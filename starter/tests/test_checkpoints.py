@@ -0,0 +1,113 @@
+import asyncio
+import gc
+import sqlite3
+import threading
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agentic import context
+from agentic.async_checkpoints import BoundedAsyncSqliteSaver
+from agentic.checkpoints import PooledSqliteSaver
+from agentic.workflow import OrchestratorConfig, build_async_orchestrator
+from benchmarks.fake_models import ScriptedChatModel
+from tests.test_workflow import PAUSE
+
+
+def _touch(saver: PooledSqliteSaver):
+    with saver.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM checkpoints").fetchone()
+
+
+def test_connections_of_finished_threads_are_closed(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "checkpoints.db"))
+    _touch(saver)
+    opened = []
+
+    def work():
+        _touch(saver)
+        opened.append(saver.conn)
+
+    for _ in range(50):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+    gc.collect()
+
+    # Only the creating thread's connection is left open
+    assert len(saver._connections) == 1
+    assert len({id(conn) for conn in opened}) == 50
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+            conn.execute("SELECT 1")
+    _touch(saver)
+    saver.close()
+
+
+def test_close_closes_live_threads_connections(tmp_path):
+    saver = PooledSqliteSaver(str(tmp_path / "checkpoints.db"))
+    ready, done = threading.Event(), threading.Event()
+
+    def work():
+        _touch(saver)
+        ready.set()
+        done.wait()
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    ready.wait()
+    assert len(saver._connections) == 2
+
+    saver.close()
+    done.set()
+    thread.join()
+    assert saver._connections == []
+
+
+def test_async_saver_keeps_the_newest_checkpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(context, "summarizer", None)
+    model = ScriptedChatModel(scenarios={PAUSE.text: PAUSE})
+
+    async def run():
+        saver = await BoundedAsyncSqliteSaver.connect(str(tmp_path / "checkpoints.db"), keep_last=3)
+        orchestrator = await build_async_orchestrator(
+            config=OrchestratorConfig(model=model, checkpointer=saver)
+        )
+        config = {"configurable": {"thread_id": "pause"}}
+        for _ in range(3):
+            await orchestrator.ainvoke({"messages": [HumanMessage(content=PAUSE.text)]}, config)
+        before = await saver.thread_sizes()
+        deleted = await saver.compact()
+        after = await saver.thread_sizes()
+        state = await orchestrator.aget_state(config)
+        await saver.aclose()
+        return before, deleted, after, state
+
+    before, deleted, after, state = asyncio.run(run())
+
+    assert deleted > 0
+    assert after[0]["checkpoints"] == before[0]["checkpoints"] - deleted
+    assert after[0]["bytes"] < before[0]["bytes"]
+    conn = sqlite3.connect(tmp_path / "checkpoints.db")
+    per_namespace = conn.execute(
+        "SELECT MAX(n) FROM (SELECT COUNT(*) AS n FROM checkpoints GROUP BY checkpoint_ns)"
+    ).fetchone()
+    conn.close()
+    assert per_namespace == (3,)
+    # The latest state survives pruning
+    assert len([m for m in state.values["messages"] if isinstance(m, HumanMessage)]) == 3
+
+
+def test_async_orchestrator_compacts_its_default_saver(tmp_path):
+    async def run():
+        orchestrator = await build_async_orchestrator(str(tmp_path / "checkpoints.db"))
+        saver = orchestrator.checkpointer
+        running = saver._compactor is not None and not saver._compactor.done()
+        await saver.aclose()
+        return saver, running
+
+    saver, running = asyncio.run(run())
+
+    assert isinstance(saver, BoundedAsyncSqliteSaver)
+    assert running
+    assert saver._compactor is None
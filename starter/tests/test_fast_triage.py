@@ -0,0 +1,64 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agentic.agents import fast_triage
+from agentic.agents.triage import RouteQuery
+
+BOOKING = RouteQuery(destination="booking_agent", sentiment="Neutral", urgency="Low")
+
+
+class Fallback:
+    """Stands in for the LLM triage chain; records the turns it is asked about."""
+
+    def __init__(self, route: RouteQuery):
+        self.route = route
+        self.calls = []
+
+    def invoke(self, inputs: dict) -> RouteQuery:
+        self.calls.append(inputs)
+        return self.route
+
+
+def _turn(text: str) -> list:
+    return [
+        HumanMessage(content="Can you book me into the yoga class on Friday?"),
+        AIMessage(content="Sure, shall I book the 6pm class for you?"),
+        HumanMessage(content=text),
+    ]
+
+
+def _classify(text: str, previous: RouteQuery, fallback: Fallback) -> RouteQuery:
+    return fast_triage.classify(
+        _turn(text), fallback=fallback, previous=previous, fast_path=False, sticky=True
+    )
+
+
+def test_a_short_follow_up_stays_with_the_current_specialist():
+    fallback = Fallback(RouteQuery(destination="tech_agent", sentiment="Neutral", urgency="Low"))
+
+    route = _classify("yes, please", BOOKING, fallback)
+
+    assert route.destination == "booking_agent"
+    assert fallback.calls == []
+
+
+def test_a_topic_switch_is_triaged_again():
+    billing = RouteQuery(destination="billing_agent", sentiment="Negative", urgency="Critical")
+    fallback = Fallback(billing)
+
+    assert fast_triage.follow_up("I was charged twice on my credit card", BOOKING, sticky=True) is None
+    assert _classify("I was charged twice on my credit card", BOOKING, fallback) == billing
+    assert len(fallback.calls) == 1
+    # Without sticky routing every turn goes to triage
+    assert fast_triage.follow_up("yes, please", BOOKING, sticky=False) is None
+
+
+def test_urgency_only_rises_within_a_topic():
+    fallback = Fallback(BOOKING)
+    urgent = BOOKING.model_copy(update={"urgency": "High"})
+
+    assert _classify("yes, I need it today", BOOKING, fallback).urgency == "High"
+    calmer = _classify("ok, thanks", urgent, fallback)
+
+    assert calmer.urgency == "High"
+    assert calmer.sentiment == "Positive"  # sentiment follows the new message
+    assert fallback.calls == []
@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import create_engine
+
+from data import migrations
+from data.models import cultpass, udahub
+
+MODELS = {migrations.CULTPASS: cultpass, migrations.UDAHUB: udahub}
+
+
+@pytest.fixture(params=[migrations.CULTPASS, migrations.UDAHUB])
+def database(request, tmp_path):
+    """(name, engine) of a database on version 0, i.e. without the migrated indexes."""
+    name = request.param
+    engine = create_engine(f"sqlite:///{tmp_path / name}.db")
+    MODELS[name].Base.metadata.create_all(engine)
+    # create_all already built what the migrations add; stamp it, then revert
+    migrations.upgrade(engine, name)
+    migrations.downgrade(engine, name, to=0)
+    yield name, engine
+    engine.dispose()
+
+
+def _indexes(engine) -> set[str]:
+    with engine.connect() as conn:
+        return {
+            row[0]
+            for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")
+        }
+
+
+def test_upgrade_makes_the_hot_queries_use_their_indexes(database):
+    name, engine = database
+    assert migrations.current_version(engine) == 0
+    assert len(migrations.verify_query_plans(engine, name)) == len(migrations.PLAN_CHECKS[name])
+
+    assert migrations.upgrade(engine, name) == migrations.latest_version(name)
+
+    assert migrations.verify_query_plans(engine, name) == []
+    with engine.connect() as conn:
+        for check in migrations.PLAN_CHECKS[name]:
+            plan = migrations.explain(conn, check.sql)
+            assert any(f"INDEX {check.index}" in step for step in plan), (check.description, plan)
+
+
+def test_downgrade_removes_the_indexes(database):
+    name, engine = database
+    migrations.upgrade(engine, name)
+    expected = {check.index for check in migrations.PLAN_CHECKS[name]}
+    assert expected <= _indexes(engine)
+
+    assert migrations.downgrade(engine, name, to=0) == 0
+
+    assert not expected & _indexes(engine)
+
+
+def test_upgrade_is_idempotent(database):
+    name, engine = database
+    migrations.upgrade(engine, name)
+    indexes = _indexes(engine)
+
+    assert migrations.upgrade(engine, name) == migrations.latest_version(name)
+    assert _indexes(engine) == indexes
@@ -0,0 +1,34 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agentic.prefetch import find_customer
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "my user id is a4ab87",
+        "My User ID is: a4ab87",
+        "user_id=a4ab87, please check my bookings",
+        "user id: a4ab87",
+        "User ID #a4ab87",
+        "userid a4ab87",
+    ],
+)
+def test_user_id_phrasings(text):
+    assert find_customer([HumanMessage(content=text)], None) == (None, "a4ab87")
+
+
+def test_email_wins_over_user_id():
+    text = "I am jane@example.com, user id is a4ab87."
+    assert find_customer([HumanMessage(content=text)], None) == ("jane@example.com", None)
+
+
+def test_earlier_customer_is_kept_when_the_turn_names_none():
+    previous = {"user": {"email": "jane@example.com", "user_id": "a4ab87"}}
+    messages = [
+        HumanMessage(content="my user id is zz9"),
+        AIMessage(content="Hi"),
+        HumanMessage(content="thanks!"),
+    ]
+    assert find_customer(messages, previous) == ("jane@example.com", "a4ab87")
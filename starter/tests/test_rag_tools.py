@@ -0,0 +1,144 @@
+import os
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from agentic import db
+from agentic.tools import rag_tools
+from data.models import udahub
+
+ACCOUNT_ID = "cultpass"
+
+
+@pytest.fixture
+def udahub_path(tmp_path, configure_db, monkeypatch):
+    """A udahub.db as create_all leaves it: no migrations, passages or FTS indexes."""
+    path = str(tmp_path / "udahub.db")
+    engine = create_engine(f"sqlite:///{path}")
+    udahub.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(udahub.Account(account_id=ACCOUNT_ID, account_name="CultPass"))
+    session.add(
+        udahub.Knowledge(
+            article_id="kb-000",
+            account_id=ACCOUNT_ID,
+            title="Resetting your password",
+            content="Open Settings and tap Reset password.\n\nA link is sent to your email.",
+            tags="password, login",
+        )
+    )
+    session.commit()
+    session.close()
+    engine.dispose()
+    configure_db(db.UDAHUB, path)
+    monkeypatch.setattr(rag_tools, "VECTOR_INDEX_DIR", str(tmp_path / "kb_index"))
+    monkeypatch.setattr(rag_tools, "_shards", None)
+    monkeypatch.setattr(rag_tools, "_schema", None)
+    return path
+
+
+def _schema(path: str) -> list[tuple]:
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT type, name FROM sqlite_master ORDER BY name").fetchall()
+    conn.close()
+    return rows
+
+
+def _search(query: str):
+    session = rag_tools._session()
+    try:
+        return rag_tools._search_knowledge_base(session, query, ACCOUNT_ID)
+    finally:
+        session.close()
+
+
+def test_search_never_changes_the_schema(udahub_path):
+    before = _schema(udahub_path)
+
+    result = _search("password")
+
+    assert _schema(udahub_path) == before
+    assert not os.path.exists(rag_tools.VECTOR_INDEX_DIR)  # nor builds vector shards
+    # Whole articles, found by the LIKE fallback
+    assert [article["title"] for article in result] == ["Resetting your password"]
+
+
+def test_search_uses_passages_once_prepared(udahub_path):
+    assert rag_tools.prepare() is True
+
+    result = _search("reset password")
+
+    assert result[0]["article_id"] == "kb-000"
+    assert "**password**" in result[0]["passages"][0]["snippet"]
+
+
+def test_edited_articles_are_searched_with_their_new_text(udahub_path):
+    rag_tools.prepare()
+    conn = sqlite3.connect(udahub_path)
+    conn.execute(
+        "UPDATE knowledge SET content = 'Tap Forgot password on the login screen.' "
+        "WHERE article_id = 'kb-000'"
+    )
+    conn.commit()
+    assert conn.execute("SELECT COUNT(*) FROM knowledge_passages").fetchone() == (0,)
+
+    result = _search("forgot password")
+
+    assert "Settings" not in str(result)
+    assert "**Forgot** **password**" in result[0]["passages"][0]["snippet"]
+
+    rag_tools.prepare()
+    stored = conn.execute("SELECT content FROM knowledge_passages").fetchall()
+    conn.close()
+    assert stored == [("Tap Forgot password on the login screen.",)]
+
+
+def test_prepare_builds_the_vector_shards_search_checks(udahub_path):
+    rag_tools.prepare()
+    session = rag_tools._session()
+    try:
+        hits = rag_tools._vector_hits(session, "reset my password", 3, ACCOUNT_ID)
+        assert [article_id for article_id, _ in hits] == ["kb-000"]
+        # An article added behind the index's back makes the shard stale
+        conn = sqlite3.connect(udahub_path)
+        conn.execute(
+            "INSERT INTO knowledge (article_id, account_id, title, content) "
+            "VALUES ('kb-001', ?, 'Refunds', 'Refunds take five days.')",
+            (ACCOUNT_ID,),
+        )
+        conn.commit()
+        conn.close()
+        rag_tools.get_shards().recheck = 0
+
+        assert rag_tools._vector_hits(session, "reset my password", 3, ACCOUNT_ID) == []
+
+        rag_tools.prepare()
+        assert rag_tools.get_vector_index(session, ACCOUNT_ID).ids == ["kb-000", "kb-001"]
+    finally:
+        session.close()
+
+
+def test_the_like_fallback_returns_top_k_hits(udahub_path):
+    engine = create_engine(f"sqlite:///{udahub_path}")
+    with sessionmaker(bind=engine)() as session:
+        session.add_all(
+            udahub.Knowledge(
+                article_id=f"kb-{i:03d}",
+                account_id=ACCOUNT_ID,
+                title=f"Password tip {i}",
+                content="Use a password manager.",
+                tags="password",
+            )
+            for i in range(1, 6)
+        )
+        session.commit()
+    engine.dispose()
+
+    session = rag_tools._session()
+    try:
+        assert len(rag_tools._keyword_hits(session, "password", 1, ACCOUNT_ID)) == 1
+        assert len(rag_tools._keyword_hits(session, "password", 5, ACCOUNT_ID)) == 5
+    finally:
+        session.close()
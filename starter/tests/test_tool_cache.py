@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from agentic import db
+from agentic.tools import cultpass_tools, tool_cache
+from benchmarks import booking_stress
+
+USER = "user-0000"
+
+
+@pytest.fixture
+def cache(tmp_path, configure_db, monkeypatch):
+    """A fresh tool cache in front of a seeded cultpass.db."""
+    path = str(tmp_path / "cultpass.db")
+    booking_stress.seed(path, experiences=2, slots=5, users=2, quota=3)
+    configure_db(db.CULTPASS, path)
+    monkeypatch.setattr(tool_cache, "ENABLED", True)
+    monkeypatch.setattr(tool_cache, "cache", tool_cache.ToolCache())
+    yield tool_cache.cache
+    db.dispose_all()
+
+
+def _reservations() -> list:
+    result = json.loads(cultpass_tools.get_user_reservations.invoke({"user_id": USER}))
+    return result if isinstance(result, list) else []
+
+
+def _tier() -> str:
+    return json.loads(cultpass_tools.get_subscription_status.invoke({"user_id": USER}))["tier"]
+
+
+def test_writes_invalidate_the_users_cached_reads(cache):
+    assert _reservations() == []
+    assert _reservations() == []  # served from the cache
+    assert cache.hits == 1
+
+    booked = json.loads(
+        cultpass_tools.book_reservation.invoke({"user_id": USER, "experience_id": "exp-000"})
+    )
+    assert [row["status"] for row in _reservations()] == ["confirmed"]
+
+    cultpass_tools.cancel_reservation.invoke({"reservation_id": booked["reservation_id"]})
+    assert [row["status"] for row in _reservations()] == ["cancelled"]
+
+    assert _tier() == "basic"
+    cultpass_tools.update_subscription.invoke({"user_id": USER, "new_tier": "elite"})
+    assert _tier() == "elite"
+
+
+def test_a_read_overlapping_a_write_is_not_cached(cache):
+    def racing_read(session, user_id: str) -> dict:
+        result = cultpass_tools._get_subscription_status(session, user_id)
+        # The write commits after the read has its (now stale) result
+        cultpass_tools.update_subscription.invoke({"user_id": user_id, "new_tier": "elite"})
+        return result
+
+    stale = cultpass_tools._run(
+        racing_read, readonly=True, cached_as="get_subscription_status", user_id=USER
+    )
+
+    assert json.loads(stale)["tier"] == "basic"
+    assert cache.stale_puts == 1
+    assert len(cache) == 0
+    assert _tier() == "elite"
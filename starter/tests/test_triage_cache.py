@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+from langchain_core.messages import HumanMessage
+
+from agentic.agents.triage import RouteQuery
+from agentic.agents.triage_cache import CacheFileWriter, CachedTriageChain, TriageCache
+
+BILLING = RouteQuery(destination="billing_agent", sentiment="Neutral", urgency="Low")
+
+
+class _Chain:
+    async def ainvoke(self, inputs, config=None):
+        return BILLING
+
+
+def test_ainvoke_does_not_wait_for_the_cache_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "triage_cache.db")
+    release = threading.Event()
+    write_batch = CacheFileWriter.write_batch
+
+    def slow_write_batch(self, records):
+        release.wait(5)
+        write_batch(self, records)
+
+    monkeypatch.setattr(CacheFileWriter, "write_batch", slow_write_batch)
+    cache = TriageCache(path=path)
+    chain = CachedTriageChain(_Chain(), cache)
+    inputs = {"messages": [HumanMessage(content="Why was I charged twice?")]}
+
+    # Returns while the writer is still blocked on the file
+    assert asyncio.run(asyncio.wait_for(chain.ainvoke(inputs), 2)) == BILLING
+    assert len(TriageCache(path=path)) == 0
+
+    release.set()
+    assert cache.flush(5)
+    reloaded = TriageCache(path=path)
+    assert reloaded.get(cache.make_key("Why was I charged twice?")) == BILLING
+
+
+def test_evicted_entries_leave_the_file(tmp_path):
+    path = str(tmp_path / "triage_cache.db")
+    cache = TriageCache(max_entries=2, path=path)
+    for text in ("one", "two", "three"):
+        cache.put(cache.make_key(text), BILLING)
+    cache.flush(5)
+
+    reloaded = TriageCache(path=path)
+
+    assert reloaded.get(cache.make_key("one")) is None
+    assert reloaded.get(cache.make_key("three")) == BILLING
@@ -0,0 +1,70 @@
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from agentic import context, db, llm
+from agentic.agents import fast_triage
+from agentic.workflow import OrchestratorConfig, build_orchestrator
+from benchmarks import seed
+from benchmarks.fake_models import ScriptedChatModel, Scenario
+from data.models import udahub
+
+PAUSE = Scenario(
+    "retention_agent",
+    "I would like to pause my membership for a while",
+    [],
+    "You can pause for up to 3 months and keep your data.",
+)
+
+
+def test_injected_model_is_used_everywhere(monkeypatch):
+    # Any fallback to the shared ChatOpenAI would fail without credentials
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(llm, "_models", {})
+    monkeypatch.setattr(context, "summarizer", None)
+    # Fold every earlier turn into the summary
+    monkeypatch.setattr(context, "HISTORY_BUDGET", 1)
+    model = ScriptedChatModel(scenarios={PAUSE.text: PAUSE})
+
+    orchestrator = build_orchestrator(
+        OrchestratorConfig(model=model, checkpointer=MemorySaver(), eager=True)
+    )
+    config = {"configurable": {"thread_id": "pause"}}
+    for _ in range(2):
+        state = orchestrator.invoke({"messages": [HumanMessage(content=PAUSE.text)]}, config)
+
+    assert state["destination"] == "retention_agent"
+    assert state["messages"][-1].content == PAUSE.reply
+    assert state["summarized_count"] > 0
+    assert llm._models == {}
+
+
+def test_train_triage_learns_from_labelled_tickets(tmp_path, configure_db, monkeypatch):
+    path = str(tmp_path / "udahub.db")
+    seed.seed_udahub(path)
+    configure_db(db.UDAHUB, path)
+    session = db.get_sessionmaker(db.UDAHUB)()
+    session.add(
+        udahub.User(user_id="u1", account_id=seed.ACCOUNT_ID, external_user_id="x", user_name="A")
+    )
+    for i in range(20):
+        session.add(udahub.Ticket(ticket_id=f"t{i}", account_id=seed.ACCOUNT_ID, user_id="u1"))
+        session.add(
+            udahub.TicketMetadata(ticket_id=f"t{i}", status="closed", main_issue_type="tech_agent")
+        )
+        session.add(
+            udahub.TicketMessage(
+                message_id=f"m{i}",
+                ticket_id=f"t{i}",
+                role=udahub.RoleEnum.user,
+                content="the zorblat widget flickers",
+            )
+        )
+    session.commit()
+    session.close()
+    monkeypatch.setattr(fast_triage, "classifier", fast_triage.classifier)
+    untrained = fast_triage.classifier
+
+    build_orchestrator(OrchestratorConfig(checkpointer=MemorySaver(), train_triage=True))
+
+    assert fast_triage.classifier is not untrained
+    assert fast_triage.classifier.predict("zorblat").route.destination == "tech_agent"
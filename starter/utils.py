@@ -50,21 +50,156 @@ def model_to_dict(instance):
     }
 
 
-def chat_interface(agent: CompiledStateGraph, ticket_id: str):
-    from data.models.udahub import Ticket, TicketMessage, RoleEnum, AgentLog
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import sessionmaker
-    import uuid
-
-    # Setup DB for logging
-    engine = create_engine("sqlite:///udahub.db")
-    Session = sessionmaker(bind=engine)
-    session = Session()
+# Graph nodes whose LLM output is the reply shown to the user
+REPLY_NODES = {"billing_agent", "booking_agent", "tech_agent", "retention_agent"}
+
+
+def _reply_token(namespace, chunk, metadata) -> str:
+    """
+    Text of a streamed chunk if it belongs to the user-facing reply.
+    Tokens from triage/summaries and tool-call chunks are skipped.
+    """
+    from langchain_core.messages import AIMessageChunk
+
+    if not namespace or namespace[0].split(":")[0] not in REPLY_NODES:
+        return ""
+    if not isinstance(chunk, AIMessageChunk) or chunk.tool_call_chunks:
+        return ""
+    return chunk.content if isinstance(chunk.content, str) else ""
+
+
+def stream_reply(agent: CompiledStateGraph, trigger: dict, config: dict, on_token):
+    """
+    Run the graph with token streaming (messages mode, including the
+    specialist subgraphs). on_token is called with each reply token.
+    Returns (final_state, time_to_first_token_seconds or None).
+    """
+    import time
+
+    start = time.perf_counter()
+    first_token_at = None
+    final_state = None
+    for namespace, mode, payload in agent.stream(
+        trigger, config, stream_mode=["messages", "values"], subgraphs=True
+    ):
+        if mode == "values":
+            if not namespace:
+                final_state = payload
+            continue
+        token = _reply_token(namespace, *payload)
+        if token:
+            if first_token_at is None:
+                first_token_at = time.perf_counter() - start
+            on_token(token)
+    return final_state, first_token_at
+
+
+async def astream_reply(agent: CompiledStateGraph, trigger: dict, config: dict, on_token):
+    """Async version of stream_reply, driven by astream."""
+    import time
+
+    start = time.perf_counter()
+    first_token_at = None
+    final_state = None
+    async for namespace, mode, payload in agent.astream(
+        trigger, config, stream_mode=["messages", "values"], subgraphs=True
+    ):
+        if mode == "values":
+            if not namespace:
+                final_state = payload
+            continue
+        token = _reply_token(namespace, *payload)
+        if token:
+            if first_token_at is None:
+                first_token_at = time.perf_counter() - start
+            on_token(token)
+    return final_state, first_token_at
+
+
+def _log_latency(audit, ticket_id: str, agent_name: str, ttft, total: float):
+    import json
+
+    audit.log_agent(
+        ticket_id,
+        agent_name=agent_name,
+        action="Latency",
+        details=json.dumps(
+            {
+                "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+                "total_ms": round(total * 1000, 1),
+            }
+        ),
+    )
+
+
+def ticket_account(ticket_id: str) -> str | None:
+    """The account of a stored ticket, or None for an unknown ticket."""
+    from data.models.udahub import Ticket
+    from agentic import db
+
+    with db.get_sessionmaker(db.UDAHUB, readonly=True)() as session:
+        return session.query(Ticket.account_id).filter(Ticket.ticket_id == ticket_id).scalar()
+
+
+async def aticket_account(ticket_id: str) -> str | None:
+    from sqlalchemy import select
+    from data.models.udahub import Ticket
+    from agentic import db
+
+    async with db.get_async_sessionmaker(db.UDAHUB, readonly=True)() as session:
+        return await session.scalar(select(Ticket.account_id).where(Ticket.ticket_id == ticket_id))
+
+
+def _session_account(ticket_id: str) -> str | None:
+    # A failed lookup must not end the session: without an account the
+    # checkpointed (or default) one is used
+    try:
+        return ticket_account(ticket_id)
+    except Exception as e:
+        print(f"Error: could not look up the ticket's account ({e}); using the default")
+        return None
+
+
+async def _asession_account(ticket_id: str) -> str | None:
+    try:
+        return await aticket_account(ticket_id)
+    except Exception as e:
+        print(f"Error: could not look up the ticket's account ({e}); using the default")
+        return None
+
+
+def _trigger(user_input: str, account_id: str | None) -> dict:
+    # The account rides along in AgentState so tools can scope to it; when it
+    # is unknown the checkpointed (or default) account is kept
+    trigger = {"messages": [HumanMessage(content=user_input)]}
+    if account_id:
+        trigger["account_id"] = account_id
+    return trigger
+
+
+def chat_interface(
+    agent: CompiledStateGraph, ticket_id: str, stream: bool = True, account_id: str | None = None
+):
+    """
+    Interactive chat loop for one ticket. With stream=True the reply is
+    printed token by token as the specialist agent generates it; the full
+    text is logged once the turn completes, along with time-to-first-token.
+    `account_id` defaults to the stored ticket's account.
+    """
+    from data.models.udahub import RoleEnum
+    from agentic import analytics
+    from agentic.audit import get_audit_writer
+    import time
+
+    # Messages and logs are written in batches by a background thread, so
+    # logging never delays a reply
+    audit = get_audit_writer()
 
     # Create ticket if not exists (simplified)
     # properly we assume ticket exists, but let's ensure it for the demo
     # We won't create it here to avoid complex dependency, we assume ID is passed.
 
+    account_id = account_id or _session_account(ticket_id)
     print(f"--- Chat Session Started (Ticket ID: {ticket_id}) ---")
 
     is_first_iteration = False  # Handled by the loop
@@ -78,18 +213,9 @@ def chat_interface(agent: CompiledStateGraph, ticket_id: str):
             break
 
         # Log User Message
-        user_msg = TicketMessage(
-            message_id=f"msg-{uuid.uuid4().hex[:8]}",
-            ticket_id=ticket_id,
-            role=RoleEnum.user,
-            content=user_input,
-        )
-        session.add(user_msg)
-        session.commit()
+        audit.log_message(ticket_id, RoleEnum.user, user_input)
 
-        messages = [HumanMessage(content=user_input)]
-
-        trigger = {"messages": messages}
+        trigger = _trigger(user_input, account_id)
         config = {
             "configurable": {
                 "thread_id": ticket_id,
@@ -97,7 +223,14 @@ def chat_interface(agent: CompiledStateGraph, ticket_id: str):
         }
 
         try:
-            result = agent.invoke(input=trigger, config=config)
+            start = time.perf_counter()
+            if stream:
+                print("Assistant: ", end="", flush=True)
+                result, ttft = stream_reply(
+                    agent, trigger, config, lambda token: print(token, end="", flush=True)
+                )
+            else:
+                result, ttft = agent.invoke(input=trigger, config=config), None
 
             # The agent might return multiple messages, but usually the last one is the AI response.
             # result["messages"] contains the full history if we used memory, or just the new ones?
@@ -107,32 +240,139 @@ def chat_interface(agent: CompiledStateGraph, ticket_id: str):
             last_msg = result["messages"][-1]
             response_content = last_msg.content
 
-            print(f"Assistant: {response_content}")
+            if not stream:
+                print(f"Assistant: {response_content}")
+            elif ttft is None:
+                # Nothing was streamed (e.g. a non-streaming model); show the reply
+                print(response_content)
+            else:
+                print()
 
             # Log Assistant Message
-            ai_msg = TicketMessage(
-                message_id=f"msg-{uuid.uuid4().hex[:8]}",
-                ticket_id=ticket_id,
-                role=RoleEnum.ai,  # or agent
-                content=str(response_content),
-            )
-            session.add(ai_msg)
+            audit.log_message(ticket_id, RoleEnum.ai, str(response_content))
 
             # --- Structured Logging for Rubric ---
-            # Log the final response action
-            log_entry = AgentLog(
-                log_id=f"log-{uuid.uuid4().hex[:8]}",
-                ticket_id=ticket_id,
-                agent_name="System",  # ideally we'd get the specific agent name from state if possible
+            # Log the final response action, under the specialist that answered
+            agent_name = result.get("destination", "System")
+            audit.log_agent(
+                ticket_id,
+                agent_name=agent_name,
                 action="Response",
                 details=str(response_content)[:200],  # Log snippet
             )
-            session.add(log_entry)
+            seconds = time.perf_counter() - start
+            _log_latency(audit, ticket_id, agent_name, ttft, seconds)
+            # Classification rollups for dashboards (agentic/analytics.py)
+            analytics.record_turn(ticket_id, account_id, result, seconds)
+
+        except Exception as e:
+            print(f"Error: {e}")
+
+    # Make sure the session's history is on disk before returning
+    audit.flush()
+
+
+async def achat_turn(
+    agent: CompiledStateGraph,
+    ticket_id: str,
+    user_input: str,
+    on_token=None,
+    account_id: str | None = None,
+) -> str:
+    """
+    Run one user turn through the graph and log it. With on_token the reply
+    is streamed through astream and time-to-first-token is logged.
+    `account_id` defaults to the stored ticket's account.
+    """
+    from data.models.udahub import RoleEnum
+    from agentic import analytics
+    from agentic.audit import get_audit_writer
+    import time
+
+    # Enqueueing is non-blocking, so the event loop never waits on SQLite
+    audit = get_audit_writer()
+    audit.log_message(ticket_id, RoleEnum.user, user_input)
+
+    config = {"configurable": {"thread_id": ticket_id}}
+    trigger = _trigger(user_input, account_id or await aticket_account(ticket_id))
+    start = time.perf_counter()
+    if on_token is not None:
+        result, ttft = await astream_reply(agent, trigger, config, on_token)
+    else:
+        result, ttft = await agent.ainvoke(input=trigger, config=config), None
+    response_content = str(result["messages"][-1].content)
 
-            session.commit()
+    audit.log_message(ticket_id, RoleEnum.ai, response_content)
+    agent_name = result.get("destination", "System")
+    audit.log_agent(
+        ticket_id,
+        agent_name=agent_name,
+        action="Response",
+        details=response_content[:200],
+    )
+    seconds = time.perf_counter() - start
+    _log_latency(audit, ticket_id, agent_name, ttft, seconds)
+    analytics.record_turn(ticket_id, trigger.get("account_id"), result, seconds)
+    return response_content
 
+
+async def achat_interface(agent: CompiledStateGraph, ticket_id: str):
+    """
+    Async counterpart of chat_interface for an orchestrator built with
+    `build_async_orchestrator`. input() runs in a worker thread so the event
+    loop stays free for other sessions.
+    """
+    import asyncio
+
+    account_id = await _asession_account(ticket_id)
+    print(f"--- Chat Session Started (Ticket ID: {ticket_id}) ---")
+
+    while True:
+        user_input = await asyncio.to_thread(input, "User: ")
+        if user_input.lower() in ["quit", "exit", "q"]:
+            print("Assistant: Goodbye!")
+            break
+        try:
+            print("Assistant: ", end="", flush=True)
+            await achat_turn(
+                agent,
+                ticket_id,
+                user_input,
+                on_token=lambda token: print(token, end="", flush=True),
+                account_id=account_id,
+            )
+            print()
         except Exception as e:
             print(f"Error: {e}")
-            session.rollback()
 
-    session.close()
+
+async def arun_conversations(
+    agent: CompiledStateGraph,
+    conversations: dict[str, list[str]],
+    max_concurrency: int = 100,
+) -> dict[str, list[str]]:
+    """
+    Drive many tickets concurrently on one event loop.
+    conversations maps ticket_id to the user messages to send, in order;
+    turns within a ticket stay sequential. Returns the replies per ticket.
+    """
+    import asyncio
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    replies = {ticket_id: [] for ticket_id in conversations}
+
+    async def run_ticket(ticket_id: str, user_inputs: list[str]):
+        async with semaphore:
+            account_id = await _asession_account(ticket_id)
+            for user_input in user_inputs:
+                try:
+                    replies[ticket_id].append(
+                        await achat_turn(agent, ticket_id, user_input, account_id=account_id)
+                    )
+                except Exception as e:
+                    replies[ticket_id].append(f"Error: {e}")
+
+    await asyncio.gather(
+        *(run_ticket(ticket_id, inputs) for ticket_id, inputs in conversations.items())
+    )
+    return replies